@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 
 # Here's the reason that all the other Python files are in ../api_helpers
 # I was noticing very long build times (~15 minutes)...
@@ -12,9 +13,13 @@ from api_helpers.routers.processor.router import router as processor_router
 from api_helpers.routers.compute_resource.router import router as compute_resource_router
 from api_helpers.routers.client.router import router as client_router
 from api_helpers.routers.gui.router import router as gui_router
+from api_helpers.core.orjson_response import ORJSONModelResponse
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONModelResponse)
+
+# compress responses that are large enough to benefit (e.g., job lists with embedded processor specs)
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # requests from a processing job
 app.include_router(processor_router, prefix="/api/processor", tags=["Processor"])
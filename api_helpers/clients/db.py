@@ -1,7 +1,9 @@
 import time
-from typing import List, Union
+from typing import List, Union, Dict
+from pymongo import ReturnDocument
 from ._get_mongo_client import _get_mongo_client
 from ._remove_id_field import _remove_id_field
+from .project_events import publish_project_event, publish_project_events
 from ..core.protocaas_types import ProtocaasProject, ProtocaasWorkspace, ProtocaasFile, ProtocaasJob, ProtocaasComputeResource, ComputeResourceSpec
 from ..core._get_workspace_role import _get_workspace_role
 from ..core._hide_secret_params_in_job import _hide_secret_params_in_job
@@ -92,6 +94,15 @@ async def fetch_project(project_id: str) -> ProtocaasProject:
         return None
     return ProtocaasProject(**project) # validate project
 
+async def fetch_project_timestamp_modified(project_id: str) -> Union[float, None]:
+    # used to validate cached responses without loading the project, its files or its jobs
+    client = _get_mongo_client()
+    projects_collection = client['protocaas']['projects']
+    project = await projects_collection.find_one({'projectId': project_id}, {'_id': 0, 'timestampModified': 1})
+    if project is None:
+        return None
+    return project['timestampModified']
+
 async def fetch_project_files(project_id: str) -> List[ProtocaasFile]:
     client = _get_mongo_client()
     files_collection = client['protocaas']['files']
@@ -113,6 +124,7 @@ async def fetch_project_jobs(project_id: str, include_private_keys=False) -> Lis
             job.jobPrivateKey = '' # hide the private key
     for job in jobs:
         job.dandiApiKey = None # hide the DANDI API key
+        job.leaseExpiration = None # renewing the lease does not modify the project (see renew_job_leases)
         _hide_secret_params_in_job(job)
     for job in jobs:
         # truncate the console output (this is obsolete now that we have consoleOutputUrl)
@@ -129,6 +141,24 @@ async def update_project(project_id: str, update: dict):
         '$set': update
     })
 
+async def touch_project(project_id: str):
+    await _touch_projects([project_id])
+
+async def _touch_projects(project_ids: List[str]):
+    # timestampModified of a project changes whenever its files or jobs change (after the change is written),
+    # so that it can be used to validate cached snapshots of the project (see the client snapshot endpoint)
+    if len(project_ids) == 0:
+        return
+    client = _get_mongo_client()
+    projects_collection = client['protocaas']['projects']
+    await projects_collection.update_many({
+        'projectId': {'$in': list(set(project_ids))}
+    }, {
+        '$set': {
+            'timestampModified': time.time()
+        }
+    })
+
 async def delete_project(project_id: str):
     client = _get_mongo_client()
     projects_collection = client['protocaas']['projects']
@@ -233,6 +263,7 @@ async def fetch_compute_resource_jobs(compute_resource_id: str, statuses: Union[
             job.jobPrivateKey = '' # hide the private key
     for job in jobs:
         job.dandiApiKey = None # hide the DANDI API key
+        job.leaseExpiration = None # renewing the lease does not modify the project (see renew_job_leases)
         _hide_secret_params_in_job(job)
     for job in jobs:
         # truncate the console output (this is obsolete now that we have consoleOutputUrlS)
@@ -277,32 +308,98 @@ async def fetch_job(job_id: str, *, include_dandi_api_key: bool=False, include_s
     job = ProtocaasJob(**job) # validate job
     if not include_dandi_api_key:
         job.dandiApiKey = None
+    job.leaseExpiration = None # renewing the lease does not modify the project (see renew_job_leases)
     if not include_secret_params:
         _hide_secret_params_in_job(job)
     if job.consoleOutput is not None:
         job.consoleOutput = job.consoleOutput[:50000] # truncate the console output (this is obsolete now that we have consoleOutputUrl)
     return job
 
-async def update_job(job_id: str, update: dict):
+async def update_job(job_id: str, update: dict, *, condition: Union[dict, None]=None) -> bool:
+    # if a condition is given, the job is only updated if it matches (returns whether the job was updated)
     client = _get_mongo_client()
     jobs_collection = client['protocaas']['jobs']
-    await jobs_collection.update_one({
+    job = await jobs_collection.find_one_and_update({
+        **(condition if condition is not None else {}),
         'jobId': job_id
     }, {
         '$set': update
-    })
+    }, projection={'projectId': 1})
+    if job is None:
+        return False
+    await touch_project(job['projectId'])
+    return True
 
 async def delete_job(job_id: str):
     client = _get_mongo_client()
     jobs_collection = client['protocaas']['jobs']
-    await jobs_collection.delete_one({
+    job = await jobs_collection.find_one_and_delete({
         'jobId': job_id
-    })
+    }, projection={'projectId': 1})
+    if job is not None:
+        await touch_project(job['projectId'])
 
 async def insert_job(job: ProtocaasJob):
     client = _get_mongo_client()
     jobs_collection = client['protocaas']['jobs']
     await jobs_collection.insert_one(job.dict(exclude_none=True))
+    await touch_project(job.projectId)
+
+async def insert_jobs(jobs: List[ProtocaasJob]):
+    if len(jobs) == 0:
+        return
+    client = _get_mongo_client()
+    jobs_collection = client['protocaas']['jobs']
+    await jobs_collection.insert_many([job.dict(exclude_none=True) for job in jobs])
+    await _touch_projects([job.projectId for job in jobs])
+
+async def delete_jobs(job_ids: List[str]):
+    if len(job_ids) == 0:
+        return
+    client = _get_mongo_client()
+    jobs_collection = client['protocaas']['jobs']
+    jobs = await jobs_collection.find({
+        'jobId': {'$in': job_ids}
+    }, {'projectId': 1}).to_list(length=None)
+    await jobs_collection.delete_many({
+        'jobId': {'$in': job_ids}
+    })
+    await _touch_projects([job['projectId'] for job in jobs])
+
+async def fetch_job_ids_for_output_files(project_id: str, file_names: List[str]) -> List[str]:
+    """IDs of the jobs of a project that produce (or are expected to produce) any of the given files
+
+    This is a single query on projectId and outputFiles.fileName, which should be indexed together.
+    """
+    client = _get_mongo_client()
+    jobs_collection = client['protocaas']['jobs']
+    jobs = await jobs_collection.find({
+        'projectId': project_id,
+        'outputFiles.fileName': {'$in': file_names}
+    }, {'jobId': 1}).to_list(length=None)
+    return [job['jobId'] for job in jobs]
+
+async def fetch_jobs_with_fingerprints(project_id: str, fingerprints: List[str], *, statuses: List[str]) -> List[ProtocaasJob]:
+    """Jobs of a project with any of the given fingerprints (most recent first)
+
+    This is a single query on projectId and fingerprint, which should be indexed together.
+    """
+    if len(fingerprints) == 0:
+        return []
+    client = _get_mongo_client()
+    jobs_collection = client['protocaas']['jobs']
+    jobs = await jobs_collection.find({
+        'projectId': project_id,
+        'fingerprint': {'$in': fingerprints},
+        'status': {'$in': statuses}
+    }).sort('timestampCreated', -1).to_list(length=None)
+    for job in jobs:
+        _remove_id_field(job)
+    jobs = [ProtocaasJob(**job) for job in jobs] # validate jobs
+    for job in jobs:
+        job.jobPrivateKey = '' # hide the private key
+        job.dandiApiKey = None # hide the DANDI API key
+    return jobs
 
 async def fetch_file(project_id: str, file_name: str):
     client = _get_mongo_client()
@@ -317,6 +414,18 @@ async def fetch_file(project_id: str, file_name: str):
     file = ProtocaasFile(**file) # validate file
     return file
 
+async def fetch_files_by_name(project_id: str, file_names: List[str]) -> List[ProtocaasFile]:
+    client = _get_mongo_client()
+    files_collection = client['protocaas']['files']
+    files = await files_collection.find({
+        'projectId': project_id,
+        'fileName': {'$in': file_names}
+    }).to_list(length=None)
+    for file in files:
+        _remove_id_field(file)
+    files = [ProtocaasFile(**file) for file in files] # validate files
+    return files
+
 async def delete_file(project_id: str, file_name: str):
     client = _get_mongo_client()
     files_collection = client['protocaas']['files']
@@ -324,8 +433,237 @@ async def delete_file(project_id: str, file_name: str):
         'projectId': project_id,
         'fileName': file_name
     })
+    await touch_project(project_id)
+
+async def delete_files_by_name(project_id: str, file_names: List[str]):
+    if len(file_names) == 0:
+        return
+    client = _get_mongo_client()
+    files_collection = client['protocaas']['files']
+    await files_collection.delete_many({
+        'projectId': project_id,
+        'fileName': {'$in': file_names}
+    })
+    await touch_project(project_id)
 
 async def insert_file(file: ProtocaasFile):
     client = _get_mongo_client()
     files_collection = client['protocaas']['files']
-    await files_collection.insert_one(file.dict(exclude_none=True))
\ No newline at end of file
+    await files_collection.insert_one(file.dict(exclude_none=True))
+    await touch_project(file.projectId)
+
+async def insert_files(files: List[ProtocaasFile]):
+    if len(files) == 0:
+        return
+    client = _get_mongo_client()
+    files_collection = client['protocaas']['files']
+    await files_collection.insert_many([file.dict(exclude_none=True) for file in files])
+    await _touch_projects([file.projectId for file in files])
+
+async def claim_job(job_id: str, *, compute_resource_id: str, compute_resource_node_id: str, compute_resource_node_name: str, lease_duration: float) -> bool:
+    # atomically move the job from pending to starting, so that only one compute resource node can claim it
+    client = _get_mongo_client()
+    jobs_collection = client['protocaas']['jobs']
+    timestamp = time.time()
+    update = {
+        'status': 'starting',
+        'timestampStarting': timestamp,
+        'computeResourceNodeId': compute_resource_node_id,
+        'computeResourceNodeName': compute_resource_node_name
+    }
+    job = await jobs_collection.find_one_and_update({
+        'jobId': job_id,
+        'computeResourceId': compute_resource_id,
+        'status': 'pending'
+    }, {
+        '$set': {
+            **update,
+            'leaseExpiration': timestamp + lease_duration
+        }
+    }, projection={'projectId': 1})
+    if job is None:
+        return False
+    await touch_project(job['projectId'])
+    await publish_project_event(job['projectId'], {'type': 'jobUpdated', 'jobId': job_id, 'update': update})
+    return True
+
+async def renew_job_leases(job_ids: List[str], *, compute_resource_id: str, compute_resource_node_id: str, lease_duration: float) -> List[str]:
+    # returns the IDs of the jobs whose leases were renewed
+    # (the projects are not touched, since the lease expiration is not part of the jobs as seen by users)
+    client = _get_mongo_client()
+    jobs_collection = client['protocaas']['jobs']
+    query = {
+        'jobId': {'$in': job_ids},
+        'computeResourceId': compute_resource_id,
+        'computeResourceNodeId': compute_resource_node_id,
+        'status': 'starting'
+    }
+    await jobs_collection.update_many(query, {
+        '$set': {
+            'leaseExpiration': time.time() + lease_duration
+        }
+    })
+    jobs = await jobs_collection.find(query, {'jobId': 1}).to_list(length=None)
+    return [job['jobId'] for job in jobs]
+
+async def release_expired_job_leases(compute_resource_id: str):
+    # jobs that were claimed by a node that never got them running (e.g., the node went down) go back to pending
+    client = _get_mongo_client()
+    jobs_collection = client['protocaas']['jobs']
+    query = {
+        'computeResourceId': compute_resource_id,
+        'status': 'starting',
+        'leaseExpiration': {'$lt': time.time()}
+    }
+    expired_jobs = await jobs_collection.find(query, {'jobId': 1, 'projectId': 1}).to_list(length=None)
+    if len(expired_jobs) == 0:
+        return
+    await jobs_collection.update_many({
+        **query,
+        'jobId': {'$in': [job['jobId'] for job in expired_jobs]}
+    }, {
+        '$set': {
+            'status': 'pending'
+        },
+        '$unset': {
+            'timestampStarting': '',
+            'computeResourceNodeId': '',
+            'computeResourceNodeName': '',
+            'leaseExpiration': ''
+        }
+    })
+    await _touch_projects([job['projectId'] for job in expired_jobs])
+    # fields that are null in the update were removed from the job
+    await _publish_job_updated_events(expired_jobs, {
+        'status': 'pending',
+        'timestampStarting': None,
+        'computeResourceNodeId': None,
+        'computeResourceNodeName': None
+    })
+
+# statuses of jobs whose outputs do not exist yet, but will (unless the job fails)
+unfinished_job_statuses = ['waiting', 'pending', 'queued', 'starting', 'running']
+
+async def fetch_unfinished_job_ids_for_output_files(project_id: str, file_names: List[str]) -> Dict[str, str]:
+    """For each of the given files that is an output of an unfinished job of the project, the ID of that job"""
+    if len(file_names) == 0:
+        return {}
+    client = _get_mongo_client()
+    jobs_collection = client['protocaas']['jobs']
+    jobs = await jobs_collection.find({
+        'projectId': project_id,
+        'outputFiles.fileName': {'$in': file_names},
+        'status': {'$in': unfinished_job_statuses}
+    }, {'jobId': 1, 'outputFiles': 1}).to_list(length=None)
+    ret = {}
+    for job in jobs:
+        for output_file in job['outputFiles']:
+            if output_file['fileName'] in file_names:
+                ret[output_file['fileName']] = job['jobId']
+    return ret
+
+async def fetch_job_statuses(job_ids: List[str]) -> Dict[str, str]:
+    """The statuses of the given jobs (jobs that do not exist are left out)"""
+    client = _get_mongo_client()
+    jobs_collection = client['protocaas']['jobs']
+    jobs = await jobs_collection.find({
+        'jobId': {'$in': job_ids}
+    }, {'jobId': 1, 'status': 1}).to_list(length=None)
+    return {job['jobId']: job['status'] for job in jobs}
+
+async def fetch_waiting_jobs(upstream_job_id: str) -> List[ProtocaasJob]:
+    """The waiting jobs that depend on the outputs of a job"""
+    client = _get_mongo_client()
+    jobs_collection = client['protocaas']['jobs']
+    jobs = await jobs_collection.find({
+        'status': 'waiting',
+        'waitingForJobIds': upstream_job_id
+    }).to_list(length=None)
+    for job in jobs:
+        _remove_id_field(job)
+    jobs = [ProtocaasJob(**job) for job in jobs] # validate jobs
+    return jobs
+
+async def resolve_job_dependency(job_id: str, *, upstream_job_id: str, output_file_ids: Dict[str, str]) -> bool:
+    """Record that an upstream job of a waiting job has completed
+
+    The inputs of the job that are outputs of the upstream job get their file IDs (output_file_ids maps file names
+    to file IDs), and the job becomes pending if it is no longer waiting for any other job. Returns True if the job
+    became pending. This is done atomically, so that upstream jobs can complete concurrently.
+    """
+    client = _get_mongo_client()
+    jobs_collection = client['protocaas']['jobs']
+    job = await jobs_collection.find_one({'jobId': job_id, 'status': 'waiting'}, {'inputFiles': 1})
+    if job is None:
+        return False
+    update = {'$pull': {'waitingForJobIds': upstream_job_id}}
+    input_file_ids = {}
+    for i, input_file in enumerate(job['inputFiles']):
+        if input_file['fileName'] in output_file_ids:
+            input_file_ids[f'inputFiles.{i}.fileId'] = output_file_ids[input_file['fileName']]
+    if len(input_file_ids) > 0:
+        update['$set'] = input_file_ids
+        update['$addToSet'] = {'inputFileIds': {'$each': list(set(input_file_ids.values()))}}
+    job = await jobs_collection.find_one_and_update({
+        'jobId': job_id,
+        'status': 'waiting'
+    }, update, projection={'projectId': 1, 'inputFiles': 1, 'inputFileIds': 1, 'waitingForJobIds': 1}, return_document=ReturnDocument.AFTER)
+    if job is None:
+        return False
+    event_update = {
+        'inputFiles': job['inputFiles'],
+        'inputFileIds': job['inputFileIds'],
+        'waitingForJobIds': job['waitingForJobIds']
+    }
+    became_pending = False
+    if len(job['waitingForJobIds']) == 0:
+        result = await jobs_collection.update_one({
+            'jobId': job_id,
+            'status': 'waiting',
+            'waitingForJobIds': {'$size': 0}
+        }, {
+            '$set': {'status': 'pending'},
+            '$unset': {'waitingForJobIds': ''}
+        })
+        if result.modified_count == 1:
+            became_pending = True
+            # null means the field was removed
+            event_update['status'] = 'pending'
+            event_update['waitingForJobIds'] = None
+    await touch_project(job['projectId'])
+    await publish_project_event(job['projectId'], {'type': 'jobUpdated', 'jobId': job_id, 'update': event_update})
+    return became_pending
+
+async def fail_waiting_jobs(upstream_job_id: str, *, error: str) -> List[str]:
+    """Fail the waiting jobs that depend on the outputs of a job (returns their IDs)"""
+    client = _get_mongo_client()
+    jobs_collection = client['protocaas']['jobs']
+    query = {
+        'status': 'waiting',
+        'waitingForJobIds': upstream_job_id
+    }
+    jobs = await jobs_collection.find(query, {'jobId': 1, 'projectId': 1}).to_list(length=None)
+    if len(jobs) == 0:
+        return []
+    update = {
+        'status': 'failed',
+        'error': error,
+        'timestampFinished': time.time()
+    }
+    await jobs_collection.update_many({
+        **query,
+        'jobId': {'$in': [job['jobId'] for job in jobs]}
+    }, {
+        '$set': update
+    })
+    await _touch_projects([job['projectId'] for job in jobs])
+    await _publish_job_updated_events(jobs, update)
+    return [job['jobId'] for job in jobs]
+
+async def _publish_job_updated_events(jobs: List[dict], update: dict):
+    # one batch of events per project (the jobs may belong to several projects)
+    events_by_project: Dict[str, List[dict]] = {}
+    for job in jobs:
+        events_by_project.setdefault(job['projectId'], []).append({'type': 'jobUpdated', 'jobId': job['jobId'], 'update': update})
+    for project_id, events in events_by_project.items():
+        await publish_project_events(project_id, events)
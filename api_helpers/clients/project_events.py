@@ -0,0 +1,115 @@
+import time
+from typing import List, Union
+from pymongo import ReturnDocument
+from ._get_mongo_client import _get_mongo_client
+from ._remove_id_field import _remove_id_field
+from ..core.protocaas_types import ProtocaasFile
+
+
+# Events are kept for this long, so that a client that reconnects can resume from its last event
+project_event_retention_sec = 60 * 60
+
+# Old events of a project are pruned every this many events
+project_event_prune_interval = 100
+
+# Files with content larger than this are sent without their content (the client fetches them if needed)
+max_file_content_size_in_event = 10000
+
+async def publish_project_event(project_id: str, event: dict):
+    """Record a change to the files or jobs of a project, for the GUI event stream (see /api/gui/projects/{id}/events)
+
+    Each event gets the next sequence number of its project, which is used as the SSE event ID.
+    """
+    client = _get_mongo_client()
+    counters_collection = client['protocaas']['projectEventCounters']
+    events_collection = client['protocaas']['projectEvents']
+    counter = await counters_collection.find_one_and_update({
+        'projectId': project_id
+    }, {
+        '$inc': {'seq': 1}
+    }, upsert=True, return_document=ReturnDocument.AFTER)
+    seq = counter['seq']
+    timestamp = time.time()
+    await events_collection.insert_one({
+        'projectId': project_id,
+        'seq': seq,
+        'timestamp': timestamp,
+        'event': event
+    })
+    if seq % project_event_prune_interval == 0:
+        await _prune_project_events(project_id, timestamp)
+
+async def publish_project_events(project_id: str, events: List[dict]):
+    """Record several events at once (one counter update and one insert), e.g., for a batch of jobs"""
+    if len(events) == 0:
+        return
+    client = _get_mongo_client()
+    counters_collection = client['protocaas']['projectEventCounters']
+    events_collection = client['protocaas']['projectEvents']
+    counter = await counters_collection.find_one_and_update({
+        'projectId': project_id
+    }, {
+        '$inc': {'seq': len(events)}
+    }, upsert=True, return_document=ReturnDocument.AFTER)
+    first_seq = counter['seq'] - len(events) + 1
+    timestamp = time.time()
+    await events_collection.insert_many([
+        {
+            'projectId': project_id,
+            'seq': first_seq + i,
+            'timestamp': timestamp,
+            'event': event
+        }
+        for i, event in enumerate(events)
+    ])
+    # (prune if a multiple of the interval is among the new sequence numbers)
+    if (first_seq - 1) // project_event_prune_interval != counter['seq'] // project_event_prune_interval:
+        await _prune_project_events(project_id, timestamp)
+
+async def _prune_project_events(project_id: str, timestamp: float):
+    client = _get_mongo_client()
+    events_collection = client['protocaas']['projectEvents']
+    await events_collection.delete_many({
+        'projectId': project_id,
+        'timestamp': {'$lt': timestamp - project_event_retention_sec}
+    })
+
+async def fetch_project_event_seq(project_id: str) -> int:
+    """The sequence number of the latest event of a project (0 if there are none)"""
+    client = _get_mongo_client()
+    counters_collection = client['protocaas']['projectEventCounters']
+    counter = await counters_collection.find_one({'projectId': project_id})
+    if counter is None:
+        return 0
+    return counter['seq']
+
+async def fetch_project_events(project_id: str, *, after_seq: int, limit: int) -> List[dict]:
+    """Events with sequence numbers greater than after_seq, in order (each with projectId, seq, timestamp and event)"""
+    client = _get_mongo_client()
+    events_collection = client['protocaas']['projectEvents']
+    events = await events_collection.find({
+        'projectId': project_id,
+        'seq': {'$gt': after_seq}
+    }).sort('seq', 1).limit(limit).to_list(length=None)
+    for event in events:
+        _remove_id_field(event)
+    return events
+
+async def fetch_oldest_project_event_seq(project_id: str) -> Union[int, None]:
+    client = _get_mongo_client()
+    events_collection = client['protocaas']['projectEvents']
+    events = await events_collection.find({'projectId': project_id}, {'seq': 1}).sort('seq', 1).limit(1).to_list(length=None)
+    if len(events) == 0:
+        return None
+    return events[0]['seq']
+
+def _get_file_updated_event(file: ProtocaasFile) -> dict:
+    f = file.dict(exclude_none=True)
+    if len(file.content) > max_file_content_size_in_event:
+        del f['content']
+    return {'type': 'fileUpdated', 'fileName': file.fileName, 'file': f}
+
+async def delete_project_events(project_id: str):
+    client = _get_mongo_client()
+    await client['protocaas']['projectEvents'].delete_many({'projectId': project_id})
+    await client['protocaas']['projectEventCounters'].delete_many({'projectId': project_id})
@@ -0,0 +1,13 @@
+from typing import Union
+
+
+# Any editor of a workspace can set the priority of a job, so it is limited to a small range. The priority is
+# added to the fair-share score of the job (see FairShareScheduler), where a priority level is worth 10 minutes
+# of waiting or 1 CPU of recent usage -- an unbounded priority would defeat fair share completely.
+min_job_priority = -10
+max_job_priority = 10
+
+def _clamp_job_priority(priority: Union[int, None]) -> Union[int, None]:
+    if priority is None:
+        return None
+    return max(min_job_priority, min(max_job_priority, priority))
@@ -0,0 +1,25 @@
+from typing import Union
+from fastapi import Response
+
+
+def _etag_matches(if_none_match: Union[str, None], etag: str) -> bool:
+    """Whether the If-None-Match header of a request matches the current ETag of the resource"""
+    if if_none_match is None:
+        return False
+    tags = [x.strip() for x in if_none_match.split(',')]
+    # proxies that compress the response may turn the ETag into a weak one
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+def _get_etag_headers(etag: str) -> dict:
+    return {
+        'ETag': etag,
+        # the browser caches the response, but revalidates it (with If-None-Match) on each request
+        'Cache-Control': 'private, no-cache',
+        'Vary': 'github-access-token'
+    }
+
+def _not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers=_get_etag_headers(etag))
+
+def _get_timestamp_etag(kind: str, id: str, timestamp_modified: float) -> str:
+    return f'"{kind}-{id}-{timestamp_modified!r}"'
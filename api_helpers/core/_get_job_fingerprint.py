@@ -0,0 +1,30 @@
+import json
+import hashlib
+from .protocaas_types import ProtocaasJob
+
+
+def _get_job_fingerprint(job: ProtocaasJob, *, app_image: str) -> str:
+    """A hash of everything that determines the outputs of a job
+
+    This covers the processor (its name, the hash of its spec, and the container image of the app that provides it,
+    which must be pinned by digest since it stands in for the version of the processor), the input files (by file ID, in order) and the values of the non-secret parameters,
+    with omitted parameters taking their default values. The inputs of the job must all exist.
+    """
+    given_values = {p.name: p.value for p in job.inputParameters}
+    parameters = []
+    for pp in sorted(job.processorSpec.parameters, key=lambda x: x.name):
+        if pp.secret:
+            continue
+        parameters.append([pp.name, given_values[pp.name] if pp.name in given_values else pp.default])
+    x = {
+        'processorName': job.processorName,
+        'processorSpecHash': _sha1_of_json(job.processorSpec.dict()),
+        'appImage': app_image,
+        'computeResourceId': job.computeResourceId,
+        'inputFiles': [[f.name, f.fileId] for f in job.inputFiles],
+        'inputParameters': parameters
+    }
+    return _sha1_of_json(x)
+
+def _sha1_of_json(x) -> str:
+    return hashlib.sha1(json.dumps(x, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
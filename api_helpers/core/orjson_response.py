@@ -0,0 +1,21 @@
+from typing import Any
+import orjson
+from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+
+
+class ORJSONModelResponse(JSONResponse):
+    """A JSON response serialized with orjson, which also accepts pydantic models as content
+
+    This is the default response class of the app. Endpoints that return large documents (e.g., job lists)
+    return this response directly, so that FastAPI does not validate the response model again and
+    run it through jsonable_encoder before serializing it.
+    """
+    media_type = "application/json"
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_orjson_default)
+
+def _orjson_default(obj: Any):
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
@@ -27,7 +27,7 @@ class ProtocaasProject(BaseModel):
 
 class ProtocaasJobInputFile(BaseModel):
     name: str
-    fileId: str
+    fileId: Union[str, None]=None # None while the file is an output of an upstream job that has not completed
     fileName: str
 
 class ProtocaasJobInputParameter(BaseModel):
@@ -64,6 +64,17 @@ class ComputeResourceSpecProcessorAttribute(BaseModel):
 class ComputeResourceSpecProcessorTag(BaseModel):
     tag: str
 
+class ComputeResourceSpecProcessorResourceOverride(BaseModel):
+    resource: str # 'numCpus' | 'memoryGb' | 'diskGb' | 'timeMin'
+    parameter: str
+
+class ComputeResourceSpecProcessorResources(BaseModel):
+    numCpus: Union[float, None]=None
+    memoryGb: Union[float, None]=None
+    diskGb: Union[float, None]=None
+    timeMin: Union[float, None]=None
+    parameterOverrides: List[ComputeResourceSpecProcessorResourceOverride]=[]
+
 class ComputeResourceSpecProcessor(BaseModel):
     name: str
     help: str
@@ -72,6 +83,7 @@ class ComputeResourceSpecProcessor(BaseModel):
     parameters: List[ComputeResourceSpecProcessorParameter]
     attributes: List[ComputeResourceSpecProcessorAttribute]
     tags: List[ComputeResourceSpecProcessorTag]
+    resources: Union[ComputeResourceSpecProcessorResources, None]=None
 
 class ProtocaasJob(BaseModel):
     projectId: str
@@ -81,13 +93,14 @@ class ProtocaasJob(BaseModel):
     userId: str
     processorName: str
     batchId: Union[str, None]=None
+    priority: Union[int, None]=None # higher priority jobs are started first (default 0, from -10 to 10)
     inputFiles: List[ProtocaasJobInputFile]
     inputFileIds: List[str]
     inputParameters: List[ProtocaasJobInputParameter]
     outputFiles: List[ProtocaasJobOutputFile]
     timestampCreated: float
     computeResourceId: str
-    status: str # 'pending' | 'queued' | 'starting' | 'running' | 'completed' | 'failed'
+    status: str # 'waiting' | 'pending' | 'queued' | 'starting' | 'running' | 'completed' | 'failed'
     error: Union[str, None]=None
     processorVersion: Union[str, None]=None
     computeResourceNodeId: Union[str, None]=None
@@ -101,6 +114,10 @@ class ProtocaasJob(BaseModel):
     outputFileIds: Union[List[str], None]=None
     processorSpec: ComputeResourceSpecProcessor
     dandiApiKey: Union[str, None]=None
+    leaseExpiration: Union[float, None]=None # while the job is starting, the node that claimed it must renew the lease before this time (not returned by the API)
+    waitingForJobIds: Union[List[str], None]=None # a waiting job becomes pending when these upstream jobs have completed
+    fingerprint: Union[str, None]=None # identifies jobs that would produce the same outputs (see _get_job_fingerprint)
+    reusedOutputsFromJobId: Union[str, None]=None # the job was completed right away with the outputs of this identical job
 
 class ProtocaasFile(BaseModel):
     projectId: str
@@ -143,6 +160,7 @@ class ComputeResourceSpecApp(BaseModel):
     name: str
     help: str
     processors: List[ComputeResourceSpecProcessor]
+    warmWorker: bool=False # jobs are forked from a pre-initialized worker process (local jobs without a container)
 
 class ComputeResourceSpec(BaseModel):
     apps: List[ComputeResourceSpecApp]
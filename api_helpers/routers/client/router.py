@@ -1,8 +1,11 @@
-from typing import List
+from typing import List, Union
+import asyncio
 from pydantic import BaseModel
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header
 from ...core.protocaas_types import ProtocaasProject, ProtocaasFile, ProtocaasJob
-from ...clients.db import fetch_project, fetch_project_files, fetch_project_jobs
+from ...clients.db import fetch_project, fetch_project_files, fetch_project_jobs, fetch_project_timestamp_modified
+from ...core.orjson_response import ORJSONModelResponse
+from ...core._etag import _etag_matches, _get_etag_headers, _get_timestamp_etag, _not_modified_response
 
 router = APIRouter()
 
@@ -12,12 +15,15 @@ class GetProjectResponse(BaseModel):
     success: bool
 
 @router.get("/projects/{project_id}")
-async def get_project(project_id) -> GetProjectResponse:
+async def get_project(project_id, if_none_match: Union[str, None] = Header(None)) -> GetProjectResponse:
     try:
         project = await fetch_project(project_id)
         if project is None:
             raise Exception(f"No project with ID {project_id}")
-        return GetProjectResponse(project=project, success=True)
+        etag = _get_timestamp_etag('project', project_id, project.timestampModified)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified_response(etag)
+        return ORJSONModelResponse(GetProjectResponse(project=project, success=True), headers=_get_etag_headers(etag))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -27,10 +33,16 @@ class GetProjectFilesResponse(BaseModel):
     success: bool
 
 @router.get("/projects/{project_id}/files")
-async def get_project_files(project_id) -> GetProjectFilesResponse:
+async def get_project_files(project_id, if_none_match: Union[str, None] = Header(None)) -> GetProjectFilesResponse:
     try:
+        timestamp_modified = await fetch_project_timestamp_modified(project_id)
+        if timestamp_modified is None:
+            raise Exception(f"No project with ID {project_id}")
+        etag = _get_timestamp_etag('files', project_id, timestamp_modified)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified_response(etag)
         files = await fetch_project_files(project_id)
-        return GetProjectFilesResponse(files=files, success=True)
+        return ORJSONModelResponse(GetProjectFilesResponse(files=files, success=True), headers=_get_etag_headers(etag))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -40,9 +52,41 @@ class GetProjectJobsResponse(BaseModel):
     success: bool
 
 @router.get("/projects/{project_id}/jobs")
-async def get_project_jobs(project_id) -> GetProjectJobsResponse:
+async def get_project_jobs(project_id, if_none_match: Union[str, None] = Header(None)) -> GetProjectJobsResponse:
     try:
+        timestamp_modified = await fetch_project_timestamp_modified(project_id)
+        if timestamp_modified is None:
+            raise Exception(f"No project with ID {project_id}")
+        etag = _get_timestamp_etag('jobs', project_id, timestamp_modified)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified_response(etag)
         jobs = await fetch_project_jobs(project_id)
-        return GetProjectJobsResponse(jobs=jobs, success=True)
+        return ORJSONModelResponse(GetProjectJobsResponse(jobs=jobs, success=True), headers=_get_etag_headers(etag))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# get project snapshot (the project, its files and its jobs in a single request)
+class GetProjectSnapshotResponse(BaseModel):
+    project: ProtocaasProject
+    files: List[ProtocaasFile]
+    jobs: List[ProtocaasJob]
+    success: bool
+
+@router.get("/projects/{project_id}/snapshot")
+async def get_project_snapshot(project_id, if_none_match: Union[str, None] = Header(None)) -> GetProjectSnapshotResponse:
+    try:
+        project = await fetch_project(project_id)
+        if project is None:
+            raise Exception(f"No project with ID {project_id}")
+        # timestampModified changes whenever the files or jobs of the project change
+        # (the project is read first, so the returned data is never older than the ETag)
+        etag = _get_timestamp_etag('snapshot', project_id, project.timestampModified)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified_response(etag)
+        files, jobs = await asyncio.gather(fetch_project_files(project_id), fetch_project_jobs(project_id))
+        return ORJSONModelResponse(
+            GetProjectSnapshotResponse(project=project, files=files, jobs=jobs, success=True),
+            headers=_get_etag_headers(etag)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
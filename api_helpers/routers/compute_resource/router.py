@@ -4,7 +4,9 @@ from fastapi import APIRouter, HTTPException, Header
 from ...services._crypto_keys import _verify_signature_str
 from ...core.protocaas_types import ProtocaasComputeResourceApp, ProtocaasJob, ComputeResourceSpec, PubsubSubscription
 from ...clients.db import fetch_compute_resource, fetch_compute_resource_jobs, update_compute_resource_node, set_compute_resource_spec
+from ...clients.db import claim_job, renew_job_leases, release_expired_job_leases
 from ...core.settings import get_settings
+from ...core.orjson_response import ORJSONModelResponse
 
 router = APIRouter()
 
@@ -96,6 +98,8 @@ async def compute_resource_get_unfinished_jobs(
             expected_payload=expected_payload
         )
 
+        await release_expired_job_leases(compute_resource_id)
+
         jobs = await fetch_compute_resource_jobs(compute_resource_id, statuses=['pending', 'queued', 'starting', 'running'], include_private_keys=True)
 
         await update_compute_resource_node(
@@ -104,7 +108,7 @@ async def compute_resource_get_unfinished_jobs(
             compute_resource_node_name=compute_resource_node_name
         )
         
-        return GetUnfinishedJobsResponse(jobs=jobs, success=True)
+        return ORJSONModelResponse(GetUnfinishedJobsResponse(jobs=jobs, success=True))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -140,6 +144,84 @@ async def compute_resource_set_spec(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# claim job
+class ClaimJobRequest(BaseModel):
+    computeResourceNodeId: str
+    computeResourceNodeName: str
+    leaseDuration: float
+
+class ClaimJobResponse(BaseModel):
+    claimed: bool # False if the job is no longer pending (e.g., it was claimed by another node)
+    success: bool
+
+@router.post("/compute_resources/{compute_resource_id}/jobs/{job_id}/claim")
+async def compute_resource_claim_job(
+    compute_resource_id: str,
+    job_id: str,
+    data: ClaimJobRequest,
+    compute_resource_payload: str = Header(...),
+    compute_resource_signature: str = Header(...)
+) -> ClaimJobResponse:
+    try:
+        # authenticate the request
+        expected_payload = f'/api/compute_resource/compute_resources/{compute_resource_id}/jobs/{job_id}/claim'
+        _authenticate_compute_resource_request(
+            compute_resource_id=compute_resource_id,
+            compute_resource_payload=compute_resource_payload,
+            compute_resource_signature=compute_resource_signature,
+            expected_payload=expected_payload
+        )
+
+        claimed = await claim_job(
+            job_id,
+            compute_resource_id=compute_resource_id,
+            compute_resource_node_id=data.computeResourceNodeId,
+            compute_resource_node_name=data.computeResourceNodeName,
+            lease_duration=data.leaseDuration
+        )
+
+        return ClaimJobResponse(claimed=claimed, success=True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# renew job leases
+class RenewJobLeasesRequest(BaseModel):
+    jobIds: List[str]
+    computeResourceNodeId: str
+    leaseDuration: float
+
+class RenewJobLeasesResponse(BaseModel):
+    renewedJobIds: List[str]
+    success: bool
+
+@router.put("/compute_resources/{compute_resource_id}/job_leases")
+async def compute_resource_renew_job_leases(
+    compute_resource_id: str,
+    data: RenewJobLeasesRequest,
+    compute_resource_payload: str = Header(...),
+    compute_resource_signature: str = Header(...)
+) -> RenewJobLeasesResponse:
+    try:
+        # authenticate the request
+        expected_payload = f'/api/compute_resource/compute_resources/{compute_resource_id}/job_leases'
+        _authenticate_compute_resource_request(
+            compute_resource_id=compute_resource_id,
+            compute_resource_payload=compute_resource_payload,
+            compute_resource_signature=compute_resource_signature,
+            expected_payload=expected_payload
+        )
+
+        renewed_job_ids = await renew_job_leases(
+            data.jobIds,
+            compute_resource_id=compute_resource_id,
+            compute_resource_node_id=data.computeResourceNodeId,
+            lease_duration=data.leaseDuration
+        )
+
+        return RenewJobLeasesResponse(renewedJobIds=renewed_job_ids, success=True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 def _authenticate_compute_resource_request(
     compute_resource_id: str,
     compute_resource_payload: str,
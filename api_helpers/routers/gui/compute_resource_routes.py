@@ -1,6 +1,7 @@
 from typing import Union, List, Any
 import os
 import time
+import hashlib
 from pydantic import BaseModel
 from fastapi import APIRouter, HTTPException, Header
 from ...services._crypto_keys import _verify_signature
@@ -9,6 +10,8 @@ from ._authenticate_gui_request import _authenticate_gui_request
 from ...clients.db import fetch_compute_resource, fetch_compute_resources_for_user, update_compute_resource, fetch_compute_resource_jobs
 from ...clients.db import register_compute_resource as db_register_compute_resource
 from ...core.settings import get_settings
+from ...core.orjson_response import ORJSONModelResponse
+from ...core._etag import _etag_matches, _get_etag_headers, _not_modified_response
 
 
 router = APIRouter()
@@ -19,12 +22,18 @@ class GetComputeResourceResponse(BaseModel):
     success: bool
 
 @router.get("/{compute_resource_id}")
-async def get_compute_resource(compute_resource_id) -> GetComputeResourceResponse:
+async def get_compute_resource(compute_resource_id, if_none_match: Union[str, None] = Header(None)) -> GetComputeResourceResponse:
     try:
         compute_resource = await fetch_compute_resource(compute_resource_id)
         if compute_resource is None:
             raise Exception(f"No compute resource with ID {compute_resource_id}")
-        return GetComputeResourceResponse(computeResource=compute_resource, success=True)
+        # compute resources have no modification timestamp, so the ETag is a hash of the content
+        response = ORJSONModelResponse(GetComputeResourceResponse(computeResource=compute_resource, success=True))
+        etag = f'"{hashlib.sha1(response.body).hexdigest()}"'
+        if _etag_matches(if_none_match, etag):
+            return _not_modified_response(etag)
+        response.headers.update(_get_etag_headers(etag))
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -182,7 +191,7 @@ async def get_jobs_for_compute_resource(compute_resource_id, github_access_token
         
         jobs = await fetch_compute_resource_jobs(compute_resource_id, statuses=None, include_private_keys=False)
 
-        return GetJobsForComputeResourceResponse(jobs=jobs, success=True)
+        return ORJSONModelResponse(GetJobsForComputeResourceResponse(jobs=jobs, success=True))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -3,6 +3,8 @@ from pydantic import BaseModel
 from fastapi import APIRouter, HTTPException, Header
 from ._authenticate_gui_request import _authenticate_gui_request
 from ...services.gui.create_job import create_job
+from ...services.gui.create_jobs_batch import create_jobs_batch, CreateJobsBatchRequestJob
+from ...core._create_random_id import _create_random_id
 from ...core.protocaas_types import ComputeResourceSpecProcessor
 
 
@@ -31,6 +33,8 @@ class CreateJobRequest(BaseModel):
     processorSpec: ComputeResourceSpecProcessor
     batchId: Union[str, None] = None
     dandiApiKey: Union[str, None] = None
+    priority: Union[int, None] = None
+    forceRerun: bool = False # do not reuse an identical job or its outputs
 
 class CreateJobResponse(BaseModel):
     jobId: str
@@ -54,6 +58,8 @@ async def create_job_handler(data: CreateJobRequest, github_access_token: str=He
         processor_spec = data.processorSpec
         batch_id = data.batchId
         dandi_api_key = data.dandiApiKey
+        priority = data.priority
+        force_rerun = data.forceRerun
 
         job_id = await create_job(
             workspace_id=workspace_id,
@@ -65,7 +71,9 @@ async def create_job_handler(data: CreateJobRequest, github_access_token: str=He
             processor_spec=processor_spec,
             batch_id=batch_id,
             user_id=user_id,
-            dandi_api_key=dandi_api_key
+            dandi_api_key=dandi_api_key,
+            priority=priority,
+            force_rerun=force_rerun
         )
 
         return CreateJobResponse(
@@ -73,4 +81,50 @@ async def create_job_handler(data: CreateJobRequest, github_access_token: str=He
             success=True
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# create jobs batch
+class CreateJobsBatchRequest(BaseModel):
+    workspaceId: str
+    projectId: str
+    jobs: List[CreateJobsBatchRequestJob]
+    processorSpecs: List[ComputeResourceSpecProcessor]
+    batchId: Union[str, None] = None
+    dandiApiKey: Union[str, None] = None
+    priority: Union[int, None] = None
+
+class CreateJobsBatchResponse(BaseModel):
+    jobIds: List[str]
+    batchId: str
+    success: bool
+
+@router.post("/jobs/batch")
+async def create_jobs_batch_handler(data: CreateJobsBatchRequest, github_access_token: str=Header(...)) -> CreateJobsBatchResponse:
+    try:
+        # authenticate the request
+        user_id = await _authenticate_gui_request(github_access_token)
+        if not user_id:
+            raise Exception('User is not authenticated')
+
+        batch_id = data.batchId
+        if batch_id is None:
+            batch_id = _create_random_id(8)
+
+        job_ids = await create_jobs_batch(
+            workspace_id=data.workspaceId,
+            project_id=data.projectId,
+            jobs=data.jobs,
+            processor_specs=data.processorSpecs,
+            batch_id=batch_id,
+            user_id=user_id,
+            dandi_api_key=data.dandiApiKey,
+            priority=data.priority
+        )
+
+        return CreateJobsBatchResponse(
+            jobIds=job_ids,
+            batchId=batch_id,
+            success=True
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
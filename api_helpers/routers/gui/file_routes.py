@@ -5,8 +5,11 @@ from ...services._remove_detached_files_and_jobs import _remove_detached_files_a
 from ...core.protocaas_types import ProtocaasFile
 from ._authenticate_gui_request import _authenticate_gui_request
 from ...core._get_workspace_role import _get_workspace_role
-from ...clients.db import fetch_file, fetch_project_files, fetch_project, fetch_workspace, delete_file as db_delete_file
+from ...clients.db import fetch_file, fetch_project_files, fetch_project, fetch_workspace, delete_file as db_delete_file, fetch_project_timestamp_modified
+from ...core.orjson_response import ORJSONModelResponse
+from ...core._etag import _etag_matches, _get_etag_headers, _get_timestamp_etag, _not_modified_response
 from ...services.gui.set_file import set_file as service_set_file
+from ...clients.project_events import publish_project_event
 
 router = APIRouter()
 
@@ -31,10 +34,17 @@ class GetFilesResponse(BaseModel):
     success: bool
 
 @router.get("/projects/{project_id}/files")
-async def get_files(project_id):
+async def get_files(project_id, if_none_match: Union[str, None] = Header(None)):
     try:
+        # the timestamp of the project changes whenever its files change, so it is checked before loading the files
+        timestamp_modified = await fetch_project_timestamp_modified(project_id)
+        if timestamp_modified is None:
+            raise Exception(f"No project with ID {project_id}")
+        etag = _get_timestamp_etag('files', project_id, timestamp_modified)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified_response(etag)
         files = await fetch_project_files(project_id)
-        return GetFilesResponse(files=files, success=True)
+        return ORJSONModelResponse(GetFilesResponse(files=files, success=True), headers=_get_etag_headers(etag))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -106,6 +116,7 @@ async def delete_file(project_id, file_name, github_access_token: str=Header(...
             raise Exception('User does not have permission to set file content in this project')
         
         await db_delete_file(project_id, file_name)
+        await publish_project_event(project_id, {'type': 'fileDeleted', 'fileName': file_name})
 
         # remove detached files and jobs
         await _remove_detached_files_and_jobs(project_id)
@@ -5,6 +5,7 @@ from ...core.protocaas_types import ProtocaasJob
 from ._authenticate_gui_request import _authenticate_gui_request
 from ...core._get_workspace_role import _get_workspace_role
 from ...clients.db import fetch_job, fetch_workspace, delete_job as db_delete_job
+from ...clients.project_events import publish_project_event
 
 
 router = APIRouter()
@@ -49,6 +50,7 @@ async def delete_job(job_id, github_access_token: str=Header(...)) -> DeleteJobR
             raise Exception('User does not have permission to delete jobs in this project')
         
         await db_delete_job(job_id)
+        await publish_project_event(job.projectId, {'type': 'jobDeleted', 'jobId': job_id})
 
         # remove detached files and jobs
         await _remove_detached_files_and_jobs(job.projectId)
@@ -1,13 +1,17 @@
-from typing import List
+from typing import List, Union
 import time
 from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from ...core._create_random_id import _create_random_id
 from ...core.protocaas_types import ProtocaasJob, ProtocaasProject
 from ._authenticate_gui_request import _authenticate_gui_request
 from ...core._get_workspace_role import _get_workspace_role
-from ...clients.db import fetch_project, fetch_workspace, insert_project, update_workspace, update_project, fetch_project_jobs
+from ...clients.db import fetch_project, fetch_workspace, insert_project, update_workspace, update_project, fetch_project_jobs, fetch_project_timestamp_modified
 from ...services.gui.delete_project import delete_project as service_delete_project
+from ...services.gui.stream_project_events import stream_project_events
+from ...core.orjson_response import ORJSONModelResponse
+from ...core._etag import _etag_matches, _get_etag_headers, _get_timestamp_etag, _not_modified_response
 
 
 router = APIRouter()
@@ -18,12 +22,15 @@ class GetProjectReponse(BaseModel):
     success: bool
 
 @router.get("/{project_id}")
-async def get_project(project_id):
+async def get_project(project_id, if_none_match: Union[str, None] = Header(None)):
     try:
         project = await fetch_project(project_id)
         if project is None:
             raise Exception(f"No project with ID {project_id}")
-        return GetProjectReponse(project=project, success=True)
+        etag = _get_timestamp_etag('project', project_id, project.timestampModified)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified_response(etag)
+        return ORJSONModelResponse(GetProjectReponse(project=project, success=True), headers=_get_etag_headers(etag))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -148,9 +155,37 @@ class GetJobsResponse(BaseModel):
     success: bool
 
 @router.get("/{project_id}/jobs")
-async def get_jobs(project_id):
+async def get_jobs(project_id, if_none_match: Union[str, None] = Header(None)):
     try:
+        # the timestamp of the project changes whenever its jobs change, so it is checked before loading the jobs
+        timestamp_modified = await fetch_project_timestamp_modified(project_id)
+        if timestamp_modified is None:
+            raise Exception(f"No project with ID {project_id}")
+        etag = _get_timestamp_etag('jobs', project_id, timestamp_modified)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified_response(etag)
         jobs = await fetch_project_jobs(project_id, include_private_keys=False)
-        return GetJobsResponse(jobs=jobs, success=True)
+        return ORJSONModelResponse(GetJobsResponse(jobs=jobs, success=True), headers=_get_etag_headers(etag))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# stream of changes to the jobs and files of a project (server-sent events)
+@router.get("/{project_id}/events")
+async def get_project_events(project_id, last_event_id: Union[str, None] = Header(None)):
+    try:
+        timestamp_modified = await fetch_project_timestamp_modified(project_id)
+        if timestamp_modified is None:
+            raise Exception(f"No project with ID {project_id}")
+        last_event_id_int = int(last_event_id) if last_event_id is not None and last_event_id.isdigit() else None
+        return StreamingResponse(
+            stream_project_events(project_id, last_event_id=last_event_id_int),
+            media_type='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                # so that the GZip middleware and proxies pass the events through without buffering them
+                'Content-Encoding': 'identity',
+                'X-Accel-Buffering': 'no'
+            }
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Union
 import time
 from fastapi import APIRouter, HTTPException, Header
 from pydantic import BaseModel
@@ -8,6 +8,8 @@ from ...core._get_workspace_role import _get_workspace_role
 from ...services.gui.create_workspace import create_workspace as service_create_workspace
 from ...services.gui.delete_workspace import delete_workspace as service_delete_workspace
 from ...clients.db import fetch_workspace, fetch_workspaces_for_user, update_workspace, fetch_projects_in_workspace
+from ...core.orjson_response import ORJSONModelResponse
+from ...core._etag import _etag_matches, _get_etag_headers, _get_timestamp_etag, _not_modified_response
 
 
 router = APIRouter()
@@ -43,7 +45,7 @@ class GetWorkspaceResponse(BaseModel):
     success: bool
 
 @router.get("/{workspace_id}")
-async def get_workspace(workspace_id, github_access_token: str=Header(...)):
+async def get_workspace(workspace_id, github_access_token: str=Header(...), if_none_match: Union[str, None] = Header(None)):
     try:
         user_id = await _authenticate_gui_request(github_access_token)
 
@@ -55,7 +57,12 @@ async def get_workspace(workspace_id, github_access_token: str=Header(...)):
         if workspace_role == 'none':
             raise Exception('User does not have permission to read this workspace')
 
-        return GetWorkspaceResponse(workspace=workspace, success=True)
+        # checked after the permissions, so that a user who lost access does not keep a cached copy
+        etag = _get_timestamp_etag('workspace', workspace_id, workspace.timestampModified)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified_response(etag)
+
+        return ORJSONModelResponse(GetWorkspaceResponse(workspace=workspace, success=True), headers=_get_etag_headers(etag))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -73,6 +73,7 @@ async def _resolve_dandi_url(url: str, *, dandi_api_key: Union[str, None]) -> st
 class ProcessorUpdateJobStatusRequest(BaseModel):
     status: str
     error: Union[str, None] = None
+    computeResourceNodeId: Union[str, None] = None # the node that started the job (when setting the status to running)
 
 class ProcessorUpdateJobStatusResponse(BaseModel):
     success: bool
@@ -86,7 +87,7 @@ async def processor_update_job_status(job_id: str, data: ProcessorUpdateJobStatu
         if job.jobPrivateKey != job_private_key:
             raise Exception(f"Invalid job private key for job {job_id}")
         
-        await update_job_status(job=job, status=data.status, error=data.error)
+        await update_job_status(job=job, status=data.status, error=data.error, compute_resource_node_id=data.computeResourceNodeId)
 
         return ProcessorUpdateJobStatusResponse(success=True)
     except Exception as e:
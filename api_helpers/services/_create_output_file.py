@@ -4,6 +4,7 @@ from ..clients._get_mongo_client import _get_mongo_client
 from ..clients._remove_id_field import _remove_id_field
 from ..core._create_random_id import _create_random_id
 from ._remove_detached_files_and_jobs import _remove_detached_files_and_jobs
+from ..clients.project_events import publish_project_event, _get_file_updated_event
 from ..core.protocaas_types import ProtocaasFile, ProtocaasProject
 
 
@@ -57,6 +58,7 @@ async def _create_output_file(*,
         jobId=job_id
     )
     await files_collection.insert_one(new_file.dict(exclude_none=True))
+    await publish_project_event(project_id, _get_file_updated_event(new_file))
 
     if deleted_old_file:
         await _remove_detached_files_and_jobs(project_id)
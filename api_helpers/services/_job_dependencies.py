@@ -0,0 +1,59 @@
+from typing import List
+from ..core.protocaas_types import ProtocaasJob
+from ..clients.db import fetch_job, fetch_job_statuses, fetch_waiting_jobs, resolve_job_dependency, fail_waiting_jobs
+from ..clients.pubsub import publish_pubsub_message
+
+
+# A waiting job depends on outputs of upstream jobs that have not completed (see ProtocaasJob.waitingForJobIds).
+# When an upstream job completes, its dependent jobs get the file IDs of its outputs, and those that are
+# no longer waiting for anything become pending. When an upstream job fails, its dependent jobs fail too.
+
+async def _on_job_completed(job: ProtocaasJob):
+    # the output files of the job must have been created (with their file IDs)
+    output_file_ids = {f.fileName: f.fileId for f in job.outputFiles if f.fileId is not None}
+    waiting_jobs = await fetch_waiting_jobs(job.jobId)
+    new_pending_jobs: List[ProtocaasJob] = []
+    for waiting_job in waiting_jobs:
+        became_pending = await resolve_job_dependency(waiting_job.jobId, upstream_job_id=job.jobId, output_file_ids=output_file_ids)
+        if became_pending:
+            new_pending_jobs.append(waiting_job)
+    await _notify_new_pending_jobs(new_pending_jobs)
+
+async def _on_job_failed(job_id: str, *, error: str):
+    failed_job_ids = await fail_waiting_jobs(job_id, error=error)
+    for failed_job_id in failed_job_ids:
+        await _on_job_failed(failed_job_id, error=f'Upstream job failed: {failed_job_id}')
+
+async def _check_new_waiting_jobs(jobs: List[ProtocaasJob]):
+    # An upstream job may have completed or failed after the waiting jobs were validated, but before they were
+    # inserted, in which case nothing would wake them up. Resolving a dependency twice is harmless.
+    upstream_job_ids = list(set(x for job in jobs for x in (job.waitingForJobIds or [])))
+    if len(upstream_job_ids) == 0:
+        return
+    statuses = await fetch_job_statuses(upstream_job_ids)
+    for upstream_job_id in upstream_job_ids:
+        status = statuses.get(upstream_job_id, None)
+        if status is None:
+            await _on_job_failed(upstream_job_id, error=f'Upstream job was deleted: {upstream_job_id}')
+        elif status == 'failed':
+            await _on_job_failed(upstream_job_id, error=f'Upstream job failed: {upstream_job_id}')
+        elif status == 'completed':
+            upstream_job = await fetch_job(upstream_job_id)
+            if upstream_job is not None:
+                await _on_job_completed(upstream_job)
+
+async def _notify_new_pending_jobs(jobs: List[ProtocaasJob]):
+    # one message per compute resource
+    compute_resource_ids = list(set(job.computeResourceId for job in jobs))
+    for compute_resource_id in compute_resource_ids:
+        jobs2 = [job for job in jobs if job.computeResourceId == compute_resource_id]
+        await publish_pubsub_message(
+            channel=compute_resource_id,
+            message={
+                'type': 'newPendingJob',
+                'workspaceId': jobs2[0].workspaceId,
+                'projectId': jobs2[0].projectId,
+                'computeResourceId': compute_resource_id,
+                'jobIds': [job.jobId for job in jobs2]
+            }
+        )
@@ -0,0 +1,111 @@
+import time
+from typing import List, Dict, Union
+from ..core.protocaas_types import ProtocaasJob, ProtocaasFile, ProtocaasComputeResource, ComputeResourceSpecProcessor
+from ..core._get_job_fingerprint import _get_job_fingerprint
+from ..core._create_random_id import _create_random_id
+from ..clients.db import fetch_compute_resource, fetch_jobs_with_fingerprints, fetch_files_by_name
+
+
+# Jobs that would produce the same outputs have the same fingerprint (see _get_job_fingerprint).
+# A new job that is identical to an existing job of the project, with the same output files, is not created
+# (the existing job is used instead), and a new job that is identical to a completed job is completed right away,
+# with output files that point to the outputs of that job. This does not apply to jobs that are waiting for
+# upstream jobs, to jobs created with forceRerun (whose results can still be reused later), or to processors
+# with the attribute deterministic=False. It also only applies to processors of apps whose container image is pinned
+# by digest (e.g., image@sha256:...), since a tag such as :latest, or a local executable, can change without the
+# configuration of the compute resource changing.
+
+async def _set_job_fingerprints(jobs: List[ProtocaasJob], *, compute_resource_id: str):
+    compute_resource = await fetch_compute_resource(compute_resource_id)
+    for job in jobs:
+        if job.status != 'pending':
+            continue
+        if not _processor_is_deterministic(job.processorSpec):
+            continue
+        app_image = _get_processor_app_image(compute_resource, job.processorName) if compute_resource is not None else None
+        if app_image is None:
+            continue
+        job.fingerprint = _get_job_fingerprint(job, app_image=app_image)
+
+async def _find_identical_jobs(project_id: str, jobs: List[ProtocaasJob]) -> Dict[str, str]:
+    """Maps the IDs of new jobs to those of existing jobs with the same fingerprint and the same output files"""
+    fingerprints = list(set(job.fingerprint for job in jobs if job.fingerprint is not None))
+    existing_jobs = await fetch_jobs_with_fingerprints(project_id, fingerprints, statuses=['pending', 'queued', 'starting', 'running', 'completed'])
+    ret: Dict[str, str] = {}
+    for job in jobs:
+        if job.fingerprint is None:
+            continue
+        for existing_job in existing_jobs:
+            if existing_job.fingerprint == job.fingerprint and _get_output_file_names(existing_job) == _get_output_file_names(job):
+                ret[job.jobId] = existing_job.jobId
+                break
+    return ret
+
+async def _reuse_outputs_of_completed_jobs(project_id: str, jobs: List[ProtocaasJob]) -> List[ProtocaasFile]:
+    """Complete the new jobs that are identical to completed jobs, and return the output files to insert for them
+
+    This must be called before the existing outputs that the new jobs are going to replace are deleted,
+    and the returned files must be inserted after the jobs.
+    """
+    fingerprints = list(set(job.fingerprint for job in jobs if job.fingerprint is not None))
+    completed_jobs = await fetch_jobs_with_fingerprints(project_id, fingerprints, statuses=['completed'])
+    if len(completed_jobs) == 0:
+        return []
+    output_file_names = list(set(f.fileName for job in completed_jobs for f in job.outputFiles))
+    output_files_by_id = {f.fileId: f for f in await fetch_files_by_name(project_id, output_file_names)}
+    timestamp = time.time()
+    new_files: List[ProtocaasFile] = []
+    for job in jobs:
+        if job.fingerprint is None:
+            continue
+        for completed_job in completed_jobs:
+            if completed_job.fingerprint != job.fingerprint:
+                continue
+            # the outputs of the completed job must still exist
+            completed_job_outputs = {f.name: output_files_by_id.get(f.fileId, None) for f in completed_job.outputFiles}
+            if any(completed_job_outputs.get(f.name, None) is None for f in job.outputFiles):
+                continue
+            for output_file in job.outputFiles:
+                file = completed_job_outputs[output_file.name]
+                output_file.fileId = _create_random_id(8)
+                new_files.append(
+                    ProtocaasFile(
+                        projectId=job.projectId,
+                        workspaceId=job.workspaceId,
+                        fileId=output_file.fileId,
+                        userId=job.userId,
+                        fileName=output_file.fileName,
+                        size=file.size,
+                        timestampCreated=timestamp,
+                        content=file.content,
+                        metadata=file.metadata,
+                        jobId=job.jobId
+                    )
+                )
+            job.outputFileIds = [f.fileId for f in job.outputFiles]
+            job.status = 'completed'
+            job.timestampFinished = timestamp
+            job.consoleOutputUrl = completed_job.consoleOutputUrl
+            job.processorVersion = completed_job.processorVersion
+            job.reusedOutputsFromJobId = completed_job.jobId
+            break
+    return new_files
+
+def _processor_is_deterministic(processor_spec: ComputeResourceSpecProcessor) -> bool:
+    for a in processor_spec.attributes:
+        if a.name == 'deterministic':
+            return a.value not in [False, 'false', 'False', 0]
+    return True
+
+def _get_processor_app_image(compute_resource: ProtocaasComputeResource, processor_name: str) -> Union[str, None]:
+    """The container image of the app that provides the processor, or None if it is not pinned by digest"""
+    spec = compute_resource.spec or {}
+    for spec_app in spec.get('apps', []):
+        if any(p.get('name') == processor_name for p in spec_app.get('processors', [])):
+            app = next((a for a in compute_resource.apps if a.name == spec_app.get('name')), None)
+            if app is not None and app.container and '@sha256:' in app.container:
+                return app.container
+    return None
+
+def _get_output_file_names(job: ProtocaasJob) -> List[str]:
+    return [f'{f.name}:{f.fileName}' for f in job.outputFiles]
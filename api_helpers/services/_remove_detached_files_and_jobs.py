@@ -1,5 +1,7 @@
 from ..clients._get_mongo_client import _get_mongo_client
 from ..clients._remove_id_field import _remove_id_field
+from ..clients.db import touch_project
+from ..clients.project_events import publish_project_events
 from ..core.protocaas_types import ProtocaasFile, ProtocaasJob
 
 
@@ -22,6 +24,7 @@ async def _remove_detached_files_and_jobs(project_id: str):
     files = [ProtocaasFile(**x) for x in files]
     jobs = [ProtocaasJob(**x) for x in jobs]
 
+    something_removed = False
     something_changed = True
     while something_changed:
         file_ids = set(x.fileId for x in files)
@@ -34,6 +37,9 @@ async def _remove_detached_files_and_jobs(project_id: str):
             if job.outputFileIds:
                 if any(x not in file_ids for x in job.outputFileIds):
                     job_ids_to_delete.add(job.jobId)
+            if job.waitingForJobIds:
+                if any(x not in job_ids for x in job.waitingForJobIds):
+                    job_ids_to_delete.add(job.jobId)
         file_ids_to_delete = set()
         for file in files:
             if file.jobId:
@@ -42,13 +48,22 @@ async def _remove_detached_files_and_jobs(project_id: str):
         something_changed = False
         if len(job_ids_to_delete) > 0:
             something_changed = True
+            something_removed = True
             await jobs_collection.delete_many({
                 'jobId': {'$in': list(job_ids_to_delete)}
             })
+            await publish_project_events(project_id, [{'type': 'jobDeleted', 'jobId': job_id} for job_id in job_ids_to_delete])
             jobs = [x for x in jobs if x.jobId not in job_ids_to_delete]
         if len(file_ids_to_delete) > 0:
             something_changed = True
+            something_removed = True
             await files_collection.delete_many({
                 'fileId': {'$in': list(file_ids_to_delete)}
             })
-            files = [x for x in files if x.fileId not in file_ids_to_delete]
\ No newline at end of file
+            await publish_project_events(project_id, [
+                {'type': 'fileDeleted', 'fileName': file.fileName}
+                for file in files if file.fileId in file_ids_to_delete
+            ])
+            files = [x for x in files if x.fileId not in file_ids_to_delete]
+    if something_removed:
+        await touch_project(project_id)
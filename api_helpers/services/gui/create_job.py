@@ -1,12 +1,16 @@
 import time
 from typing import Union, List, Any
 from pydantic import BaseModel
-from ...core.protocaas_types import ComputeResourceSpecProcessor, ProtocaasJobInputFile, ProtocaasJobOutputFile, ProtocaasJob, ProtocaasJobInputParameter
-from ...clients.db import fetch_workspace, fetch_project, fetch_file, delete_file, fetch_project_jobs, delete_job, insert_job
+from ...core.protocaas_types import ComputeResourceSpecProcessor, ProtocaasJobInputFile, ProtocaasJobOutputFile, ProtocaasJob, ProtocaasJobInputParameter, ProtocaasFile
+from ...clients.db import fetch_workspace, fetch_project, fetch_file, delete_file, fetch_project_jobs, delete_job, insert_job, fetch_unfinished_job_ids_for_output_files, insert_files
 from ...core._get_workspace_role import _get_workspace_role
 from ...core._create_random_id import _create_random_id
+from ...core._clamp_job_priority import _clamp_job_priority
 from ...clients.pubsub import publish_pubsub_message
+from ...clients.project_events import publish_project_event, _get_file_updated_event
 from .._remove_detached_files_and_jobs import _remove_detached_files_and_jobs
+from .._job_dependencies import _check_new_waiting_jobs
+from .._job_memoization import _set_job_fingerprints, _find_identical_jobs, _reuse_outputs_of_completed_jobs
 from ...core.settings import get_settings
 
 class CreateJobRequestInputFile(BaseModel):
@@ -31,7 +35,9 @@ async def create_job(
     processor_spec: ComputeResourceSpecProcessor,
     batch_id: Union[str, None],
     user_id: str,
-    dandi_api_key: Union[str, None] = None
+    dandi_api_key: Union[str, None] = None,
+    priority: Union[int, None] = None,
+    force_rerun: bool = False
 ):
     workspace = await fetch_workspace(workspace_id)
     
@@ -51,10 +57,23 @@ async def create_job(
         raise Exception('Incorrect workspace ID for project')
     
     input_files: List[ProtocaasJobInputFile] = [] # {name, fileId, fileName}
+    waiting_for_job_ids: List[str] = []
     for input_file in input_files_from_request:
         file = await fetch_file(project_id, input_file.fileName)
         if file is None:
-            raise Exception(f"Project input file does not exist: {input_file.fileName}")
+            # the input file may be an output of a job that has not completed, in which case this job waits for it
+            upstream_job_ids = await fetch_unfinished_job_ids_for_output_files(project_id, [input_file.fileName])
+            if input_file.fileName not in upstream_job_ids:
+                raise Exception(f"Project input file does not exist: {input_file.fileName}")
+            if upstream_job_ids[input_file.fileName] not in waiting_for_job_ids:
+                waiting_for_job_ids.append(upstream_job_ids[input_file.fileName])
+            input_files.append(
+                ProtocaasJobInputFile(
+                    name=input_file.name,
+                    fileName=input_file.fileName
+                )
+            )
+            continue
         input_files.append(
             ProtocaasJobInputFile(
                 name=input_file.name,
@@ -79,32 +98,10 @@ async def create_job(
             )
         )
     
-    something_was_deleted = False
-    
-    # delete any existing output files
-    for output_file in output_files:
-        existing_file = await fetch_file(project_id, output_file.fileName)
-        if existing_file is not None:
-            await delete_file(project_id, output_file.fileName)
-            something_was_deleted = True
-    
-    # delete any jobs that are expected to produce the output files
-    # because maybe the output files haven't been created yet, but we still want to delete/cancel them
-    all_jobs = await fetch_project_jobs(project_id, include_private_keys=False)
-    
-    output_file_names = [x.fileName for x in output_files]
-    for job in all_jobs:
-        should_delete = False
-        for output_file in job.outputFiles:
-            if output_file.fileName in output_file_names:
-                should_delete = True
-        if should_delete:
-            await delete_job(job.jobId)
-            something_was_deleted = True
-    
-    if something_was_deleted:
-        await _remove_detached_files_and_jobs(project_id)
-    
+    for input_file in input_files:
+        if input_file.fileId is None and input_file.fileName in [x.fileName for x in output_files]:
+            raise Exception(f"Input file of job is also an output of the job: {input_file.fileName}")
+
     input_parameters2: List[ProtocaasJobInputParameter] = []
     for input_parameter in input_parameters:
         pp = next((x for x in processor_spec.parameters if x.name == input_parameter.name), None)
@@ -127,19 +124,71 @@ async def create_job(
         userId=user_id,
         processorName=processor_name,
         inputFiles=input_files,
-        inputFileIds=[x.fileId for x in input_files],
+        inputFileIds=[x.fileId for x in input_files if x.fileId is not None],
         inputParameters=input_parameters2,
         outputFiles=output_files,
         timestampCreated=time.time(),
         computeResourceId=compute_resource_id,
-        status='pending',
+        status='waiting' if len(waiting_for_job_ids) > 0 else 'pending',
+        waitingForJobIds=waiting_for_job_ids if len(waiting_for_job_ids) > 0 else None,
         processorSpec=processor_spec,
         batchId=batch_id,
+        priority=_clamp_job_priority(priority),
         dandiApiKey=dandi_api_key,
         consoleOutputUrl=f"{output_bucket_base_url}/protocaas-outputs/{job_id}/_console_output"
     )
     
+    await _set_job_fingerprints([job], compute_resource_id=compute_resource_id)
+    new_output_files: List[ProtocaasFile] = []
+    if not force_rerun:
+        # an identical job with the same output files already exists, so there is nothing to do
+        identical_job_ids = await _find_identical_jobs(project_id, [job])
+        if job_id in identical_job_ids:
+            return identical_job_ids[job_id]
+        # an identical job has completed, so this job is completed right away with the same outputs
+        new_output_files = await _reuse_outputs_of_completed_jobs(project_id, [job])
+
+    something_was_deleted = False
+    
+    # delete any existing output files
+    for output_file in output_files:
+        existing_file = await fetch_file(project_id, output_file.fileName)
+        if existing_file is not None:
+            await delete_file(project_id, output_file.fileName)
+            await publish_project_event(project_id, {'type': 'fileDeleted', 'fileName': output_file.fileName})
+            something_was_deleted = True
+    
+    # delete any jobs that are expected to produce the output files
+    # because maybe the output files haven't been created yet, but we still want to delete/cancel them
+    all_jobs = await fetch_project_jobs(project_id, include_private_keys=False)
+    
+    output_file_names = [x.fileName for x in output_files]
+    for existing_job in all_jobs:
+        should_delete = False
+        for output_file in existing_job.outputFiles:
+            if output_file.fileName in output_file_names:
+                should_delete = True
+        if should_delete:
+            await delete_job(existing_job.jobId)
+            await publish_project_event(project_id, {'type': 'jobDeleted', 'jobId': existing_job.jobId})
+            something_was_deleted = True
+    
+    if something_was_deleted:
+        await _remove_detached_files_and_jobs(project_id)
+    
     await insert_job(job)
+    await publish_project_event(project_id, {'type': 'jobCreated', 'jobId': job.jobId})
+
+    if job.status == 'completed':
+        await insert_files(new_output_files)
+        for file in new_output_files:
+            await publish_project_event(project_id, _get_file_updated_event(file))
+        return job_id
+
+    if job.status == 'waiting':
+        # the compute resource is notified when the job becomes pending
+        await _check_new_waiting_jobs([job])
+        return job_id
 
     await publish_pubsub_message(
         channel=job.computeResourceId,
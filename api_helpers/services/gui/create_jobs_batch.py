@@ -0,0 +1,288 @@
+import time
+import itertools
+from typing import Union, List, Any, Dict
+from pydantic import BaseModel
+from ...core.protocaas_types import ComputeResourceSpecProcessor, ProtocaasJobInputFile, ProtocaasJobOutputFile, ProtocaasJob, ProtocaasJobInputParameter
+from ...clients.db import fetch_workspace, fetch_project, fetch_files_by_name, delete_files_by_name, fetch_job_ids_for_output_files, delete_jobs, insert_jobs, fetch_unfinished_job_ids_for_output_files, insert_files
+from ...core._get_workspace_role import _get_workspace_role
+from ...core._create_random_id import _create_random_id
+from ...core._clamp_job_priority import _clamp_job_priority
+from ...clients.pubsub import publish_pubsub_message
+from ...clients.project_events import publish_project_event, publish_project_events, _get_file_updated_event
+from .._remove_detached_files_and_jobs import _remove_detached_files_and_jobs
+from .._job_dependencies import _check_new_waiting_jobs
+from .._job_memoization import _set_job_fingerprints, _find_identical_jobs, _reuse_outputs_of_completed_jobs
+from ...core.settings import get_settings
+from .create_job import CreateJobRequestInputFile, CreateJobRequestOutputFile, CreateJobRequestInputParameter
+
+
+# Maximum number of jobs in a batch, after the parameter grids are expanded
+max_jobs_per_batch = 5000
+
+class CreateJobsBatchRequestParameterGridItem(BaseModel):
+    name: str
+    values: List[Any]
+
+class CreateJobsBatchRequestJob(BaseModel):
+    processorName: str
+    inputFiles: List[CreateJobRequestInputFile]
+    outputFiles: List[CreateJobRequestOutputFile]
+    inputParameters: List[CreateJobRequestInputParameter]
+    parameterGrid: Union[List[CreateJobsBatchRequestParameterGridItem], None] = None
+    priority: Union[int, None] = None
+    forceRerun: bool = False # do not reuse identical jobs or their outputs (see _job_memoization)
+
+async def create_jobs_batch(
+    workspace_id: str,
+    project_id: str,
+    jobs: List[CreateJobsBatchRequestJob],
+    processor_specs: List[ComputeResourceSpecProcessor],
+    batch_id: Union[str, None],
+    user_id: str,
+    dandi_api_key: Union[str, None] = None,
+    priority: Union[int, None] = None
+) -> List[str]:
+    """Create many jobs at once (see create_job)
+
+    The workspace, project and processor parameters are validated once, the input files are resolved with one query,
+    existing outputs are found with one query, and the jobs are inserted together, with a single notification to the
+    compute resource and a single jobsCreated project event.
+
+    A job with a parameterGrid expands into one job per combination of the grid values (which override inputParameters).
+    In output file names, ${job-id} is replaced by the job ID and ${parameter:NAME} by the value of the parameter NAME.
+
+    Jobs may use outputs of other jobs of the batch as inputs, in which case they wait for those jobs (see _job_dependencies).
+    Jobs that are identical to existing jobs are reused (see _job_memoization), and the IDs of those existing jobs
+    are returned in their place.
+    """
+    workspace = await fetch_workspace(workspace_id)
+
+    workspace_role = _get_workspace_role(workspace, user_id)
+    if workspace_role != 'admin' and workspace_role != 'editor':
+        raise Exception('User does not have permission to create jobs')
+
+    compute_resource_id = workspace.computeResourceId
+    if compute_resource_id is None:
+        compute_resource_id = get_settings().DEFAULT_COMPUTE_RESOURCE_ID
+        if compute_resource_id is None:
+            raise Exception('Workspace does not have a compute resource ID, and no default VITE_DEFAULT_COMPUTE_RESOURCE_ID is set in the environment.')
+
+    project = await fetch_project(project_id)
+    # important to check this
+    if project.workspaceId != workspace_id:
+        raise Exception('Incorrect workspace ID for project')
+
+    processor_specs_by_name: Dict[str, ComputeResourceSpecProcessor] = {x.name: x for x in processor_specs}
+
+    # expand the parameter grids
+    expanded_jobs: List[CreateJobsBatchRequestJob] = []
+    for job in jobs:
+        if job.processorName not in processor_specs_by_name:
+            raise Exception(f"No processor spec provided for processor: {job.processorName}")
+        for job2 in _expand_parameter_grid(job):
+            expanded_jobs.append(job2)
+            if len(expanded_jobs) > max_jobs_per_batch:
+                raise Exception(f'Too many jobs in batch (maximum is {max_jobs_per_batch})')
+    if len(expanded_jobs) == 0:
+        return []
+
+    output_bucket_base_url = get_settings().OUTPUT_BUCKET_BASE_URL
+    timestamp_created = time.time()
+    new_jobs: List[ProtocaasJob] = []
+    output_file_job_ids: Dict[str, str] = {} # the job in this batch that produces each output file
+    for job in expanded_jobs:
+        processor_spec = processor_specs_by_name[job.processorName]
+
+        input_parameters: List[ProtocaasJobInputParameter] = []
+        for input_parameter in job.inputParameters:
+            pp = next((x for x in processor_spec.parameters if x.name == input_parameter.name), None)
+            if not pp:
+                raise Exception(f"Processor parameter not found: {input_parameter.name}")
+            input_parameters.append(
+                ProtocaasJobInputParameter(
+                    name=input_parameter.name,
+                    value=input_parameter.value,
+                    secret=pp.secret
+                )
+            )
+
+        job_id = _create_random_id(8)
+        job_private_key = _create_random_id(32)
+
+        output_files: List[ProtocaasJobOutputFile] = []
+        for output_file in job.outputFiles:
+            output_file_name = _filter_output_file_name(output_file.fileName, job_id=job_id, input_parameters=job.inputParameters)
+            if output_file_name in output_file_job_ids:
+                raise Exception(f'More than one job in batch would produce the same output file: {output_file_name}')
+            output_file_job_ids[output_file_name] = job_id
+            output_files.append(
+                ProtocaasJobOutputFile(
+                    name=output_file.name,
+                    fileName=output_file_name
+                )
+            )
+
+        new_jobs.append(
+            ProtocaasJob(
+                jobId=job_id,
+                jobPrivateKey=job_private_key,
+                workspaceId=workspace_id,
+                projectId=project_id,
+                userId=user_id,
+                processorName=job.processorName,
+                inputFiles=[], # set below
+                inputFileIds=[],
+                inputParameters=input_parameters,
+                outputFiles=output_files,
+                timestampCreated=timestamp_created,
+                computeResourceId=compute_resource_id,
+                status='pending',
+                processorSpec=processor_spec,
+                batchId=batch_id,
+                priority=_clamp_job_priority(job.priority if job.priority is not None else priority),
+                dandiApiKey=dandi_api_key,
+                consoleOutputUrl=f"{output_bucket_base_url}/protocaas-outputs/{job_id}/_console_output"
+            )
+        )
+
+    output_file_names = list(output_file_job_ids.keys())
+
+    # resolve all the input files with one query. An input file that is an output of another job of the batch,
+    # or (if it does not exist) of an unfinished job of the project, makes the job wait for that job.
+    input_file_names = list(set(f.fileName for job in expanded_jobs for f in job.inputFiles))
+    input_files_by_name = {f.fileName: f for f in await fetch_files_by_name(project_id, input_file_names)}
+    # the existing jobs that produce the outputs of the batch are going to be deleted
+    job_ids_to_delete = await fetch_job_ids_for_output_files(project_id, output_file_names)
+    upstream_job_ids = await fetch_unfinished_job_ids_for_output_files(
+        project_id,
+        [x for x in input_file_names if x not in input_files_by_name and x not in output_file_job_ids]
+    )
+    upstream_job_ids = {k: v for k, v in upstream_job_ids.items() if v not in job_ids_to_delete}
+    for job, new_job in zip(expanded_jobs, new_jobs):
+        waiting_for_job_ids: List[str] = []
+        for input_file in job.inputFiles:
+            upstream_job_id = output_file_job_ids.get(input_file.fileName, None)
+            file = input_files_by_name.get(input_file.fileName, None)
+            if upstream_job_id is None and file is None:
+                upstream_job_id = upstream_job_ids.get(input_file.fileName, None)
+                if upstream_job_id is None:
+                    raise Exception(f"Project input file does not exist: {input_file.fileName}")
+            if upstream_job_id is not None:
+                if upstream_job_id not in waiting_for_job_ids:
+                    waiting_for_job_ids.append(upstream_job_id)
+                new_job.inputFiles.append(
+                    ProtocaasJobInputFile(
+                        name=input_file.name,
+                        fileName=input_file.fileName
+                    )
+                )
+            else:
+                new_job.inputFiles.append(
+                    ProtocaasJobInputFile(
+                        name=input_file.name,
+                        fileId=file.fileId,
+                        fileName=file.fileName
+                    )
+                )
+        new_job.inputFileIds = [x.fileId for x in new_job.inputFiles if x.fileId is not None]
+        if len(waiting_for_job_ids) > 0:
+            new_job.status = 'waiting'
+            new_job.waitingForJobIds = waiting_for_job_ids
+    _check_for_dependency_cycles(new_jobs)
+
+    # jobs that are identical to existing jobs with the same outputs are not created, and jobs that are
+    # identical to completed jobs are completed right away with the same outputs
+    await _set_job_fingerprints(new_jobs, compute_resource_id=compute_resource_id)
+    memoizable_jobs = [new_job for job, new_job in zip(expanded_jobs, new_jobs) if not job.forceRerun]
+    identical_job_ids = await _find_identical_jobs(project_id, memoizable_jobs)
+    job_ids = [identical_job_ids.get(job.jobId, job.jobId) for job in new_jobs]
+    if len(identical_job_ids) > 0:
+        new_jobs = [job for job in new_jobs if job.jobId not in identical_job_ids]
+        for job in new_jobs:
+            if job.waitingForJobIds:
+                job.waitingForJobIds = list(dict.fromkeys(identical_job_ids.get(x, x) for x in job.waitingForJobIds))
+        # the existing jobs are kept, along with their outputs
+        job_ids_to_delete = [x for x in job_ids_to_delete if x not in identical_job_ids.values()]
+        output_file_names = [f.fileName for job in new_jobs for f in job.outputFiles]
+    new_output_files = await _reuse_outputs_of_completed_jobs(project_id, [job for job in memoizable_jobs if job.jobId not in identical_job_ids])
+
+    # delete any existing output files, and any jobs that are expected to produce them
+    existing_output_file_names = [f.fileName for f in await fetch_files_by_name(project_id, output_file_names)]
+    await delete_files_by_name(project_id, existing_output_file_names)
+    await delete_jobs(job_ids_to_delete)
+    await publish_project_events(
+        project_id,
+        [{'type': 'fileDeleted', 'fileName': x} for x in existing_output_file_names] +
+        [{'type': 'jobDeleted', 'jobId': x} for x in job_ids_to_delete]
+    )
+    if len(existing_output_file_names) > 0 or len(job_ids_to_delete) > 0:
+        await _remove_detached_files_and_jobs(project_id)
+
+    await insert_jobs(new_jobs)
+    if len(new_jobs) > 0:
+        await publish_project_event(project_id, {'type': 'jobsCreated', 'jobIds': [job.jobId for job in new_jobs]})
+    await insert_files(new_output_files)
+    await publish_project_events(project_id, [_get_file_updated_event(file) for file in new_output_files])
+
+    # waiting jobs are announced to the compute resource when they become pending
+    pending_job_ids = [job.jobId for job in new_jobs if job.status == 'pending']
+    if len(pending_job_ids) > 0:
+        await publish_pubsub_message(
+            channel=compute_resource_id,
+            message={
+                'type': 'newPendingJob',
+                'workspaceId': workspace_id,
+                'projectId': project_id,
+                'computeResourceId': compute_resource_id,
+                'jobIds': pending_job_ids
+            }
+        )
+    await _check_new_waiting_jobs([job for job in new_jobs if job.status == 'waiting'])
+
+    return job_ids
+
+def _expand_parameter_grid(job: CreateJobsBatchRequestJob) -> List[CreateJobsBatchRequestJob]:
+    if not job.parameterGrid:
+        return [job]
+    names = [x.name for x in job.parameterGrid]
+    if len(set(names)) != len(names):
+        raise Exception(f'Duplicate parameter in parameter grid for processor: {job.processorName}')
+    ret: List[CreateJobsBatchRequestJob] = []
+    for values in itertools.product(*[x.values for x in job.parameterGrid]):
+        input_parameters = [p for p in job.inputParameters if p.name not in names]
+        for name, value in zip(names, values):
+            input_parameters.append(CreateJobRequestInputParameter(name=name, value=value))
+        ret.append(
+            CreateJobsBatchRequestJob(
+                processorName=job.processorName,
+                inputFiles=job.inputFiles,
+                outputFiles=job.outputFiles,
+                inputParameters=input_parameters,
+                priority=job.priority,
+                forceRerun=job.forceRerun
+            )
+        )
+        if len(ret) > max_jobs_per_batch:
+            raise Exception(f'Too many jobs in batch (maximum is {max_jobs_per_batch})')
+    return ret
+
+def _check_for_dependency_cycles(jobs: List[ProtocaasJob]):
+    # jobs of the batch that (directly or indirectly) wait for themselves would never start
+    waiting_for = {job.jobId: set(job.waitingForJobIds or []) for job in jobs}
+    remaining = set(waiting_for.keys())
+    while True:
+        ready = [job_id for job_id in remaining if not any(x in remaining for x in waiting_for[job_id])]
+        if len(ready) == 0:
+            break
+        remaining.difference_update(ready)
+    if len(remaining) > 0:
+        raise Exception(f'Jobs in batch depend on each other in a cycle ({len(remaining)} jobs involved)')
+
+def _filter_output_file_name(file_name: str, *, job_id: str, input_parameters: List[CreateJobRequestInputParameter]):
+    # replace ${job-id} with the actual job ID and ${parameter:NAME} with the value of the parameter
+    file_name = file_name.replace('${job-id}', job_id)
+    for p in input_parameters:
+        file_name = file_name.replace('${parameter:' + p.name + '}', str(p.value))
+    if '${parameter:' in file_name:
+        raise Exception(f'Unresolved parameter in output file name: {file_name}')
+    return file_name
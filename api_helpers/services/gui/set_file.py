@@ -4,6 +4,7 @@ from ...clients.db import fetch_file, delete_file, insert_file, update_project
 from ...core.protocaas_types import ProtocaasFile
 from ...core._create_random_id import _create_random_id
 from .._remove_detached_files_and_jobs import _remove_detached_files_and_jobs
+from ...clients.project_events import publish_project_event, _get_file_updated_event
 
 
 async def set_file(
@@ -36,6 +37,7 @@ async def set_file(
         jobId=job_id
     )
     await insert_file(new_file)
+    await publish_project_event(project_id, _get_file_updated_event(new_file))
 
     if deleted_old_file:
         await _remove_detached_files_and_jobs(project_id)
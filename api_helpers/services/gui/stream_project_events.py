@@ -0,0 +1,64 @@
+import time
+import json
+import asyncio
+from typing import AsyncIterator, Union
+from ...clients.project_events import fetch_project_events, fetch_project_event_seq, fetch_oldest_project_event_seq
+
+
+# Each stream ends after this long, and the browser's EventSource reconnects, resuming from the last event ID
+# (serverless functions have a limited duration)
+max_stream_duration_sec = 50
+
+poll_interval_sec = 1
+
+keepalive_interval_sec = 15
+
+# An event whose sequence number has been allocated, but that has not been written yet, is waited for this long
+max_gap_wait_sec = 5
+
+max_events_per_poll = 100
+
+async def stream_project_events(project_id: str, *, last_event_id: Union[int, None]) -> AsyncIterator[str]:
+    """Server-sent events for the changes to the jobs and files of a project
+
+    The data of each event is a JSON object with a type: 'hello' (sent first when there is no last event ID,
+    the client should load the project after receiving it), 'reset' (the events since the last event ID are
+    no longer available, so the client should reload the project), 'jobCreated', 'jobsCreated', 'jobUpdated', 'jobDeleted',
+    'fileUpdated', or 'fileDeleted'.
+    """
+    # reconnect quickly when the stream ends
+    yield 'retry: 1000\n\n'
+    current_seq = await fetch_project_event_seq(project_id)
+    if last_event_id is None:
+        last_seq = current_seq
+        yield _format_event(last_seq, {'type': 'hello'})
+    else:
+        last_seq = last_event_id
+        oldest_seq = await fetch_oldest_project_event_seq(project_id)
+        if last_seq > current_seq or (last_seq < current_seq and (oldest_seq is None or oldest_seq > last_seq + 1)):
+            last_seq = current_seq
+            yield _format_event(last_seq, {'type': 'reset'})
+    timer = time.time()
+    last_send_time = time.time()
+    gap_start_time = None
+    while time.time() - timer < max_stream_duration_sec:
+        events = await fetch_project_events(project_id, after_seq=last_seq, limit=max_events_per_poll)
+        for e in events:
+            if e['seq'] != last_seq + 1:
+                # the publisher of the missing event may still be writing it
+                if gap_start_time is None:
+                    gap_start_time = time.time()
+                if time.time() - gap_start_time < max_gap_wait_sec:
+                    break
+            gap_start_time = None
+            last_seq = e['seq']
+            yield _format_event(last_seq, e['event'])
+            last_send_time = time.time()
+        if time.time() - last_send_time > keepalive_interval_sec:
+            yield ': keepalive\n\n'
+            last_send_time = time.time()
+        if len(events) < max_events_per_poll or gap_start_time is not None:
+            await asyncio.sleep(poll_interval_sec)
+
+def _format_event(seq: int, data: dict) -> str:
+    return f'id: {seq}\ndata: {json.dumps(data)}\n\n'
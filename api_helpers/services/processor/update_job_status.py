@@ -6,9 +6,12 @@ from ...core.settings import get_settings
 from .._create_output_file import _create_output_file
 from ...clients.db import update_job
 from ...clients.pubsub import publish_pubsub_message
+from ...clients.project_events import publish_project_event
+from .._job_dependencies import _on_job_completed, _on_job_failed
 
 
-async def update_job_status(job: ProtocaasJob, status: str, error: Union[str, None]):
+async def update_job_status(job: ProtocaasJob, status: str, error: Union[str, None], *, compute_resource_node_id: Union[str, None]=None):
+    # compute_resource_node_id is the node that started the job (reported when the status is set to running)
     old_status = job.status
 
     new_status = status
@@ -68,7 +71,25 @@ async def update_job_status(job: ProtocaasJob, status: str, error: Union[str, No
 
     # if update is non-empty, then update the job
     if len(update) > 0:
-        await update_job(job_id=job.jobId, update=update)
+        if new_status == 'running':
+            # The job may have gone back to pending (expired lease) and been claimed by another node since it was read,
+            # so only the node that holds the claim may start it -- otherwise both nodes would run it
+            claiming_node_id = compute_resource_node_id if compute_resource_node_id is not None else job.computeResourceNodeId
+            updated = await update_job(job_id=job.jobId, update=update, condition={
+                'status': 'starting',
+                'computeResourceNodeId': claiming_node_id
+            })
+            if not updated:
+                raise Exception(f"Cannot set job status to running: the job is no longer starting on node {claiming_node_id}")
+        else:
+            await update_job(job_id=job.jobId, update=update)
+        await publish_project_event(job.projectId, {'type': 'jobUpdated', 'jobId': job.jobId, 'update': update})
+
+    # start or fail the jobs that are waiting for the outputs of this job
+    if new_status == 'completed':
+        await _on_job_completed(job)
+    elif new_status == 'failed':
+        await _on_job_failed(job.jobId, error=f'Upstream job failed: {job.jobId}')
 
     await publish_pubsub_message(
         channel=job.computeResourceId,
@@ -0,0 +1,104 @@
+import sys
+import time
+import gzip
+import asyncio
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+sys.path.append('..')
+from api_helpers.core.protocaas_types import ProtocaasJob, ProtocaasComputeResource
+from api_helpers.core.orjson_response import ORJSONModelResponse
+from api_helpers.routers.gui.project_routes import GetJobsResponse
+from api_helpers.routers.gui.compute_resource_routes import GetComputeResourceResponse
+from api_helpers.routers.compute_resource.router import GetUnfinishedJobsResponse
+
+
+# Compares the serialization time and the size on the wire of some large API responses,
+# for the default FastAPI path (response model validation + jsonable_encoder + json.dumps)
+# and for returning ORJSONModelResponse directly, with and without gzip.
+# Run from the devel directory: python benchmark_api_serialization.py
+
+num_jobs = 500
+num_processors = 40
+num_parameters_per_processor = 15
+num_repeats = 5
+gzip_compresslevel = 9 # the default of the GZip middleware
+
+def make_processor_spec(i: int):
+    return {
+        'name': f'processor_{i}',
+        'help': 'Run spike sorting on an electrophysiology recording and write the result to an NWB file. ' * 3,
+        'inputs': [{'name': 'input', 'help': 'Input NWB file', 'list': False}],
+        'outputs': [{'name': 'output', 'help': 'Output NWB file'}],
+        'parameters': [
+            {'name': f'param_{j}', 'help': f'Description of parameter {j}', 'type': 'float', 'default': j * 0.5, 'options': None, 'secret': False}
+            for j in range(num_parameters_per_processor)
+        ],
+        'attributes': [{'name': 'wip', 'value': True}],
+        'tags': [{'tag': 'spike_sorting'}, {'tag': 'electrophysiology'}],
+        'resources': {'numCpus': 4, 'memoryGb': 16, 'diskGb': None, 'timeMin': 240, 'parameterOverrides': []}
+    }
+
+def make_job(i: int) -> ProtocaasJob:
+    return ProtocaasJob(
+        projectId='p1',
+        workspaceId='w1',
+        jobId=f'job-{i:06d}',
+        jobPrivateKey='',
+        userId='github|user',
+        processorName=f'processor_{i % num_processors}',
+        inputFiles=[{'name': 'input', 'fileId': f'file-{i}', 'fileName': f'imported/sub-{i}/sub-{i}_ecephys.nwb'}],
+        inputFileIds=[f'file-{i}'],
+        inputParameters=[{'name': f'param_{j}', 'value': j * 0.5} for j in range(num_parameters_per_processor)],
+        outputFiles=[{'name': 'output', 'fileName': f'generated/sub-{i}/sorting.nwb', 'fileId': f'file-out-{i}'}],
+        timestampCreated=1.7e9 + i,
+        computeResourceId='cr1',
+        status='completed',
+        consoleOutputUrl=f'https://bucket.example.org/jobs/job-{i:06d}/console_output',
+        timestampStarted=1.7e9 + i + 10,
+        timestampFinished=1.7e9 + i + 100,
+        processorSpec=make_processor_spec(i % num_processors)
+    )
+
+def make_compute_resource() -> ProtocaasComputeResource:
+    return ProtocaasComputeResource(
+        computeResourceId='cr1',
+        ownerId='github|user',
+        name='benchmark',
+        timestampCreated=1.7e9,
+        apps=[{'name': f'app_{i}', 'executablePath': f'/apps/app_{i}/main.py', 'container': f'ghcr.io/example/app_{i}:latest'} for i in range(4)],
+        spec={'apps': [{'name': f'app_{i}', 'help': '', 'processors': [make_processor_spec(j) for j in range(10)], 'warmWorker': False} for i in range(4)]}
+    )
+
+async def default_path(response_model_class, response) -> bytes:
+    # what FastAPI does for an endpoint that returns a pydantic model and declares its response model
+    field = create_response_field(name='response', type_=response_model_class)
+    content = await serialize_response(field=field, response_content=response)
+    return JSONResponse(content).body
+
+async def orjson_path(response_model_class, response) -> bytes:
+    return ORJSONModelResponse(response).body
+
+async def benchmark(name: str, response_model_class, response):
+    print(name)
+    for label, func in [('default', default_path), ('orjson', orjson_path)]:
+        times = []
+        for _ in range(num_repeats):
+            t0 = time.perf_counter()
+            body = await func(response_model_class, response)
+            times.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        compressed = gzip.compress(body, compresslevel=gzip_compresslevel)
+        elapsed_gzip = time.perf_counter() - t0
+        print(f'  {label:8s} serialize {min(times) * 1000:8.1f} ms   {len(body) / 1e3:8.1f} kB   gzip {len(compressed) / 1e3:7.1f} kB (+{elapsed_gzip * 1000:.1f} ms)')
+
+async def main():
+    jobs = [make_job(i) for i in range(num_jobs)]
+    await benchmark(f'get_jobs ({num_jobs} jobs)', GetJobsResponse, GetJobsResponse(jobs=jobs, success=True))
+    await benchmark(f'unfinished_jobs ({num_jobs} jobs)', GetUnfinishedJobsResponse, GetUnfinishedJobsResponse(jobs=jobs, success=True))
+    compute_resource = make_compute_resource()
+    await benchmark('get_compute_resource', GetComputeResourceResponse, GetComputeResourceResponse(computeResource=compute_resource, success=True))
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,419 @@
+import asyncio
+import itertools
+from typing import Any, Dict, List, Tuple, Union
+import orjson
+
+
+# An in-memory stand-in for the motor client (AsyncIOMotorClient), covering the queries and updates of api_helpers.
+# It is plugged in by setting loop._mongo_client (see api_helpers/clients/_get_mongo_client.py).
+#
+# Like motor, operations run when they are called (not when they are awaited), and they return futures.
+# Documents are copied on the way in and out (as they would be by BSON encoding and decoding), and equality and
+# $in queries use hash indexes (multikey, like those of mongo), so that the cost of a query is proportional
+# to what it returns rather than to the size of the collection, as it would be with the right indexes in mongo.
+
+# Indexes of each collection (a query is planned on the index with the most fields that it constrains)
+default_indexes: Dict[str, List[Tuple[str, ...]]] = {
+    'workspaces': [('workspaceId',)],
+    'projects': [('projectId',), ('workspaceId',)],
+    'files': [('projectId', 'fileName'), ('projectId',), ('fileId',), ('workspaceId',)],
+    'jobs': [
+        ('jobId',),
+        ('projectId',),
+        ('projectId', 'outputFiles.fileName'),
+        ('projectId', 'fingerprint'),
+        ('computeResourceId', 'status'),
+        ('waitingForJobIds',),
+        ('workspaceId',)
+    ],
+    'computeResources': [('computeResourceId',), ('ownerId',)],
+    'computeResourceNodes': [('computeResourceId', 'nodeId')],
+    'projectEvents': [('projectId',)],
+    'projectEventCounters': [('projectId',)]
+}
+
+class MemoryMongoClient:
+    def __init__(self, *, latency_sec: float=0, indexes: Union[Dict[str, List[Tuple[str, ...]]], None]=None):
+        """latency_sec is added to every operation (a simulated round trip to the database)"""
+        self._latency_sec = latency_sec
+        self._indexes = indexes if indexes is not None else default_indexes
+        self._databases: Dict[str, MemoryDatabase] = {}
+        self.num_operations = 0
+    def __getitem__(self, name: str):
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(self)
+        return self._databases[name]
+
+class MemoryDatabase:
+    def __init__(self, client: MemoryMongoClient):
+        self._client = client
+        self._collections: Dict[str, MemoryCollection] = {}
+    def __getitem__(self, name: str):
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self._client, self._client._indexes.get(name, []))
+        return self._collections[name]
+    def collection_names(self) -> List[str]:
+        return list(self._collections.keys())
+
+class UpdateResult:
+    def __init__(self, matched_count: int, modified_count: int, upserted_id: Union[int, None]=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+
+class DeleteResult:
+    def __init__(self, deleted_count: int):
+        self.deleted_count = deleted_count
+
+class MemoryCollection:
+    def __init__(self, client: MemoryMongoClient, indexes: List[Tuple[str, ...]]):
+        self._client = client
+        self._docs: Dict[int, dict] = {} # in insertion order
+        self._next_id = 0
+        self._indexes: Dict[Tuple[str, ...], Dict[tuple, set]] = {fields: {} for fields in indexes}
+
+    # reads
+
+    def find(self, query: dict, projection: Union[dict, None]=None):
+        return MemoryCursor(self, query, projection)
+
+    def find_one(self, query: dict, projection: Union[dict, None]=None):
+        ids = self._find_ids(query, limit=1)
+        return self._result(_copy_doc(self._docs[ids[0]], projection) if len(ids) > 0 else None)
+
+    def count_documents(self, query: dict):
+        return self._result(len(self._find_ids(query)))
+
+    # writes
+
+    def insert_one(self, doc: dict):
+        self._insert(_copy_doc(doc, None))
+        return self._result(None)
+
+    def insert_many(self, docs: List[dict]):
+        for doc in docs:
+            self._insert(_copy_doc(doc, None))
+        return self._result(None)
+
+    def delete_one(self, query: dict):
+        ids = self._find_ids(query, limit=1)
+        for id in ids:
+            self._delete(id)
+        return self._result(DeleteResult(len(ids)))
+
+    def delete_many(self, query: dict):
+        ids = self._find_ids(query)
+        for id in ids:
+            self._delete(id)
+        return self._result(DeleteResult(len(ids)))
+
+    def update_one(self, query: dict, update: dict, upsert: bool=False):
+        ids = self._find_ids(query, limit=1)
+        if len(ids) == 0:
+            if upsert:
+                return self._result(UpdateResult(0, 0, upserted_id=self._upsert(query, update)))
+            return self._result(UpdateResult(0, 0))
+        modified = self._update(ids[0], update)
+        return self._result(UpdateResult(1, 1 if modified else 0))
+
+    def update_many(self, query: dict, update: dict, upsert: bool=False):
+        ids = self._find_ids(query)
+        if len(ids) == 0 and upsert:
+            return self._result(UpdateResult(0, 0, upserted_id=self._upsert(query, update)))
+        num_modified = sum(1 for id in ids if self._update(id, update))
+        return self._result(UpdateResult(len(ids), num_modified))
+
+    def find_one_and_update(self, query: dict, update: dict, projection: Union[dict, None]=None, upsert: bool=False, return_document: bool=False):
+        # return_document is pymongo's ReturnDocument.BEFORE (False) or ReturnDocument.AFTER (True)
+        ids = self._find_ids(query, limit=1)
+        if len(ids) == 0:
+            if not upsert:
+                return self._result(None)
+            id = self._upsert(query, update)
+            return self._result(_copy_doc(self._docs[id], projection) if return_document else None)
+        before = _copy_doc(self._docs[ids[0]], projection) if not return_document else None
+        self._update(ids[0], update)
+        return self._result(_copy_doc(self._docs[ids[0]], projection) if return_document else before)
+
+    def find_one_and_delete(self, query: dict, projection: Union[dict, None]=None):
+        ids = self._find_ids(query, limit=1)
+        if len(ids) == 0:
+            return self._result(None)
+        doc = _copy_doc(self._docs[ids[0]], projection)
+        self._delete(ids[0])
+        return self._result(doc)
+
+    def create_index(self, keys, **kwargs):
+        # keys is a list of (field, direction) pairs, as in pymongo
+        fields = tuple(k for k, _ in keys)
+        if fields not in self._indexes:
+            self._indexes[fields] = {}
+            for id, doc in self._docs.items():
+                self._add_to_index(fields, id, doc)
+        return self._result('_'.join(fields))
+
+    def load_documents(self, docs: List[dict]):
+        """Insert documents without copying them (for loading large synthetic datasets; the documents must not be modified afterwards)"""
+        for doc in docs:
+            self._insert(doc)
+
+    # internals
+
+    def _result(self, x):
+        self._client.num_operations += 1
+        loop = asyncio.get_event_loop()
+        fut = loop.create_future()
+        if self._client._latency_sec > 0:
+            loop.call_later(self._client._latency_sec, fut.set_result, x)
+        else:
+            fut.set_result(x)
+        return fut
+
+    def _insert(self, doc: dict):
+        id = self._next_id
+        self._next_id += 1
+        self._docs[id] = doc
+        for fields in self._indexes:
+            self._add_to_index(fields, id, doc)
+        return id
+
+    def _delete(self, id: int):
+        doc = self._docs.pop(id)
+        for fields in self._indexes:
+            self._remove_from_index(fields, id, doc)
+
+    def _update(self, id: int, update: dict) -> bool:
+        doc = self._docs[id]
+        new_doc = _copy_doc(doc, None)
+        _apply_update(new_doc, update)
+        if new_doc == doc:
+            return False
+        for fields in self._indexes:
+            self._remove_from_index(fields, id, doc)
+        self._docs[id] = new_doc
+        for fields in self._indexes:
+            self._add_to_index(fields, id, new_doc)
+        return True
+
+    def _upsert(self, query: dict, update: dict) -> int:
+        doc = {k: v for k, v in query.items() if not k.startswith('$') and '.' not in k and not _is_operator_condition(v)}
+        _apply_update(doc, update)
+        return self._insert(doc)
+
+    def _add_to_index(self, fields: Tuple[str, ...], id: int, doc: dict):
+        index = self._indexes[fields]
+        for key in _get_index_keys(doc, fields):
+            index.setdefault(key, set()).add(id)
+
+    def _remove_from_index(self, fields: Tuple[str, ...], id: int, doc: dict):
+        index = self._indexes[fields]
+        for key in _get_index_keys(doc, fields):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(id)
+                if len(ids) == 0:
+                    del index[key]
+
+    def _find_ids(self, query: dict, limit: Union[int, None]=None) -> List[int]:
+        candidate_ids = self._get_candidate_ids(query)
+        ret = []
+        for id in candidate_ids:
+            if _matches(self._docs[id], query):
+                ret.append(id)
+                if limit is not None and len(ret) >= limit:
+                    break
+        return ret
+
+    def _get_candidate_ids(self, query: dict):
+        # use the index on the most fields that the query constrains by equality or $in
+        best_fields = None
+        for fields in self._indexes:
+            if all(_get_equality_values(query, f) is not None for f in fields):
+                if best_fields is None or len(fields) > len(best_fields):
+                    best_fields = fields
+        if best_fields is None:
+            return list(self._docs.keys())
+        index = self._indexes[best_fields]
+        ids = set()
+        for key in itertools.product(*[_get_equality_values(query, f) for f in best_fields]):
+            ids.update(index.get(tuple(_hashable(v) for v in key), ()))
+        # in insertion order, as mongo would return them without a sort
+        return sorted(ids)
+
+class MemoryCursor:
+    def __init__(self, collection: MemoryCollection, query: dict, projection: Union[dict, None]):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._limit = 0
+    def sort(self, key, direction: Union[int, None]=None):
+        self._sort = list(key) if isinstance(key, list) else [(key, direction if direction is not None else 1)]
+        return self
+    def limit(self, limit: int):
+        self._limit = limit
+        return self
+    def to_list(self, length: Union[int, None]=None):
+        c = self._collection
+        ids = c._find_ids(self._query)
+        docs = [c._docs[id] for id in ids]
+        for key, direction in reversed(self._sort):
+            docs.sort(key=lambda doc: _sort_key(_get_values(doc, key)), reverse=direction < 0)
+        if self._limit:
+            docs = docs[:self._limit]
+        if length is not None:
+            docs = docs[:length]
+        return c._result([_copy_doc(doc, self._projection) for doc in docs])
+
+def _copy_doc(doc: dict, projection: Union[dict, None]) -> dict:
+    if projection:
+        doc = {k: v for k, v in doc.items() if projection.get(k)}
+    return orjson.loads(orjson.dumps(doc))
+
+def _get_values(doc: Any, key: str) -> List[Any]:
+    # the values at a dotted path, descending into arrays (each array is also matched by its elements)
+    values = [doc]
+    for part in key.split('.'):
+        new_values = []
+        for v in values:
+            if isinstance(v, dict):
+                if part in v:
+                    new_values.append(v[part])
+            elif isinstance(v, list):
+                if part.isdigit() and int(part) < len(v):
+                    new_values.append(v[int(part)])
+                else:
+                    new_values.extend(x[part] for x in v if isinstance(x, dict) and part in x)
+        values = new_values
+    ret = []
+    for v in values:
+        ret.append(v)
+        if isinstance(v, list):
+            ret.extend(v)
+    return ret
+
+def _get_index_keys(doc: dict, fields: Tuple[str, ...]) -> List[tuple]:
+    value_lists = []
+    for f in fields:
+        values = [v for v in _get_values(doc, f) if not isinstance(v, list)]
+        value_lists.append(values if len(values) > 0 else [None])
+    return [tuple(_hashable(v) for v in key) for key in itertools.product(*value_lists)]
+
+def _get_equality_values(query: dict, field: str) -> Union[List[Any], None]:
+    if field not in query:
+        return None
+    cond = query[field]
+    if not _is_operator_condition(cond):
+        return None if isinstance(cond, list) else [cond]
+    if list(cond.keys()) == ['$in']:
+        return list(cond['$in'])
+    return None
+
+def _hashable(v: Any):
+    if isinstance(v, dict):
+        return tuple((k, _hashable(x)) for k, x in v.items())
+    return v
+
+def _is_operator_condition(cond: Any) -> bool:
+    return isinstance(cond, dict) and len(cond) > 0 and all(k.startswith('$') for k in cond.keys())
+
+def _matches(doc: dict, query: dict) -> bool:
+    for key, cond in query.items():
+        if key.startswith('$'):
+            raise Exception(f'Unsupported query operator: {key}')
+        values = _get_values(doc, key)
+        if _is_operator_condition(cond):
+            for op, arg in cond.items():
+                if not _matches_operator(values, op, arg):
+                    return False
+        else:
+            if cond not in values and not (cond is None and len(values) == 0):
+                return False
+    return True
+
+def _matches_operator(values: List[Any], op: str, arg: Any) -> bool:
+    if op == '$in':
+        return any(v in arg for v in values) or (None in arg and len(values) == 0)
+    elif op == '$nin':
+        return not _matches_operator(values, '$in', arg)
+    elif op == '$ne':
+        return arg not in values and not (arg is None and len(values) == 0)
+    elif op == '$exists':
+        return (len(values) > 0) == bool(arg)
+    elif op == '$size':
+        return any(isinstance(v, list) and len(v) == arg for v in values)
+    elif op in ['$gt', '$gte', '$lt', '$lte']:
+        for v in values:
+            if v is None or isinstance(v, (list, dict)) or isinstance(v, str) != isinstance(arg, str):
+                continue
+            if (op == '$gt' and v > arg) or (op == '$gte' and v >= arg) or (op == '$lt' and v < arg) or (op == '$lte' and v <= arg):
+                return True
+        return False
+    else:
+        raise Exception(f'Unsupported query operator: {op}')
+
+def _apply_update(doc: dict, update: dict):
+    for op, fields in update.items():
+        for key, arg in fields.items():
+            parent, last = _get_parent(doc, key, create=op in ['$set', '$inc', '$addToSet', '$push'])
+            if parent is None:
+                continue
+            if op == '$set':
+                _set_child(parent, last, arg)
+            elif op == '$unset':
+                if isinstance(parent, dict):
+                    parent.pop(last, None)
+            elif op == '$inc':
+                _set_child(parent, last, _get_child(parent, last, 0) + arg)
+            elif op == '$pull':
+                a = _get_child(parent, last, None)
+                if isinstance(a, list):
+                    _set_child(parent, last, [x for x in a if not (_matches(x, arg) if _is_query(arg, x) else x == arg)])
+            elif op in ['$addToSet', '$push']:
+                a = _get_child(parent, last, None)
+                if a is None:
+                    a = []
+                    _set_child(parent, last, a)
+                items = arg['$each'] if isinstance(arg, dict) and '$each' in arg else [arg]
+                for x in items:
+                    if op == '$push' or x not in a:
+                        a.append(x)
+            else:
+                raise Exception(f'Unsupported update operator: {op}')
+
+def _get_parent(doc: dict, key: str, *, create: bool):
+    parts = key.split('.')
+    x: Any = doc
+    for part in parts[:-1]:
+        if isinstance(x, list):
+            if not part.isdigit() or int(part) >= len(x):
+                return None, None
+            x = x[int(part)]
+        elif isinstance(x, dict):
+            if part not in x:
+                if not create:
+                    return None, None
+                x[part] = {}
+            x = x[part]
+        else:
+            return None, None
+    return x, parts[-1]
+
+def _get_child(parent: Any, key: str, default: Any):
+    if isinstance(parent, list):
+        return parent[int(key)] if int(key) < len(parent) else default
+    return parent.get(key, default)
+
+def _set_child(parent: Any, key: str, value: Any):
+    if isinstance(parent, list):
+        parent[int(key)] = value
+    else:
+        parent[key] = value
+
+def _is_query(arg: Any, x: Any) -> bool:
+    return isinstance(arg, dict) and isinstance(x, dict)
+
+def _sort_key(values: List[Any]):
+    # documents without the field come first (as in mongo)
+    v = values[0] if len(values) > 0 else None
+    return (0, 0) if v is None else (1, v)
@@ -0,0 +1,338 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import subprocess
+import tracemalloc
+from typing import Dict, List, Union
+
+thisdir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.abspath(os.path.join(thisdir, '..', '..'))
+sys.path.insert(0, thisdir)
+
+from stubs import configure_environment, install_stubs, benchmark_user_id
+from memory_mongo import MemoryMongoClient, default_indexes
+from synthetic_data import generate_dataset, load_dataset
+from scenarios import get_scenarios, Scenario, ScenarioContext
+
+
+# Load benchmarks of the API: the FastAPI app of api/index.py runs in process (called through httpx's ASGI
+# transport, with gzip and the rest of the middleware), on a synthetic dataset in an in-memory stand-in for mongo
+# (or in a real mongo database), with the external services stubbed (see stubs.py). Each endpoint is driven by
+# concurrent clients, and then sampled sequentially under tracemalloc for its allocations.
+# The results are written as JSON, and can be compared with those of a previous run (--baseline).
+# See README.md in this directory.
+
+def main():
+    parser = argparse.ArgumentParser(description='Load benchmarks of the protocaas API')
+    parser.add_argument('--num-workspaces', type=int, default=4)
+    parser.add_argument('--num-projects', type=int, default=20)
+    parser.add_argument('--num-files', type=int, default=10000, help='Total number of files (over all projects)')
+    parser.add_argument('--num-jobs', type=int, default=10000, help='Total number of jobs (over all projects)')
+    parser.add_argument('--num-processors', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=200, help='Number of timed requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of concurrent clients')
+    parser.add_argument('--warmup', type=int, default=2, help='Number of untimed requests per endpoint')
+    parser.add_argument('--allocation-samples', type=int, default=20, help='Number of requests per endpoint sampled for allocations (0 to skip)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Simulated round trip of each operation of the in-memory database')
+    parser.add_argument('--mongo-uri', type=str, default=None, help='Use this mongo server instead of the in-memory database (its protocaas database is used)')
+    parser.add_argument('--reset-database', action='store_true', help='Drop the protocaas database of --mongo-uri first')
+    parser.add_argument('--endpoints', type=str, default=None, help='Only benchmark the endpoints whose names match this regular expression')
+    parser.add_argument('--routers', type=str, default=None, help='Only benchmark these routers (comma-separated: gui,client,compute_resource,processor)')
+    parser.add_argument('--skip-writes', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default='benchmark_results.json')
+    parser.add_argument('--baseline', type=str, default=None, help='Results of a previous run to compare with (exits with status 1 if there are regressions)')
+    parser.add_argument('--max-regression', type=float, default=1.25, help='A ratio of p95 latency or median peak allocation to the baseline above this is a regression')
+    args = parser.parse_args()
+
+    # the settings of the API are read from the environment when it is imported
+    configure_environment(mongo_uri=args.mongo_uri if args.mongo_uri is not None else 'mongodb://in-memory-benchmark-database')
+    sys.path.insert(0, repo_dir)
+    from api.index import app
+    recorder = install_stubs()
+
+    results = asyncio.run(_run(args, app, recorder))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    _print_results(results)
+    print(f'Wrote {args.output}')
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = _compare_with_baseline(results, baseline, max_regression=args.max_regression)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+async def _run(args, app, recorder) -> dict:
+    import httpx
+    from api_helpers.clients._get_mongo_client import _get_mongo_client
+    from api_helpers.services._crypto_keys import generate_keypair, _sign_message_str
+
+    loop = asyncio.get_event_loop()
+    if args.mongo_uri is None:
+        loop._mongo_client = MemoryMongoClient(latency_sec=args.latency_ms / 1000)
+    mongo_client = _get_mongo_client()
+    if args.mongo_uri is not None:
+        await _prepare_mongo_database(mongo_client, reset=args.reset_database)
+
+    # the ID of a compute resource is its public key, with which its requests are signed
+    public_key_hex, private_key_hex = generate_keypair()
+    print('Generating synthetic dataset')
+    timer = time.perf_counter()
+    ds = generate_dataset(
+        num_workspaces=args.num_workspaces,
+        num_projects=args.num_projects,
+        num_files=args.num_files,
+        num_jobs=args.num_jobs,
+        num_processors=args.num_processors,
+        user_id=benchmark_user_id,
+        compute_resource_id=public_key_hex,
+        compute_resource_private_key=private_key_hex,
+        seed=args.seed
+    )
+    generation_sec = time.perf_counter() - timer
+    timer = time.perf_counter()
+    await load_dataset(mongo_client, ds)
+    load_sec = time.perf_counter() - timer
+    print(f'{ds.num_files} files and {ds.num_jobs} jobs in {args.num_projects} projects ({generation_sec:.1f} s to generate, {load_sec:.1f} s to load)')
+
+    ctx = ScenarioContext(ds, seed=args.seed, sign_payload=lambda payload: _sign_message_str(payload, public_key_hex, private_key_hex))
+    scenarios = _select_scenarios(get_scenarios(), endpoints=args.endpoints, routers=args.routers, skip_writes=args.skip_writes)
+
+    endpoint_results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://protocaas-benchmark', timeout=None) as client:
+        for scenario in scenarios:
+            print(f'{scenario.name}')
+            if scenario.prepare is not None:
+                await scenario.prepare(client, ctx)
+            for i in range(args.warmup):
+                req = scenario.make_request(ctx, i)
+                if req is not None:
+                    await client.request(req.method, req.url, headers=req.headers, json=req.json)
+            num_operations_before = mongo_client.num_operations if isinstance(mongo_client, MemoryMongoClient) else None
+            r = await _run_scenario(client, scenario, ctx, first_index=args.warmup, num_requests=args.requests, concurrency=args.concurrency)
+            if num_operations_before is not None and r['numRequests'] > 0:
+                r['dbOperationsPerRequest'] = round((mongo_client.num_operations - num_operations_before) / r['numRequests'], 2)
+            if args.allocation_samples > 0:
+                r['allocations'] = await _measure_allocations(client, scenario, ctx, first_index=args.warmup + args.requests, num_samples=args.allocation_samples)
+            endpoint_results.append(r)
+
+    return {
+        'timestamp': time.time(),
+        'gitCommit': _get_git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'warmup': args.warmup,
+            'allocationSamples': args.allocation_samples,
+            'database': 'mongo' if args.mongo_uri is not None else 'memory',
+            'latencyMs': args.latency_ms,
+            'seed': args.seed
+        },
+        'dataset': {
+            'numWorkspaces': args.num_workspaces,
+            'numProjects': args.num_projects,
+            'numFiles': ds.num_files,
+            'numJobs': ds.num_jobs,
+            'generationSec': round(generation_sec, 3),
+            'loadSec': round(load_sec, 3)
+        },
+        'endpoints': endpoint_results,
+        'stubs': {
+            'pubsubMessages': len(recorder.pubsub_messages),
+            'signedUploadUrls': recorder.signed_upload_urls,
+            'githubUserRequests': recorder.github_user_requests,
+            'remoteFileSizeRequests': recorder.remote_file_size_requests
+        },
+        'maxRssMb': round(_get_max_rss_mb(), 1)
+    }
+
+async def _run_scenario(client, scenario: Scenario, ctx: ScenarioContext, *, first_index: int, num_requests: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    response_bytes: List[int] = []
+    status_codes: Dict[str, int] = {}
+    errors: List[str] = []
+    next_index = first_index
+    end_index = first_index + num_requests
+
+    async def run_client():
+        nonlocal next_index
+        while next_index < end_index:
+            i = next_index
+            next_index += 1
+            req = scenario.make_request(ctx, i)
+            if req is None:
+                return
+            timer = time.perf_counter()
+            resp = await client.request(req.method, req.url, headers=req.headers, json=req.json)
+            latencies.append(time.perf_counter() - timer)
+            response_bytes.append(resp.num_bytes_downloaded)
+            status_codes[str(resp.status_code)] = status_codes.get(str(resp.status_code), 0) + 1
+            if resp.status_code >= 400:
+                errors.append(f'{resp.status_code}: {resp.text[:500]}')
+
+    timer = time.perf_counter()
+    await asyncio.gather(*[run_client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - timer
+
+    latencies_ms = sorted(x * 1000 for x in latencies)
+    ret = {
+        'name': scenario.name,
+        'router': scenario.router,
+        'kind': scenario.kind,
+        'numRequests': len(latencies),
+        'numErrors': len(errors),
+        'statusCodes': status_codes,
+        'throughputPerSec': round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        'latencyMs': _summarize(latencies_ms, decimals=3),
+        'responseBytes': _summarize(sorted(response_bytes), decimals=0)
+    }
+    if len(errors) > 0:
+        ret['firstError'] = errors[0]
+    return ret
+
+async def _measure_allocations(client, scenario: Scenario, ctx: ScenarioContext, *, first_index: int, num_samples: int) -> Union[dict, None]:
+    # peak: the most memory allocated at any point while handling a request (on top of what was allocated before)
+    # retained: the memory still allocated after the request (caches, or leaks)
+    peak_kb: List[float] = []
+    retained_kb: List[float] = []
+    tracemalloc.start()
+    try:
+        for i in range(first_index, first_index + num_samples):
+            req = scenario.make_request(ctx, i)
+            if req is None:
+                break
+            tracemalloc.reset_peak()
+            current_before, _ = tracemalloc.get_traced_memory()
+            await client.request(req.method, req.url, headers=req.headers, json=req.json)
+            current_after, peak = tracemalloc.get_traced_memory()
+            peak_kb.append((peak - current_before) / 1024)
+            retained_kb.append((current_after - current_before) / 1024)
+    finally:
+        tracemalloc.stop()
+    if len(peak_kb) == 0:
+        return None
+    return {
+        'numSamples': len(peak_kb),
+        'peakKb': _summarize(sorted(peak_kb), decimals=1),
+        'retainedKb': _summarize(sorted(retained_kb), decimals=1)
+    }
+
+def _summarize(sorted_values: List[float], *, decimals: int) -> Union[dict, None]:
+    if len(sorted_values) == 0:
+        return None
+    def r(x):
+        return round(x, decimals) if decimals > 0 else int(round(x))
+    return {
+        'p50': r(_percentile(sorted_values, 50)),
+        'p95': r(_percentile(sorted_values, 95)),
+        'p99': r(_percentile(sorted_values, 99)),
+        'mean': r(sum(sorted_values) / len(sorted_values)),
+        'max': r(sorted_values[-1])
+    }
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    # nearest rank
+    k = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+def _select_scenarios(scenarios: List[Scenario], *, endpoints: Union[str, None], routers: Union[str, None], skip_writes: bool) -> List[Scenario]:
+    ret = []
+    for s in scenarios:
+        if endpoints is not None and not re.search(endpoints, s.name):
+            continue
+        if routers is not None and s.router not in routers.split(','):
+            continue
+        if skip_writes and s.kind == 'write':
+            continue
+        ret.append(s)
+    if len(ret) == 0:
+        raise Exception('No endpoints selected')
+    return ret
+
+async def _prepare_mongo_database(client, *, reset: bool):
+    db = client['protocaas']
+    collection_names = await db.list_collection_names()
+    if len(collection_names) > 0:
+        if not reset:
+            raise Exception('The protocaas database of the mongo server is not empty (use --reset-database to drop it)')
+        for name in collection_names:
+            await db.drop_collection(name)
+    # the same indexes as the in-memory database
+    for collection_name, indexes in default_indexes.items():
+        for fields in indexes:
+            await db[collection_name].create_index([(f, 1) for f in fields])
+
+def _compare_with_baseline(results: dict, baseline: dict, *, max_regression: float) -> List[str]:
+    baseline_endpoints = {e['name']: e for e in baseline['endpoints']}
+    regressions = []
+    for e in results['endpoints']:
+        b = baseline_endpoints.get(e['name'])
+        if b is None:
+            continue
+        comparisons = [
+            ('p95 latency', (e.get('latencyMs') or {}).get('p95'), (b.get('latencyMs') or {}).get('p95')),
+            ('median peak allocation', ((e.get('allocations') or {}).get('peakKb') or {}).get('p50'), ((b.get('allocations') or {}).get('peakKb') or {}).get('p50'))
+        ]
+        for label, x, x0 in comparisons:
+            if x is None or not x0:
+                continue
+            if x / x0 > max_regression:
+                regressions.append(f'{e["name"]}: {label} {x} (baseline {x0}, x{x / x0:.2f})')
+    print('')
+    for key in ['config', 'dataset']:
+        different = [k for k in results[key] if k not in ['generationSec', 'loadSec'] and results[key][k] != baseline.get(key, {}).get(k)]
+        if len(different) > 0:
+            print(f'Warning: the {key} of the baseline is different ({", ".join(different)})')
+    if len(regressions) > 0:
+        print(f'Regressions compared with the baseline ({baseline.get("gitCommit")}):')
+        for r in regressions:
+            print(f'  {r}')
+    else:
+        print(f'No regressions compared with the baseline ({baseline.get("gitCommit")})')
+    return regressions
+
+def _print_results(results: dict):
+    print('')
+    print(f'{"endpoint":<100} {"n":>5} {"err":>4} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>8} {"kB":>8} {"peak kB":>9}')
+    for e in results['endpoints']:
+        lat = e['latencyMs'] or {}
+        size = e['responseBytes'] or {}
+        alloc = (e.get('allocations') or {}).get('peakKb') or {}
+        print(f'{e["name"]:<100} {e["numRequests"]:>5} {e["numErrors"]:>4} {_fmt(lat.get("p50")):>9} {_fmt(lat.get("p95")):>9} {_fmt(lat.get("p99")):>9} {_fmt(e["throughputPerSec"]):>8} {_fmt(size["p50"] / 1024 if "p50" in size else None):>8} {_fmt(alloc.get("p50")):>9}')
+    num_errors = sum(e['numErrors'] for e in results['endpoints'])
+    if num_errors > 0:
+        print('')
+        print(f'{num_errors} requests failed, for example:')
+        for e in results['endpoints']:
+            if 'firstError' in e:
+                print(f'  {e["name"]}: {e["firstError"]}')
+
+def _fmt(x) -> str:
+    return '-' if x is None else f'{x:.1f}'
+
+def _get_git_commit() -> Union[str, None]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=repo_dir, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def _get_max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    x = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return x / (1024 * 1024) if sys.platform == 'darwin' else x / 1024
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+import random
+import urllib.parse
+from typing import Any, Callable, Dict, List, Union
+from synthetic_data import SyntheticDataset, JobRef
+from stubs import benchmark_user_login, get_github_access_token
+
+
+# The requests of each benchmarked endpoint. The read endpoints are benchmarked first (on the synthetic dataset as
+# generated), then the write endpoints, in order: some of them take jobs from the pools of the previous ones
+# (e.g., pending jobs are claimed, then set to running, then to completed), so every request is valid.
+
+class BenchmarkRequest:
+    def __init__(self, method: str, url: str, *, headers: Union[Dict[str, str], None]=None, json: Any=None):
+        self.method = method
+        self.url = url
+        self.headers = headers or {}
+        self.json = json
+
+class Scenario:
+    def __init__(self, name: str, router: str, kind: str, make_request: Callable[['ScenarioContext', int], Union[BenchmarkRequest, None]], *, prepare: Union[Callable, None]=None):
+        """make_request returns None when there is nothing left to request (e.g., no more pending jobs to claim)
+
+        prepare is an optional coroutine function (client, context), awaited before the scenario is run
+        """
+        self.name = name
+        self.router = router # 'gui' | 'client' | 'compute_resource' | 'processor'
+        self.kind = kind # 'read' | 'write'
+        self.make_request = make_request
+        self.prepare = prepare
+
+class ScenarioContext:
+    def __init__(self, ds: SyntheticDataset, *, seed: int, sign_payload: Callable[[str], str]):
+        self.ds = ds
+        self.rng = random.Random(seed)
+        self.github_access_token = get_github_access_token(benchmark_user_login)
+        self.etags: Dict[str, str] = {} # by URL, for the conditional requests
+        self._sign_payload = sign_payload
+        self._signatures: Dict[str, str] = {}
+        # jobs moved along by the write scenarios
+        self.claimed_jobs: List[JobRef] = []
+        self.started_jobs: List[JobRef] = []
+    def project(self) -> dict:
+        return self.rng.choice(self.ds.projects)
+    def gui_headers(self) -> Dict[str, str]:
+        return {'github-access-token': self.github_access_token}
+    def compute_resource_headers(self, path: str) -> Dict[str, str]:
+        # the payload is the path, and signing it is slow enough to be left out of the measurements
+        if path not in self._signatures:
+            self._signatures[path] = self._sign_payload(path)
+        return {'compute-resource-payload': path, 'compute-resource-signature': self._signatures[path]}
+    def random_job(self, status: str) -> Union[JobRef, None]:
+        jobs = self.ds.jobs_by_status[status]
+        return self.rng.choice(jobs) if len(jobs) > 0 else None
+    def pop_job(self, jobs: List[JobRef]) -> Union[JobRef, None]:
+        return jobs.pop() if len(jobs) > 0 else None
+
+def _q(x: str) -> str:
+    return urllib.parse.quote(x)
+
+def get_scenarios() -> List[Scenario]:
+    cr = '/api/compute_resource/compute_resources'
+    return [
+        # GUI (reads)
+        Scenario('GET /api/gui/workspaces', 'gui', 'read',
+            lambda c, i: BenchmarkRequest('GET', '/api/gui/workspaces', headers=c.gui_headers())),
+        Scenario('GET /api/gui/workspaces/{workspace_id}', 'gui', 'read',
+            lambda c, i: BenchmarkRequest('GET', f'/api/gui/workspaces/{c.rng.choice(c.ds.workspace_ids)}', headers=c.gui_headers())),
+        Scenario('GET /api/gui/workspaces/{workspace_id}/projects', 'gui', 'read',
+            lambda c, i: BenchmarkRequest('GET', f'/api/gui/workspaces/{c.rng.choice(c.ds.workspace_ids)}/projects', headers=c.gui_headers())),
+        Scenario('GET /api/gui/projects/{project_id}', 'gui', 'read',
+            lambda c, i: BenchmarkRequest('GET', f'/api/gui/projects/{c.project()["projectId"]}')),
+        Scenario('GET /api/gui/projects/{project_id}/files', 'gui', 'read',
+            lambda c, i: BenchmarkRequest('GET', f'/api/gui/projects/{c.project()["projectId"]}/files')),
+        Scenario('GET /api/gui/projects/{project_id}/files/{file_name}', 'gui', 'read', _get_file),
+        Scenario('GET /api/gui/projects/{project_id}/jobs', 'gui', 'read',
+            lambda c, i: BenchmarkRequest('GET', f'/api/gui/projects/{c.project()["projectId"]}/jobs')),
+        Scenario('GET /api/gui/jobs/{job_id}', 'gui', 'read',
+            lambda c, i: _with_job(c.random_job('completed'), lambda j: BenchmarkRequest('GET', f'/api/gui/jobs/{j.job_id}'))),
+        Scenario('GET /api/gui/compute_resources', 'gui', 'read',
+            lambda c, i: BenchmarkRequest('GET', '/api/gui/compute_resources', headers=c.gui_headers())),
+        Scenario('GET /api/gui/compute_resources/{compute_resource_id}', 'gui', 'read',
+            lambda c, i: BenchmarkRequest('GET', f'/api/gui/compute_resources/{c.ds.compute_resource_id}')),
+        Scenario('GET /api/gui/compute_resources/{compute_resource_id}/jobs', 'gui', 'read',
+            lambda c, i: BenchmarkRequest('GET', f'/api/gui/compute_resources/{c.ds.compute_resource_id}/jobs', headers=c.gui_headers())),
+        Scenario('GET /api/gui/compute_resources/{compute_resource_id}/pubsub_subscription', 'gui', 'read',
+            lambda c, i: BenchmarkRequest('GET', f'/api/gui/compute_resources/{c.ds.compute_resource_id}/pubsub_subscription')),
+
+        # client (reads)
+        Scenario('GET /api/client/projects/{project_id}', 'client', 'read',
+            lambda c, i: BenchmarkRequest('GET', f'/api/client/projects/{c.project()["projectId"]}')),
+        Scenario('GET /api/client/projects/{project_id}/files', 'client', 'read',
+            lambda c, i: BenchmarkRequest('GET', f'/api/client/projects/{c.project()["projectId"]}/files')),
+        Scenario('GET /api/client/projects/{project_id}/jobs', 'client', 'read',
+            lambda c, i: BenchmarkRequest('GET', f'/api/client/projects/{c.project()["projectId"]}/jobs')),
+        Scenario('GET /api/client/projects/{project_id}/snapshot', 'client', 'read',
+            lambda c, i: BenchmarkRequest('GET', f'/api/client/projects/{c.project()["projectId"]}/snapshot')),
+        Scenario('GET /api/client/projects/{project_id}/snapshot (If-None-Match)', 'client', 'read', _get_snapshot_not_modified, prepare=_fetch_snapshot_etags),
+
+        # compute resource (reads)
+        Scenario('GET /api/compute_resource/compute_resources/{compute_resource_id}/apps', 'compute_resource', 'read',
+            lambda c, i: _compute_resource_request(c, 'GET', f'{cr}/{c.ds.compute_resource_id}/apps')),
+        Scenario('GET /api/compute_resource/compute_resources/{compute_resource_id}/pubsub_subscription', 'compute_resource', 'read',
+            lambda c, i: _compute_resource_request(c, 'GET', f'{cr}/{c.ds.compute_resource_id}/pubsub_subscription')),
+        Scenario('GET /api/compute_resource/compute_resources/{compute_resource_id}/unfinished_jobs', 'compute_resource', 'read',
+            lambda c, i: _compute_resource_request(c, 'GET', f'{cr}/{c.ds.compute_resource_id}/unfinished_jobs', headers={
+                'compute-resource-node-id': f'benchmark-node-{i % 4}',
+                'compute-resource-node-name': f'benchmark-node-{i % 4}'
+            })),
+
+        # processor (reads)
+        Scenario('GET /api/processor/jobs/{job_id}', 'processor', 'read',
+            lambda c, i: _with_job(c.random_job('pending'), lambda j: BenchmarkRequest('GET', f'/api/processor/jobs/{j.job_id}', headers={'job-private-key': j.job_private_key}))),
+        Scenario('GET /api/processor/jobs/{job_id}/status', 'processor', 'read',
+            lambda c, i: _with_job(c.random_job('running'), lambda j: BenchmarkRequest('GET', f'/api/processor/jobs/{j.job_id}/status', headers={'job-private-key': j.job_private_key}))),
+        Scenario('GET /api/processor/jobs/{job_id}/outputs/{output_name}/upload_url', 'processor', 'read',
+            lambda c, i: _with_job(c.random_job('running'), lambda j: BenchmarkRequest('GET', f'/api/processor/jobs/{j.job_id}/outputs/output/upload_url', headers={'job-private-key': j.job_private_key}))),
+
+        # writes
+        Scenario('PUT /api/processor/jobs/{job_id}/console_output', 'processor', 'write',
+            lambda c, i: _with_job(c.random_job('running'), lambda j: BenchmarkRequest('PUT', f'/api/processor/jobs/{j.job_id}/console_output', headers={'job-private-key': j.job_private_key}, json={'consoleOutput': 'benchmark\n' * 100}))),
+        Scenario('PUT /api/gui/projects/{project_id}/name', 'gui', 'write',
+            lambda c, i: BenchmarkRequest('PUT', f'/api/gui/projects/{c.project()["projectId"]}/name', headers=c.gui_headers(), json={'name': f'Benchmark project (renamed {i})'})),
+        Scenario('POST /api/gui/projects', 'gui', 'write',
+            lambda c, i: BenchmarkRequest('POST', '/api/gui/projects', headers=c.gui_headers(), json={'workspaceId': c.rng.choice(c.ds.workspace_ids), 'name': f'New benchmark project {i}'})),
+        Scenario('PUT /api/gui/projects/{project_id}/files/{file_name}', 'gui', 'write',
+            lambda c, i: BenchmarkRequest('PUT', f'/api/gui/projects/{c.project()["projectId"]}/files/{_q(f"benchmark/notes_{i:06d}.txt")}', headers=c.gui_headers(), json={'content': 'data:benchmark', 'size': 9, 'metadata': {}})),
+        Scenario('POST /api/gui/jobs', 'gui', 'write', _create_job),
+        Scenario('POST /api/gui/jobs/batch', 'gui', 'write', _create_jobs_batch),
+        Scenario('PUT /api/compute_resource/compute_resources/{compute_resource_id}/spec', 'compute_resource', 'write',
+            lambda c, i: _compute_resource_request(c, 'PUT', f'{cr}/{c.ds.compute_resource_id}/spec', json={'spec': {'apps': [{'name': 'benchmark-app', 'help': '', 'processors': c.ds.processor_specs}]}})),
+        Scenario('POST /api/compute_resource/compute_resources/{compute_resource_id}/jobs/{job_id}/claim', 'compute_resource', 'write', _claim_job),
+        Scenario('PUT /api/compute_resource/compute_resources/{compute_resource_id}/job_leases', 'compute_resource', 'write', _renew_job_leases),
+        Scenario('PUT /api/processor/jobs/{job_id}/status (running)', 'processor', 'write', _set_job_running),
+        Scenario('PUT /api/processor/jobs/{job_id}/status (completed)', 'processor', 'write', _set_job_completed),
+        Scenario('PUT /api/processor/jobs/{job_id}/status (failed)', 'processor', 'write',
+            lambda c, i: _with_job(c.pop_job(c.ds.jobs_by_status['running']), lambda j: BenchmarkRequest('PUT', f'/api/processor/jobs/{j.job_id}/status', headers={'job-private-key': j.job_private_key}, json={'status': 'failed', 'error': 'Benchmark failure'}))),
+        Scenario('DELETE /api/gui/jobs/{job_id}', 'gui', 'write',
+            lambda c, i: _with_job(c.pop_job(c.ds.jobs_by_status['failed']), lambda j: BenchmarkRequest('DELETE', f'/api/gui/jobs/{j.job_id}', headers=c.gui_headers()))),
+        Scenario('DELETE /api/gui/projects/{project_id}/files/{file_name}', 'gui', 'write',
+            # deleting the output of a completed job also deletes the job (and anything downstream of it)
+            lambda c, i: _with_job(c.pop_job(c.ds.jobs_by_status['completed']), lambda j: BenchmarkRequest('DELETE', f'/api/gui/projects/{j.project_id}/files/{_q(j.output_file_name)}', headers=c.gui_headers())))
+    ]
+
+def _with_job(job: Union[JobRef, None], f: Callable[[JobRef], BenchmarkRequest]) -> Union[BenchmarkRequest, None]:
+    return f(job) if job is not None else None
+
+def _compute_resource_request(c: ScenarioContext, method: str, path: str, *, headers: Union[Dict[str, str], None]=None, json: Any=None):
+    return BenchmarkRequest(method, path, headers={**c.compute_resource_headers(path), **(headers or {})}, json=json)
+
+def _get_file(c: ScenarioContext, i: int):
+    project_id = c.project()['projectId']
+    file_names = c.ds.imported_file_names[project_id]
+    if len(file_names) == 0:
+        return None
+    return BenchmarkRequest('GET', f'/api/gui/projects/{project_id}/files/{_q(c.rng.choice(file_names))}')
+
+max_projects_with_etags = 50
+
+async def _fetch_snapshot_etags(client, c: ScenarioContext):
+    # the ETags of the snapshots of some of the projects, as a client would have them from earlier requests
+    for project in c.rng.sample(c.ds.projects, min(max_projects_with_etags, len(c.ds.projects))):
+        url = f'/api/client/projects/{project["projectId"]}/snapshot'
+        resp = await client.get(url)
+        if resp.status_code == 200 and 'etag' in resp.headers:
+            c.etags[url] = resp.headers['etag']
+
+def _get_snapshot_not_modified(c: ScenarioContext, i: int):
+    if len(c.etags) == 0:
+        return None
+    url = c.rng.choice(sorted(c.etags.keys()))
+    return BenchmarkRequest('GET', url, headers={'if-none-match': c.etags[url]})
+
+def _new_job_inputs(c: ScenarioContext, i: int):
+    project = c.project()
+    file_names = c.ds.imported_file_names[project['projectId']]
+    if len(file_names) == 0:
+        return None, None
+    return project, c.rng.choice(file_names)
+
+def _create_job(c: ScenarioContext, i: int):
+    project, input_file_name = _new_job_inputs(c, i)
+    if project is None:
+        return None
+    processor_spec = c.ds.processor_specs[i % len(c.ds.processor_specs)]
+    return BenchmarkRequest('POST', '/api/gui/jobs', headers=c.gui_headers(), json={
+        'workspaceId': project['workspaceId'],
+        'projectId': project['projectId'],
+        'processorName': processor_spec['name'],
+        'inputFiles': [{'name': 'input', 'fileName': input_file_name}],
+        'outputFiles': [{'name': 'output', 'fileName': f'benchmark/create_job_{i:06d}/output.nwb'}],
+        # (a parameter value that is unique to the request, so that the job is not identical to an existing one)
+        'inputParameters': [{'name': 'param_0', 'value': i}],
+        'processorSpec': processor_spec
+    })
+
+def _create_jobs_batch(c: ScenarioContext, i: int):
+    project, input_file_name = _new_job_inputs(c, i)
+    if project is None:
+        return None
+    processor_spec = c.ds.processor_specs[i % len(c.ds.processor_specs)]
+    return BenchmarkRequest('POST', '/api/gui/jobs/batch', headers=c.gui_headers(), json={
+        'workspaceId': project['workspaceId'],
+        'projectId': project['projectId'],
+        'jobs': [{
+            'processorName': processor_spec['name'],
+            'inputFiles': [{'name': 'input', 'fileName': input_file_name}],
+            'outputFiles': [{'name': 'output', 'fileName': f'benchmark/batch_{i:06d}/' + '${parameter:param_1}_${parameter:param_2}.nwb'}],
+            'inputParameters': [{'name': 'param_0', 'value': i}],
+            'parameterGrid': [{'name': 'param_1', 'values': [1, 2]}, {'name': 'param_2', 'values': [1, 2, 3, 4, 5]}]
+        }],
+        'processorSpecs': [processor_spec]
+    })
+
+def _claim_job(c: ScenarioContext, i: int):
+    job = c.pop_job(c.ds.jobs_by_status['pending'])
+    if job is None:
+        return None
+    c.claimed_jobs.append(job)
+    path = f'/api/compute_resource/compute_resources/{c.ds.compute_resource_id}/jobs/{job.job_id}/claim'
+    return _compute_resource_request(c, 'POST', path, json={'computeResourceNodeId': 'benchmark-node-0', 'computeResourceNodeName': 'benchmark-node-0', 'leaseDuration': 600})
+
+def _renew_job_leases(c: ScenarioContext, i: int):
+    if len(c.claimed_jobs) == 0:
+        return None
+    job_ids = [j.job_id for j in c.rng.sample(c.claimed_jobs, min(10, len(c.claimed_jobs)))]
+    path = f'/api/compute_resource/compute_resources/{c.ds.compute_resource_id}/job_leases'
+    return _compute_resource_request(c, 'PUT', path, json={'jobIds': job_ids, 'computeResourceNodeId': 'benchmark-node-0', 'leaseDuration': 600})
+
+def _set_job_running(c: ScenarioContext, i: int):
+    job = c.pop_job(c.claimed_jobs)
+    if job is None:
+        return None
+    c.started_jobs.append(job)
+    return BenchmarkRequest('PUT', f'/api/processor/jobs/{job.job_id}/status', headers={'job-private-key': job.job_private_key}, json={'status': 'running'})
+
+def _set_job_completed(c: ScenarioContext, i: int):
+    job = c.pop_job(c.started_jobs)
+    if job is None:
+        return None
+    return BenchmarkRequest('PUT', f'/api/processor/jobs/{job.job_id}/status', headers={'job-private-key': job.job_private_key}, json={'status': 'completed'})
@@ -0,0 +1,82 @@
+import os
+import sys
+from typing import Dict, List
+
+
+# Stand-ins for the external services of the API (PubNub, the S3 output bucket, the HEAD requests for the sizes
+# of output files, and the GitHub user API), so that the benchmarks measure the API and its database only.
+
+benchmark_user_login = 'benchmark-user'
+benchmark_user_id = f'github|{benchmark_user_login}'
+benchmark_output_bucket_base_url = 'https://benchmark-bucket.example.org'
+
+def configure_environment(*, mongo_uri: str):
+    # The settings are read from the environment when api_helpers is imported, so this must be called first
+    if 'api_helpers.core.settings' in sys.modules:
+        raise Exception('configure_environment() must be called before api_helpers is imported')
+    os.environ['MONGO_URI'] = mongo_uri
+    os.environ['VITE_PUBNUB_SUBSCRIBE_KEY'] = 'benchmark-subscribe-key'
+    os.environ['PUBNUB_PUBLISH_KEY'] = 'benchmark-publish-key'
+    os.environ['VITE_GITHUB_CLIENT_ID'] = 'benchmark-client-id'
+    os.environ['GITHUB_CLIENT_SECRET'] = 'benchmark-client-secret'
+    os.environ['OUTPUT_BUCKET_URI'] = 's3://benchmark-bucket'
+    os.environ['OUTPUT_BUCKET_CREDENTIALS'] = '{}'
+    os.environ['OUTPUT_BUCKET_BASE_URL'] = benchmark_output_bucket_base_url
+    os.environ.pop('VITE_DEFAULT_COMPUTE_RESOURCE_ID', None)
+
+class StubRecorder:
+    def __init__(self):
+        self.pubsub_messages: List[dict] = []
+        self.signed_upload_urls = 0
+        self.github_user_requests = 0
+        self.remote_file_size_requests = 0
+
+def get_github_access_token(login: str) -> str:
+    return f'benchmark-token-{login}'
+
+def install_stubs() -> StubRecorder:
+    """Replace the functions that call external services in all the loaded api_helpers modules
+
+    The functions are imported by name into the modules that use them, so each module is patched.
+    This must be called after the app (api/index.py) has been imported.
+    """
+    recorder = StubRecorder()
+
+    async def publish_pubsub_message(*, channel: str, message: dict):
+        recorder.pubsub_messages.append({'channel': channel, 'message': message})
+        return True
+
+    async def _get_signed_upload_url(*, bucket_uri: str, bucket_credentials: str, object_key: str):
+        recorder.signed_upload_urls += 1
+        return f'{benchmark_output_bucket_base_url}/{object_key}?X-Amz-Signature=benchmark'
+
+    async def _get_size_for_remote_file(url: str) -> int:
+        recorder.remote_file_size_requests += 1
+        return 1000000
+
+    async def _get_user_id_for_access_token(github_access_token: str):
+        # (the result is cached by _authenticate_gui_request, as it is for the real GitHub API)
+        recorder.github_user_requests += 1
+        prefix = 'benchmark-token-'
+        if not github_access_token.startswith(prefix):
+            raise Exception('Error getting user ID from github access token: 401')
+        return github_access_token[len(prefix):]
+
+    stubs = {
+        'publish_pubsub_message': publish_pubsub_message,
+        '_get_signed_upload_url': _get_signed_upload_url,
+        '_get_size_for_remote_file': _get_size_for_remote_file,
+        '_get_user_id_for_access_token': _get_user_id_for_access_token
+    }
+    num_patched: Dict[str, int] = {k: 0 for k in stubs}
+    for module_name, module in list(sys.modules.items()):
+        if module is None or not (module_name == 'api_helpers' or module_name.startswith('api_helpers.')):
+            continue
+        for name, stub in stubs.items():
+            if hasattr(module, name):
+                setattr(module, name, stub)
+                num_patched[name] += 1
+    for name, n in num_patched.items():
+        if n == 0:
+            raise Exception(f'Unable to stub {name} (has it been renamed?)')
+    return recorder
@@ -0,0 +1,211 @@
+import time
+import random
+from typing import Dict, List
+
+
+# Synthetic workspaces, projects, files and jobs for the benchmarks, written directly to the database.
+# The files and jobs are spread evenly over the projects. Each project has imported files (inputs), and jobs
+# that each process one of them, most of them completed (with an output file), the others pending, running or failed.
+
+num_processor_parameters = 10
+fraction_of_jobs_completed = 0.7
+
+class JobRef:
+    def __init__(self, job_id: str, job_private_key: str, project_id: str, workspace_id: str, output_file_name: str):
+        self.job_id = job_id
+        self.job_private_key = job_private_key
+        self.project_id = project_id
+        self.workspace_id = workspace_id
+        self.output_file_name = output_file_name
+
+class SyntheticDataset:
+    def __init__(self):
+        self.compute_resource_id = ''
+        self.compute_resource_private_key = ''
+        self.user_id = ''
+        self.processor_specs: List[dict] = []
+        self.workspace_ids: List[str] = []
+        self.projects: List[dict] = [] # projectId and workspaceId
+        self.imported_file_names: Dict[str, List[str]] = {} # by project ID
+        self.jobs_by_status: Dict[str, List[JobRef]] = {}
+        self.num_files = 0
+        self.num_jobs = 0
+        # documents by collection, until they are loaded
+        self.documents: Dict[str, List[dict]] = {}
+
+def generate_dataset(*,
+    num_workspaces: int,
+    num_projects: int,
+    num_files: int,
+    num_jobs: int,
+    num_processors: int,
+    user_id: str,
+    compute_resource_id: str,
+    compute_resource_private_key: str,
+    seed: int=0
+) -> SyntheticDataset:
+    rng = random.Random(seed)
+    ds = SyntheticDataset()
+    ds.compute_resource_id = compute_resource_id
+    ds.compute_resource_private_key = compute_resource_private_key
+    ds.user_id = user_id
+    ds.processor_specs = [_make_processor_spec(i) for i in range(num_processors)]
+    ds.jobs_by_status = {'completed': [], 'failed': [], 'pending': [], 'running': []}
+    timestamp0 = time.time() - 30 * 24 * 60 * 60
+
+    ds.documents['computeResources'] = [{
+        'computeResourceId': compute_resource_id,
+        'ownerId': user_id,
+        'name': 'benchmark',
+        'timestampCreated': timestamp0,
+        'apps': [{'name': 'benchmark-app', 'executablePath': '/bin/benchmark-app', 'container': 'benchmark/app:1'}],
+        'spec': {'apps': [{'name': 'benchmark-app', 'help': '', 'processors': ds.processor_specs}]}
+    }]
+
+    workspaces = []
+    for w in range(num_workspaces):
+        workspace_id = f'bw{w:04d}'
+        ds.workspace_ids.append(workspace_id)
+        workspaces.append({
+            'workspaceId': workspace_id,
+            'ownerId': user_id,
+            'name': f'Benchmark workspace {w}',
+            'description': '',
+            'users': [],
+            'publiclyReadable': True,
+            'listed': True,
+            'timestampCreated': timestamp0,
+            'timestampModified': timestamp0,
+            'computeResourceId': compute_resource_id
+        })
+    ds.documents['workspaces'] = workspaces
+
+    projects = []
+    files = []
+    jobs = []
+    for p in range(num_projects):
+        project_id = f'bp{p:05d}'
+        workspace_id = ds.workspace_ids[p % num_workspaces]
+        ds.projects.append({'projectId': project_id, 'workspaceId': workspace_id})
+        projects.append({
+            'projectId': project_id,
+            'workspaceId': workspace_id,
+            'name': f'Benchmark project {p}',
+            'description': '',
+            'timestampCreated': timestamp0,
+            'timestampModified': timestamp0
+        })
+        nf = num_files // num_projects + (1 if p < num_files % num_projects else 0)
+        nj = num_jobs // num_projects + (1 if p < num_jobs % num_projects else 0)
+        # every completed job has an output file, and at least half of the files are imported
+        num_completed = min(int(nj * fraction_of_jobs_completed), nf // 2)
+        num_imported = nf - num_completed
+        imported_file_ids = []
+        imported_file_names = []
+        for i in range(num_imported):
+            file_id = f'{project_id}-f{i:06d}'
+            file_name = f'imported/session_{i:06d}.nwb'
+            imported_file_ids.append(file_id)
+            imported_file_names.append(file_name)
+            files.append({
+                'projectId': project_id,
+                'workspaceId': workspace_id,
+                'fileId': file_id,
+                'userId': user_id,
+                'fileName': file_name,
+                'size': rng.randint(10 ** 6, 10 ** 10),
+                'timestampCreated': timestamp0 + i,
+                'content': f'url:https://benchmark-bucket.example.org/imported/{project_id}/{i}.nwb',
+                'metadata': {}
+            })
+        ds.imported_file_names[project_id] = imported_file_names
+        for k in range(nj):
+            job_id = f'{project_id}-j{k:06d}'
+            job_private_key = f'pk-{job_id}'
+            if k < num_completed:
+                status = 'completed'
+            else:
+                status = ['pending', 'pending', 'failed', 'running'][k % 4]
+            processor_spec = ds.processor_specs[k % num_processors]
+            input_index = k % num_imported if num_imported > 0 else None
+            output_file_name = f'generated/{k:06d}/output.nwb'
+            job = {
+                'projectId': project_id,
+                'workspaceId': workspace_id,
+                'jobId': job_id,
+                'jobPrivateKey': job_private_key,
+                'userId': user_id,
+                'processorName': processor_spec['name'],
+                'inputFiles': [{'name': 'input', 'fileId': imported_file_ids[input_index], 'fileName': imported_file_names[input_index]}] if input_index is not None else [],
+                'inputFileIds': [imported_file_ids[input_index]] if input_index is not None else [],
+                'inputParameters': [{'name': f'param_{j}', 'value': rng.random()} for j in range(3)],
+                'outputFiles': [{'name': 'output', 'fileName': output_file_name}],
+                'timestampCreated': timestamp0 + k,
+                'computeResourceId': compute_resource_id,
+                'status': status,
+                'processorSpec': processor_spec
+            }
+            if status == 'completed':
+                output_file_id = f'{project_id}-o{k:06d}'
+                job['outputFiles'][0]['fileId'] = output_file_id
+                job['outputFileIds'] = [output_file_id]
+                job['timestampStarted'] = timestamp0 + k + 1
+                job['timestampFinished'] = timestamp0 + k + 2
+                job['consoleOutputUrl'] = f'https://benchmark-bucket.example.org/protocaas-outputs/{job_id}/_console_output'
+                files.append({
+                    'projectId': project_id,
+                    'workspaceId': workspace_id,
+                    'fileId': output_file_id,
+                    'userId': user_id,
+                    'fileName': output_file_name,
+                    'size': rng.randint(10 ** 6, 10 ** 9),
+                    'timestampCreated': timestamp0 + k + 2,
+                    'content': f'url:https://benchmark-bucket.example.org/protocaas-outputs/{job_id}/output',
+                    'metadata': {},
+                    'jobId': job_id
+                })
+            elif status == 'failed':
+                job['error'] = 'Synthetic failure'
+                job['timestampFinished'] = timestamp0 + k + 2
+            elif status == 'running':
+                job['timestampStarted'] = timestamp0 + k + 1
+                job['computeResourceNodeId'] = 'benchmark-node'
+                job['computeResourceNodeName'] = 'benchmark-node'
+            jobs.append(job)
+            ds.jobs_by_status[status].append(JobRef(job_id, job_private_key, project_id, workspace_id, output_file_name))
+    ds.documents['projects'] = projects
+    ds.documents['files'] = files
+    ds.documents['jobs'] = jobs
+    ds.num_files = len(files)
+    ds.num_jobs = len(jobs)
+    # jobs are taken from the ends of these lists by the write benchmarks, so shuffle them across projects
+    for refs in ds.jobs_by_status.values():
+        rng.shuffle(refs)
+    return ds
+
+async def load_dataset(client, ds: SyntheticDataset, *, chunk_size: int=10000):
+    """Write the documents of the dataset to the protocaas database (of the in-memory store, or of a real mongo client)"""
+    db = client['protocaas']
+    for collection_name, docs in ds.documents.items():
+        collection = db[collection_name]
+        if hasattr(collection, 'load_documents'):
+            collection.load_documents(docs)
+        else:
+            for i in range(0, len(docs), chunk_size):
+                await collection.insert_many(docs[i:i + chunk_size])
+    ds.documents = {}
+
+def _make_processor_spec(i: int) -> dict:
+    return {
+        'name': f'benchmark_processor_{i}',
+        'help': 'A processor of the benchmark dataset. ' * 5,
+        'inputs': [{'name': 'input', 'help': 'Input NWB file', 'list': False}],
+        'outputs': [{'name': 'output', 'help': 'Output NWB file'}],
+        'parameters': [
+            {'name': f'param_{j}', 'help': f'Parameter {j}', 'type': 'float', 'default': j * 0.5, 'options': None, 'secret': False}
+            for j in range(num_processor_parameters)
+        ],
+        'attributes': [],
+        'tags': [{'tag': 'benchmark'}],
+        'resources': {'numCpus': 4, 'memoryGb': 16, 'diskGb': None, 'timeMin': 60, 'parameterOverrides': []}
+    }
@@ -1,6 +1,9 @@
-from typing import List
+from typing import Dict, Iterator, List, Union
+import os
+import json
+from fnmatch import fnmatchcase
 from ..common.protocaas_types import ProtocaasProject, ProtocaasFile, ProtocaasJob
-from ..common._api_request import _client_get_api_request
+from ..common._api_request import _client_get_api_request_if_modified, protocaas_url
 
 
 class Project:
@@ -21,15 +24,40 @@ class Project:
             ProjectJob(j)
             for j in jobs_data
         ]
-    def get_file(self, file_name: str) -> 'ProjectFile':
+
+        # the folder tree is built once, so that navigating the project does not require scanning all the files
+        self._files_by_name: Dict[str, ProjectFile] = {}
+        self._root_folder_node = _FolderNode()
         for f in self._files:
-            if f._file_data.fileName == file_name:
-                return f
-        raise Exception(f'File not found: {file_name}')
+            self._files_by_name[f.file_name] = f
+            self._root_folder_node.add_file(f.file_name.split('/'), f)
+    def get_file(self, file_name: str) -> 'ProjectFile':
+        f = self._files_by_name.get(file_name, None)
+        if f is None:
+            raise Exception(f'File not found: {file_name}')
+        return f
+    def get_folder(self, path: str = '') -> 'ProjectFolder':
+        if self._get_folder_node(path) is None:
+            raise Exception(f'Folder not found: {path}')
+        return ProjectFolder(self, path)
+    def _get_folder_node(self, path: str) -> Union['_FolderNode', None]:
+        node = self._root_folder_node
+        for part in _split_path(path):
+            node = node.folders.get(part, None)
+            if node is None:
+                return None
+        return node
 
 class ProjectFile:
     def __init__(self, file_data: ProtocaasFile) -> None:
         self._file_data = file_data
+    @property
+    def file_name(self) -> str:
+        """The path of the file within the project"""
+        return self._file_data.fileName
+    @property
+    def size(self) -> int:
+        return self._file_data.size
     def get_url(self) -> str:
         a = self._file_data.content
         if not a.startswith('url:'):
@@ -39,59 +67,160 @@ class ProjectFile:
 class ProjectFolder:
     def __init__(self, project: Project, path: str) -> None:
         self._project = project
-        self._path = path
+        self._path = '/'.join(_split_path(path))
+    @property
+    def path(self) -> str:
+        return self._path
     def get_files(self) -> List[ProjectFile]:
-        ret: List[ProjectFile] = []
-        for f in self._project._files:
-            a = f._file_name.split('/')
-            ok = False
-            if len(a) <= 1:
-                ok = (self._path == '')
-            else:
-                ok = '/'.join(a[:-1]) == self._path
-            if ok:
-                ret.append(f)
-        return ret
+        """The files directly in this folder"""
+        node = self._get_node()
+        if node is None:
+            return []
+        return list(node.files.values())
     def get_folders(self) -> List['ProjectFolder']:
-        folder_paths = set()
-        for f in self._project._files:
-            a = f._file_name.split('/')
-            if len(a) <= 1:
-                continue
-            parent_path = '/'.join(a[:-1])
-            b = parent_path.split('/')
-            ok = False
-            if len(b) <= 1:
-                ok = (self._path == '')
-            else:
-                ok = '/'.join(b[:-1]) == self._path
-            if ok:
-                folder_paths.add(parent_path)
-        sorted_folder_paths = sorted(list(folder_paths))
+        """The subfolders directly in this folder"""
+        node = self._get_node()
+        if node is None:
+            return []
         return [
-            ProjectFolder(self._project, p)
-            for p in sorted_folder_paths
+            ProjectFolder(self._project, self._join(name))
+            for name in sorted(node.folders.keys())
         ]
+    def iter_files(self, *, recursive: bool = True) -> Iterator[ProjectFile]:
+        """Iterate over the files in this folder and (if recursive) in all its subfolders"""
+        node = self._get_node()
+        if node is None:
+            return
+        if recursive:
+            yield from _iter_node_files(node)
+        else:
+            yield from node.files.values()
+    def glob(self, pattern: str) -> List[ProjectFile]:
+        """The files matching a glob pattern relative to this folder (e.g., 'sub-*/*.nwb', or '**/*.nwb' for any depth)"""
+        node = self._get_node()
+        if node is None:
+            return []
+        ret: List[ProjectFile] = []
+        _glob_node(node, pattern.split('/'), ret)
+        return ret
+    def get_size(self) -> int:
+        """The total size of the files in this folder and all its subfolders"""
+        node = self._get_node()
+        return node.total_size if node is not None else 0
+    def get_num_files(self) -> int:
+        """The number of files in this folder and all its subfolders"""
+        node = self._get_node()
+        return node.total_num_files if node is not None else 0
+    def _get_node(self) -> Union['_FolderNode', None]:
+        return self._project._get_folder_node(self._path)
+    def _join(self, name: str) -> str:
+        return f'{self._path}/{name}' if self._path else name
+
+class _FolderNode:
+    def __init__(self) -> None:
+        self.files: Dict[str, ProjectFile] = {}
+        self.folders: Dict[str, '_FolderNode'] = {}
+        # aggregated over the folder and all its subfolders
+        self.total_size = 0
+        self.total_num_files = 0
+    def add_file(self, parts: List[str], f: ProjectFile):
+        node = self
+        for part in parts[:-1]:
+            node.total_size += f.size
+            node.total_num_files += 1
+            child = node.folders.get(part, None)
+            if child is None:
+                child = _FolderNode()
+                node.folders[part] = child
+            node = child
+        node.total_size += f.size
+        node.total_num_files += 1
+        node.files[parts[-1]] = f
+
+def _glob_node(node: _FolderNode, pattern_parts: List[str], ret: List[ProjectFile]):
+    part = pattern_parts[0]
+    rest = pattern_parts[1:]
+    if part == '**':
+        # zero or more folders
+        if len(rest) == 0:
+            ret.extend(_iter_node_files(node))
+            return
+        _glob_node(node, rest, ret)
+        for name in sorted(node.folders.keys()):
+            _glob_node(node.folders[name], pattern_parts, ret)
+        return
+    if len(rest) == 0:
+        for name, f in node.files.items():
+            if fnmatchcase(name, part):
+                ret.append(f)
+        return
+    for name in sorted(node.folders.keys()):
+        if fnmatchcase(name, part):
+            _glob_node(node.folders[name], rest, ret)
+
+def _iter_node_files(node: _FolderNode) -> Iterator[ProjectFile]:
+    # depth first, with the folders in sorted order
+    stack = [node]
+    while len(stack) > 0:
+        n = stack.pop()
+        yield from n.files.values()
+        stack.extend(n.folders[name] for name in sorted(n.folders.keys(), reverse=True))
+
+def _split_path(path: str) -> List[str]:
+    return [p for p in path.split('/') if p != '']
 
 class ProjectJob:
     def __init__(self, job_data: ProtocaasJob) -> None:
         self._job_data = job_data
 
-def load_project(project_id: str) -> Project:
-    url_path = f'/api/client/projects/{project_id}'
-    project_resp = _client_get_api_request(url_path=url_path)
-    project: ProtocaasProject = ProtocaasProject(**project_resp['project'])
+def load_project(project_id: str, *, use_cache: bool = True) -> Project:
+    """Load a project with its files and jobs
 
-    url_path = f'/api/client/projects/{project_id}/files'
-    files_resp = _client_get_api_request(url_path=url_path)
-    files: List[ProtocaasFile] = [ProtocaasFile(**f) for f in files_resp['files']]
+    A snapshot of the project is cached on disk (in PROTOCAAS_CLIENT_CACHE_DIR, or ~/.cache/protocaas),
+    so reloading an unchanged project takes a single request with an empty response.
+    """
+    url_path = f'/api/client/projects/{project_id}/snapshot'
+    cache_file_path = _get_snapshot_cache_file_path(project_id) if use_cache else None
+    cached = _read_cached_snapshot(cache_file_path) if cache_file_path is not None else None
+    resp, etag = _client_get_api_request_if_modified(
+        url_path=url_path,
+        etag=cached['etag'] if cached is not None else None
+    )
+    if resp is None:
+        resp = cached['snapshot']
+    elif cache_file_path is not None and etag is not None:
+        _write_cached_snapshot(cache_file_path, etag=etag, snapshot=resp)
 
-    url_path = f'/api/client/projects/{project_id}/jobs'
-    jobs_resp = _client_get_api_request(url_path=url_path)
-    jobs: List[ProtocaasJob] = [ProtocaasJob(**j) for j in jobs_resp['jobs']]
+    project: ProtocaasProject = ProtocaasProject(**resp['project'])
+    files: List[ProtocaasFile] = [ProtocaasFile(**f) for f in resp['files']]
+    jobs: List[ProtocaasJob] = [ProtocaasJob(**j) for j in resp['jobs']]
 
     return Project(project, files, jobs)
 
+def _get_snapshot_cache_file_path(project_id: str) -> str:
+    cache_dir = os.environ.get('PROTOCAAS_CLIENT_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'protocaas'))
+    return os.path.join(cache_dir, 'project_snapshots', f'{project_id}.json')
+
+def _read_cached_snapshot(cache_file_path: str) -> Union[dict, None]:
+    try:
+        with open(cache_file_path, 'r') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('protocaasUrl', None) != protocaas_url:
+        return None
+    return cached
+
+def _write_cached_snapshot(cache_file_path: str, *, etag: str, snapshot: dict):
+    try:
+        os.makedirs(os.path.dirname(cache_file_path), exist_ok=True)
+        tmp_fname = f'{cache_file_path}.{os.getpid()}.tmp'
+        with open(tmp_fname, 'w') as f:
+            json.dump({'protocaasUrl': protocaas_url, 'etag': etag, 'snapshot': snapshot}, f)
+        os.replace(tmp_fname, cache_file_path)
+    except OSError as e:
+        print(f'Warning: unable to cache project snapshot: {str(e)}')
+
 # type ProtocaasProject = {
 #     projectId: string
 #     workspaceId: string
@@ -126,7 +255,7 @@ def load_project(project_id: str) -> Project:
 #     batchId?: string
 #     inputFiles: {
 #         name: string
-#         fileId: string
+#         fileId?: string
 #         fileName: string
 #     }[]
 #     inputFileIds: string[]
@@ -142,7 +271,7 @@ def load_project(project_id: str) -> Project:
 #     }[]
 #     timestampCreated: number
 #     computeResourceId: string
-#     status: 'pending' | 'queued' | 'starting' | 'running' | 'completed' | 'failed'
+#     status: 'waiting' | 'pending' | 'queued' | 'starting' | 'running' | 'completed' | 'failed'
 #     error?: string
 #     processorVersion?: string
 #     computeResourceNodeId?: string
@@ -1,9 +1,64 @@
+from typing import Tuple, Union
 import os
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from ._crypto_keys import _sign_message_str
 
 protocaas_url = os.getenv('PROTOCAAS_URL', 'https://protocaas.vercel.app')
 
+# Timeouts for API requests (seconds)
+api_request_connect_timeout_sec = float(os.getenv('PROTOCAAS_API_CONNECT_TIMEOUT_SEC', '10'))
+api_request_read_timeout_sec = float(os.getenv('PROTOCAAS_API_READ_TIMEOUT_SEC', '60'))
+
+# Failed API requests are retried this many times, with jittered exponential backoff
+api_request_max_retries = 4
+api_request_backoff_factor_sec = 0.5
+
+# Maximum number of kept-alive connections to the API (the daemon makes requests from several threads)
+api_request_pool_size = 16
+
+_session: requests.Session = None
+_session_pid: int = None
+_session_lock = threading.Lock()
+
+def _get_session() -> requests.Session:
+    """A session shared by all the API requests of this process, so that connections are reused"""
+    global _session, _session_pid
+    with _session_lock:
+        # a forked process (e.g., a job started by a warm worker) must not share the connections of its parent
+        if _session is None or _session_pid != os.getpid():
+            _session = _create_session()
+            _session_pid = os.getpid()
+        return _session
+
+def _create_session() -> requests.Session:
+    retry_kwargs = dict(
+        total=api_request_max_retries,
+        backoff_factor=api_request_backoff_factor_sec,
+        status_forcelist=[429, 502, 503, 504],
+        # connection errors are retried for all methods (the request was not sent), but read errors and error statuses
+        # only for GET -- the server may have processed a PUT or POST whose response was lost, and repeating it is an
+        # error for some of them (e.g., setting the status of a job to running a second time)
+        allowed_methods=['GET'],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    try:
+        retry = Retry(**retry_kwargs, backoff_jitter=api_request_backoff_factor_sec)
+    except TypeError:
+        # urllib3 < 2 does not support jitter
+        retry = Retry(**retry_kwargs)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=api_request_pool_size)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _api_request(method: str, url: str, **kwargs) -> requests.Response:
+    return _get_session().request(method, url, timeout=(api_request_connect_timeout_sec, api_request_read_timeout_sec), **kwargs)
+
 def _compute_resource_get_api_request(*,
     url_path: str,
     compute_resource_id: str,
@@ -23,7 +78,7 @@ def _compute_resource_get_api_request(*,
     }
 
     url = f'{protocaas_url}{url_path}'
-    resp = requests.get(url, headers=headers)
+    resp = _api_request('GET', url, headers=headers)
     if resp.status_code != 200:
         raise Exception(f'Error getting {url}: {resp.status_code} {resp.text}')
     return resp.json()
@@ -44,7 +99,7 @@ def _compute_resource_post_api_request(*,
     }
 
     url = f'{protocaas_url}{url_path}'
-    resp = requests.post(url, headers=headers, json=data)
+    resp = _api_request('POST', url, headers=headers, json=data)
     if resp.status_code != 200:
         raise Exception(f'Error posting {url}: {resp.status_code} {resp.text}')
     return resp.json()
@@ -65,7 +120,7 @@ def _compute_resource_put_api_request(*,
     }
 
     url = f'{protocaas_url}{url_path}'
-    resp = requests.put(url, headers=headers, json=data)
+    resp = _api_request('PUT', url, headers=headers, json=data)
     if resp.status_code != 200:
         raise Exception(f'Error putting {url}: {resp.status_code} {resp.text}')
     return resp.json()
@@ -75,7 +130,7 @@ def _processor_get_api_request(*,
     headers: dict
 ):
     url = f'{protocaas_url}{url_path}'
-    resp = requests.get(url, headers=headers)
+    resp = _api_request('GET', url, headers=headers)
     if resp.status_code != 200:
         raise Exception(f'Error getting {url}: {resp.status_code} {resp.text}')
     return resp.json()
@@ -86,7 +141,7 @@ def _processor_put_api_request(*,
     data: dict
 ):
     url = f'{protocaas_url}{url_path}'
-    resp = requests.put(url, headers=headers, json=data)
+    resp = _api_request('PUT', url, headers=headers, json=data)
     if resp.status_code != 200:
         raise Exception(f'Error putting {url}: {resp.status_code} {resp.text}')
     return resp.json()
@@ -95,7 +150,21 @@ def _client_get_api_request(*,
     url_path: str
 ):
     url = f'{protocaas_url}{url_path}'
-    resp = requests.get(url)
+    resp = _api_request('GET', url)
+    if resp.status_code != 200:
+        raise Exception(f'Error getting {url}: {resp.status_code} {resp.text}')
+    return resp.json()
+
+def _client_get_api_request_if_modified(*,
+    url_path: str,
+    etag: Union[str, None]
+) -> Tuple[Union[dict, None], Union[str, None]]:
+    """Returns (None, etag) if the resource has not changed since etag, otherwise the response and its ETag"""
+    url = f'{protocaas_url}{url_path}'
+    headers = {'If-None-Match': etag} if etag is not None else {}
+    resp = _api_request('GET', url, headers=headers)
+    if resp.status_code == 304:
+        return None, etag
     if resp.status_code != 200:
         raise Exception(f'Error getting {url}: {resp.status_code} {resp.text}')
-    return resp.json()
\ No newline at end of file
+    return resp.json(), resp.headers.get('ETag', None)
@@ -0,0 +1,241 @@
+from typing import List, Dict, Union
+import os
+import json
+import time
+import threading
+import math
+from ..sdk._run_job import _set_job_status
+from ..common.protocaas_types import ComputeResourceSpecProcessorResources
+
+# You must first setup the AWS credentials
+# You can do this in multiple ways like using the aws configure command
+# or by setting environment variables (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, etc.).
+
+
+# How often to check the state of the submitted AWS Batch jobs
+reconcile_interval_sec = 30
+
+# describe_jobs accepts at most 100 job IDs per call
+max_jobs_per_describe = 100
+
+# Used when the processor does not declare its resources
+default_vcpus = 4
+default_memory_mib = 16384
+
+# Validated job definitions are re-checked after this long, in case they were modified
+job_definition_cache_duration_sec = 60 * 10
+
+class AwsBatchJobHandler:
+    """Submits jobs to AWS Batch and marks them failed if their AWS Batch job fails
+
+    The boto3 client and the job definition checks are cached for the life of the daemon.
+    The mapping from protocaas job ID to AWS Batch job ID is persisted to a file in the
+    compute resource node directory, so it survives a restart of the daemon.
+    """
+    def __init__(self, *, state_file_path: str) -> None:
+        self._state_file_path = state_file_path
+        self._lock = threading.Lock()
+        self._client = None
+        self._validated_job_definitions: Dict[str, float] = {} # job definition, container, command -> timestamp
+        # protocaas job ID -> {'batchJobId': ..., 'jobPrivateKey': ...}
+        self._submitted_jobs: Dict[str, dict] = _load_state_file(state_file_path)
+        self._time_of_last_reconcile = 0
+    def submit_job(self, *,
+        job_id: str,
+        job_private_key: str,
+        aws_batch_job_queue: str,
+        aws_batch_job_definition: str,
+        container: str, # for verifying consistent with job definition
+        command: str, # for verifying consistent with job definition
+        resources: ComputeResourceSpecProcessorResources,
+        compute_resource_node_id: Union[str, None] = None
+    ) -> str:
+        client = self._get_client()
+        self._validate_job_definition(
+            aws_batch_job_definition=aws_batch_job_definition,
+            container=container,
+            command=command
+        )
+
+        job_name = f'protocaas-job-{job_id}'
+
+        env_vars = {
+            'JOB_ID': job_id,
+            'JOB_PRIVATE_KEY': job_private_key,
+            'APP_EXECUTABLE': command
+        }
+        if compute_resource_node_id is not None:
+            env_vars['COMPUTE_RESOURCE_NODE_ID'] = compute_resource_node_id
+        from ._start_job import _get_kachery_cloud_credentials # avoid circular import
+        kachery_cloud_client_id, kachery_cloud_private_key = _get_kachery_cloud_credentials()
+        if kachery_cloud_client_id is not None:
+            env_vars['KACHERY_CLOUD_CLIENT_ID'] = kachery_cloud_client_id
+            env_vars['KACHERY_CLOUD_PRIVATE_KEY'] = kachery_cloud_private_key
+
+        response = client.submit_job(
+            jobName=job_name,
+            jobQueue=aws_batch_job_queue,
+            jobDefinition=aws_batch_job_definition,
+            containerOverrides={
+                'environment': [
+                    {
+                        'name': k,
+                        'value': v
+                    }
+                    for k, v in env_vars.items()
+                ],
+                'resourceRequirements': _get_resource_requirements(resources)
+            },
+            **({'timeout': {'attemptDurationSeconds': _get_attempt_duration_sec(resources.timeMin)}} if resources.timeMin is not None else {})
+        )
+
+        batch_job_id = response['jobId']
+        print(f'AWS Batch job submitted: {job_id} {batch_job_id}')
+        with self._lock:
+            self._submitted_jobs[job_id] = {
+                'batchJobId': batch_job_id,
+                'jobPrivateKey': job_private_key
+            }
+            self._save_state_file()
+        return batch_job_id
+    def get_submitted_job_ids(self) -> List[str]:
+        """The protocaas jobs that were submitted and have not finished (including those submitted before a restart)"""
+        with self._lock:
+            return list(self._submitted_jobs.keys())
+    def do_work(self):
+        elapsed = time.time() - self._time_of_last_reconcile
+        if elapsed < reconcile_interval_sec:
+            return
+        self._time_of_last_reconcile = time.time()
+        with self._lock:
+            submitted_jobs = dict(self._submitted_jobs)
+        if len(submitted_jobs) == 0:
+            return
+        try:
+            self._reconcile(submitted_jobs)
+        except Exception as e:
+            print(f'Warning: problem checking the state of AWS Batch jobs: {str(e)}')
+    def _reconcile(self, submitted_jobs: Dict[str, dict]):
+        client = self._get_client()
+        job_ids_by_batch_job_id = {v['batchJobId']: k for k, v in submitted_jobs.items()}
+        batch_job_ids = list(job_ids_by_batch_job_id.keys())
+        finished_job_ids: List[str] = []
+        found_batch_job_ids = set()
+        for i in range(0, len(batch_job_ids), max_jobs_per_describe):
+            resp = client.describe_jobs(jobs=batch_job_ids[i:i + max_jobs_per_describe])
+            for batch_job in resp['jobs']:
+                batch_job_id = batch_job['jobId']
+                found_batch_job_ids.add(batch_job_id)
+                job_id = job_ids_by_batch_job_id[batch_job_id]
+                status = batch_job['status']
+                if status == 'SUCCEEDED':
+                    finished_job_ids.append(job_id)
+                elif status == 'FAILED':
+                    # this covers jobs that failed before the container started (e.g., image pull errors),
+                    # which would otherwise remain in the starting state forever
+                    finished_job_ids.append(job_id)
+                    reason = batch_job.get('statusReason', '')
+                    msg = f'AWS Batch job {batch_job_id} failed: {reason}'
+                    print(f'{msg} (job {job_id})')
+                    try:
+                        _set_job_status(job_id=job_id, job_private_key=submitted_jobs[job_id]['jobPrivateKey'], status='failed', error=msg)
+                    except Exception as e:
+                        # this is expected if the job already reported its own failure
+                        print(f'Unable to set status of job {job_id} to failed: {str(e)}')
+        for batch_job_id, job_id in job_ids_by_batch_job_id.items():
+            if batch_job_id not in found_batch_job_ids:
+                # AWS Batch only keeps finished jobs for a limited time
+                finished_job_ids.append(job_id)
+        if len(finished_job_ids) > 0:
+            with self._lock:
+                for job_id in finished_job_ids:
+                    if job_id in self._submitted_jobs:
+                        del self._submitted_jobs[job_id]
+                self._save_state_file()
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = _create_batch_client()
+            return self._client
+    def _validate_job_definition(self, *, aws_batch_job_definition: str, container: str, command: str):
+        key = json.dumps([aws_batch_job_definition, container, command])
+        with self._lock:
+            timestamp = self._validated_job_definitions.get(key, None)
+        if timestamp is not None and time.time() - timestamp < job_definition_cache_duration_sec:
+            return
+        client = self._get_client()
+        job_def_resp = client.describe_job_definitions(jobDefinitionName=aws_batch_job_definition, status='ACTIVE')
+        job_defs = job_def_resp['jobDefinitions']
+        if len(job_defs) == 0:
+            raise Exception(f'Job definition not found: {aws_batch_job_definition}')
+        # the latest revision is the one that is used when submitting by name
+        job_def = max(job_defs, key=lambda x: x['revision'])
+        job_def_container = job_def['containerProperties']['image']
+        if job_def_container != container:
+            raise Exception(f'Job definition container does not match: {job_def_container} != {container}')
+        job_def_command = job_def['containerProperties']['command']
+        if not _command_matches(job_def_command, command):
+            raise Exception(f'Job definition command does not match: {job_def_command} != {command}')
+        with self._lock:
+            self._validated_job_definitions[key] = time.time()
+    def _save_state_file(self):
+        # must be called with the lock held
+        tmp_fname = self._state_file_path + '.tmp'
+        with open(tmp_fname, 'w') as f:
+            json.dump(self._submitted_jobs, f)
+        os.replace(tmp_fname, self._state_file_path)
+
+def _create_batch_client():
+    import boto3
+
+    aws_access_key_id = os.getenv('BATCH_AWS_ACCESS_KEY_ID', None)
+    if aws_access_key_id is None:
+        raise Exception('BATCH_AWS_ACCESS_KEY_ID is not set')
+    aws_secret_access_key = os.getenv('BATCH_AWS_SECRET_ACCESS_KEY', None)
+    if aws_secret_access_key is None:
+        raise Exception('BATCH_AWS_SECRET_ACCESS_KEY is not set')
+    aws_region = os.getenv('BATCH_AWS_REGION', None)
+    if aws_region is None:
+        raise Exception('BATCH_AWS_REGION is not set')
+
+    return boto3.client(
+        'batch',
+        aws_access_key_id=aws_access_key_id,
+        aws_secret_access_key=aws_secret_access_key,
+        region_name=aws_region
+    )
+
+def _get_resource_requirements(resources: ComputeResourceSpecProcessorResources) -> List[dict]:
+    # Scratch disk can't be overridden per job in AWS Batch -- it is set in the job definition / compute environment
+    if resources.numCpus is not None:
+        # whole vCPUs are required on EC2 (fractional values are only valid on Fargate)
+        vcpus = resources.numCpus if resources.numCpus < 1 else math.ceil(resources.numCpus)
+    else:
+        vcpus = default_vcpus
+    memory_mib = math.ceil(resources.memoryGb * 1024) if resources.memoryGb is not None else default_memory_mib
+    return [
+        {
+            'type': 'VCPU',
+            'value': str(vcpus)
+        },
+        {
+            'type': 'MEMORY',
+            'value': str(memory_mib)
+        }
+    ]
+
+def _get_attempt_duration_sec(time_min: float) -> int:
+    return max(60, math.ceil(time_min * 60)) # AWS Batch requires at least 60 seconds
+
+def _load_state_file(state_file_path: str) -> Dict[str, dict]:
+    if not os.path.exists(state_file_path):
+        return {}
+    try:
+        with open(state_file_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f'Warning: unable to load {state_file_path}: {str(e)}')
+        return {}
+
+def _command_matches(cmd1: List[str], cmd2: str) -> bool:
+    return ' '.join(cmd1) == cmd2
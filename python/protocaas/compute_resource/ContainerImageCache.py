@@ -0,0 +1,256 @@
+from typing import Callable, Dict, List, Tuple, Union
+import os
+import re
+import json
+import time
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+# How often to check whether the images have been updated (e.g., a new image was pushed with the same tag)
+refresh_interval_sec = 60 * 30
+
+# SIF files of superseded images are kept for at least this long, since jobs that were just launched may still be opening them
+# (and for as long as the command of a submitted job, e.g., a queued slurm array task, refers to them)
+superseded_sif_retention_sec = 60 * 60 * 24
+
+# The maximum number of images that are pulled at the same time
+max_simultaneous_pulls = 2
+
+class ContainerImageCache:
+    """Pulls the container images of the apps ahead of time, so that jobs don't have to wait for them
+
+    With docker, the images are pulled into the local docker image store. With singularity, each image is
+    converted to a SIF file in the cache directory, keyed by the digest of the image, and jobs are launched
+    from the SIF file rather than from docker://<image>.
+
+    The number of jobs that were launched from a cached image (hits) and that were not (misses) are
+    written to stats.json in the cache directory.
+
+    get_commands_of_submitted_jobs returns the commands of the jobs that were submitted but may not have started yet,
+    so that the SIF files they refer to are not deleted.
+    """
+    def __init__(self, *, cache_dir: str, container_method: str, get_commands_of_submitted_jobs: Union[Callable[[], List[str]], None]=None) -> None:
+        if container_method not in ['docker', 'singularity']:
+            raise Exception(f'Unexpected container method: {container_method}')
+        self._cache_dir = cache_dir
+        self._container_method = container_method
+        self._get_commands_of_submitted_jobs = get_commands_of_submitted_jobs
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_simultaneous_pulls)
+        self._containers: List[str] = []
+        self._pulls_in_progress = set()
+        # container -> digest (docker) or SIF path (singularity) of the image that is ready to use
+        self._ready: Dict[str, str] = {}
+        # container -> digest of the image that is ready to use
+        self._ready_digests: Dict[str, str] = {}
+        self._superseded_sifs: List[Tuple[str, float]] = [] # (path, time superseded)
+        self._num_hits = 0
+        self._num_misses = 0
+        self._stats_changed = False
+        self._time_of_last_refresh = time.time()
+        os.makedirs(cache_dir, exist_ok=True)
+    def prepare(self, container: str):
+        """Start pulling the image in the background"""
+        with self._lock:
+            if container not in self._containers:
+                self._containers.append(container)
+        self._schedule_pull(container)
+    def get_image_for_spec(self, container: str) -> Tuple[str, str]:
+        """Pull the image now if it is not ready, and return (digest, image argument)
+
+        This is used to get the spec of an app from the same image that its jobs will be launched from,
+        and to cache the spec by the digest of that image.
+        """
+        with self._lock:
+            if container not in self._containers:
+                self._containers.append(container)
+            ready = self._ready.get(container, None)
+        if ready is None or (self._container_method == 'singularity' and not os.path.exists(ready)):
+            self._pull(container)
+        with self._lock:
+            digest = self._ready_digests[container]
+            ready = self._ready[container]
+        return digest, container if self._container_method == 'docker' else ready
+    def get_image_for_job(self, container: str) -> str:
+        """Get the image argument for launching a job (docker run <image> / singularity exec <image>)"""
+        with self._lock:
+            ready = self._ready.get(container, None)
+            if ready is not None and (self._container_method == 'docker' or os.path.exists(ready)):
+                self._num_hits += 1
+                ret = container if self._container_method == 'docker' else ready
+            else:
+                self._num_misses += 1
+                ret = container if self._container_method == 'docker' else f'docker://{container}'
+            self._stats_changed = True
+        return ret
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self._num_hits,
+                'misses': self._num_misses,
+                'ready': dict(self._ready)
+            }
+    def do_work(self):
+        with self._lock:
+            stats_changed = self._stats_changed
+            self._stats_changed = False
+        if stats_changed:
+            self._write_stats()
+        elapsed = time.time() - self._time_of_last_refresh
+        if elapsed > refresh_interval_sec:
+            self._time_of_last_refresh = time.time()
+            with self._lock:
+                containers = list(self._containers)
+            for container in containers:
+                self._schedule_pull(container)
+            self._delete_superseded_sifs()
+    def _schedule_pull(self, container: str):
+        with self._lock:
+            if container in self._pulls_in_progress:
+                return
+            self._pulls_in_progress.add(container)
+        def pull():
+            try:
+                self._pull(container)
+            except Exception as e:
+                print(f'Warning: unable to pull container image {container}: {str(e)}')
+            finally:
+                with self._lock:
+                    self._pulls_in_progress.remove(container)
+        self._executor.submit(pull)
+    def _pull(self, container: str):
+        if self._container_method == 'docker':
+            print(f'Pulling container image {container}')
+            _run_command(['docker', 'pull', container])
+            digest = _run_command(['docker', 'image', 'inspect', '--format', '{{.Id}}', container]).strip()
+            with self._lock:
+                self._ready[container] = digest
+                self._ready_digests[container] = digest
+            print(f'Container image is ready: {container} ({digest})')
+        else:
+            digest = _get_image_digest(container)
+            sif_path = os.path.join(self._cache_dir, digest.replace(':', '-') + '.sif')
+            if not os.path.exists(sif_path):
+                print(f'Building SIF for container image {container} ({digest})')
+                tmp_path = f'{sif_path}.{os.urandom(8).hex()}.tmp'
+                try:
+                    # pull by digest, so that the SIF file corresponds to the digest in its name
+                    _run_command(['singularity', 'pull', '--disable-cache', tmp_path, f'docker://{_get_image_name(container)}@{digest}'])
+                    os.replace(tmp_path, sif_path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+            with self._lock:
+                previous = self._ready.get(container, None)
+                self._ready[container] = sif_path
+                self._ready_digests[container] = digest
+                if previous is not None and previous != sif_path and previous not in self._ready.values():
+                    self._superseded_sifs.append((previous, time.time()))
+            print(f'Container image is ready: {container} ({sif_path})')
+    def _delete_superseded_sifs(self):
+        commands = self._get_commands_of_submitted_jobs() if self._get_commands_of_submitted_jobs is not None else []
+        with self._lock:
+            to_delete = [
+                p for p, t in self._superseded_sifs
+                if time.time() - t > superseded_sif_retention_sec and not any(p in cmd for cmd in commands)
+            ]
+            self._superseded_sifs = [(p, t) for p, t in self._superseded_sifs if p not in to_delete]
+            in_use = set(self._ready.values())
+        for p in to_delete:
+            if p in in_use:
+                continue
+            print(f'Removing superseded SIF file {p}')
+            try:
+                os.remove(p)
+            except OSError as e:
+                print(f'Warning: unable to remove {p}: {str(e)}')
+    def _write_stats(self):
+        stats = self.get_stats()
+        fname = os.path.join(self._cache_dir, 'stats.json')
+        tmp_fname = fname + '.tmp'
+        with open(tmp_fname, 'w') as f:
+            json.dump(stats, f, indent=4)
+        os.replace(tmp_fname, fname)
+
+def _run_command(cmd: List[str]) -> str:
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f'{" ".join(cmd)} returned {result.returncode}: {result.stderr.strip()}')
+    return result.stdout
+
+def _parse_image_reference(container: str) -> Tuple[str, str, str, Union[str, None]]:
+    """Returns (registry, repository, tag, digest) for an image reference such as ghcr.io/org/image:tag"""
+    digest = None
+    if '@' in container:
+        container, digest = container.split('@', 1)
+    tag = 'latest'
+    last_component = container.split('/')[-1]
+    if ':' in last_component:
+        container, tag = container.rsplit(':', 1)
+    parts = container.split('/')
+    if len(parts) > 1 and ('.' in parts[0] or ':' in parts[0] or parts[0] == 'localhost'):
+        registry = parts[0]
+        repository = '/'.join(parts[1:])
+    else:
+        registry = 'registry-1.docker.io'
+        repository = container if len(parts) > 1 else f'library/{container}'
+    if registry in ['docker.io', 'index.docker.io']:
+        # docker hub images may be written with an explicit host, but the registry API is served elsewhere
+        registry = 'registry-1.docker.io'
+        if '/' not in repository:
+            repository = f'library/{repository}'
+    return registry, repository, tag, digest
+
+def _get_image_name(container: str) -> str:
+    """The image reference without the tag or digest"""
+    if '@' in container:
+        container = container.split('@', 1)[0]
+    if ':' in container.split('/')[-1]:
+        container = container.rsplit(':', 1)[0]
+    return container
+
+def _get_image_digest(container: str) -> str:
+    """Get the digest of an image from its registry (without pulling it)"""
+    registry, repository, tag, digest = _parse_image_reference(container)
+    if digest is not None:
+        return digest
+    url = f'https://{registry}/v2/{repository}/manifests/{tag}'
+    headers = {
+        'Accept': ', '.join([
+            'application/vnd.docker.distribution.manifest.list.v2+json',
+            'application/vnd.oci.image.index.v1+json',
+            'application/vnd.docker.distribution.manifest.v2+json',
+            'application/vnd.oci.image.manifest.v1+json'
+        ])
+    }
+    resp = requests.head(url, headers=headers, timeout=30)
+    if resp.status_code == 401:
+        # anonymous token, e.g., for public images on docker hub or ghcr.io
+        token = _get_registry_token(resp.headers.get('WWW-Authenticate', ''))
+        headers['Authorization'] = f'Bearer {token}'
+        resp = requests.head(url, headers=headers, timeout=30)
+    if resp.status_code != 200:
+        raise Exception(f'Unable to get digest of {container}: {resp.status_code}')
+    digest = resp.headers.get('Docker-Content-Digest', None)
+    if digest is None:
+        raise Exception(f'Unable to get digest of {container}: no Docker-Content-Digest header')
+    return digest
+
+def _get_registry_token(www_authenticate: str) -> str:
+    if not www_authenticate.startswith('Bearer '):
+        raise Exception(f'Unexpected WWW-Authenticate header: {www_authenticate}')
+    params = dict(re.findall(r'(\w+)="([^"]*)"', www_authenticate))
+    realm = params.pop('realm', None)
+    if realm is None:
+        raise Exception(f'Unexpected WWW-Authenticate header: {www_authenticate}')
+    resp = requests.get(realm, params=params, timeout=30)
+    if resp.status_code != 200:
+        raise Exception(f'Unable to get registry token: {resp.status_code}')
+    x = resp.json()
+    token = x.get('token', x.get('access_token', None))
+    if not token:
+        raise Exception('Unable to get registry token: no token in response')
+    return token
@@ -0,0 +1,82 @@
+from typing import List, Dict, Tuple
+import math
+from ..common.protocaas_types import ProtocaasJob
+from .LocalJobScheduler import get_job_resources
+
+
+# Recorded usage decays with this half-life, so only recent usage counts against a user or workspace
+usage_half_life_sec = 60 * 60
+
+# A job gains one priority level for each of these intervals that it has been waiting (prevents starvation)
+aging_interval_sec = 60 * 10
+
+# The number of priority levels lost per CPU of recent usage
+usage_weight = 1
+
+class FairShareScheduler:
+    """Orders pending jobs by priority, aging, and the recent usage of their user and workspace"""
+    def __init__(self) -> None:
+        # usage is stored as (value, timestamp) and decayed lazily
+        self._user_usage: Dict[str, Tuple[float, float]] = {}
+        self._workspace_usage: Dict[str, Tuple[float, float]] = {}
+    def record_job_start(self, job: ProtocaasJob, *, now: float):
+        """Charge the user and workspace of a job that was started"""
+        charge = get_job_resources(job).num_cpus
+        _add_usage(self._user_usage, job.userId, charge, now)
+        _add_usage(self._workspace_usage, job.workspaceId, charge, now)
+    def get_user_usage(self, user_id: str, *, now: float) -> float:
+        return _get_usage(self._user_usage, user_id, now)
+    def get_workspace_usage(self, workspace_id: str, *, now: float) -> float:
+        return _get_usage(self._workspace_usage, workspace_id, now)
+    def order_jobs(self, jobs: List[ProtocaasJob], *, now: float) -> List[ProtocaasJob]:
+        """Return the jobs in the order they should be started
+
+        Jobs are picked greedily, and each pick is charged (tentatively) to its user and workspace,
+        so that a user with many pending jobs is interleaved with the others rather than going first.
+        """
+        # Within a (user, workspace) group, the order does not depend on usage, so we only need to compare group heads
+        groups: Dict[Tuple[str, str], List[ProtocaasJob]] = {}
+        for job in jobs:
+            groups.setdefault((job.userId, job.workspaceId), []).append(job)
+        for group_jobs in groups.values():
+            group_jobs.sort(key=lambda job: (-_get_job_base_score(job, now), job.timestampCreated, job.jobId))
+        tentative_user_usage = {user_id: self.get_user_usage(user_id, now=now) for user_id, _ in groups.keys()}
+        tentative_workspace_usage = {workspace_id: self.get_workspace_usage(workspace_id, now=now) for _, workspace_id in groups.keys()}
+        positions = {key: 0 for key in groups.keys()}
+        ret: List[ProtocaasJob] = []
+        while len(ret) < len(jobs):
+            best_key = None
+            best_sort_key = None
+            for key, group_jobs in groups.items():
+                if positions[key] >= len(group_jobs):
+                    continue
+                job = group_jobs[positions[key]]
+                score = _get_job_base_score(job, now) - usage_weight * (tentative_user_usage[job.userId] + tentative_workspace_usage[job.workspaceId])
+                sort_key = (-score, job.timestampCreated, job.jobId)
+                if best_sort_key is None or sort_key < best_sort_key:
+                    best_key = key
+                    best_sort_key = sort_key
+            job = groups[best_key][positions[best_key]]
+            positions[best_key] += 1
+            ret.append(job)
+            charge = get_job_resources(job).num_cpus
+            tentative_user_usage[job.userId] += charge
+            tentative_workspace_usage[job.workspaceId] += charge
+        return ret
+
+def _get_job_base_score(job: ProtocaasJob, now: float) -> float:
+    priority = job.priority if job.priority is not None else 0
+    waiting_time = max(0, now - job.timestampCreated)
+    return priority + waiting_time / aging_interval_sec
+
+def _decay(value: float, elapsed: float) -> float:
+    return value * math.pow(0.5, max(0, elapsed) / usage_half_life_sec)
+
+def _add_usage(usage: Dict[str, Tuple[float, float]], key: str, amount: float, now: float):
+    usage[key] = (_get_usage(usage, key, now) + amount, now)
+
+def _get_usage(usage: Dict[str, Tuple[float, float]], key: str, now: float) -> float:
+    if key not in usage:
+        return 0
+    value, timestamp = usage[key]
+    return _decay(value, now - timestamp)
@@ -0,0 +1,157 @@
+from typing import List, Dict, Set, Union
+import os
+import time
+import shutil
+import queue
+import multiprocessing
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Working directories of finished jobs are deleted once they haven't been used for this long
+max_job_dir_age_sec = 24 * 60 * 60
+
+# When the free space on the disk of the jobs directory drops below the low watermark,
+# the least recently used working directories are deleted until the free space is above the high watermark
+low_watermark_free_fraction = 0.1
+high_watermark_free_fraction = 0.2
+
+# Never delete a directory that was used more recently than this, even if its job is not known to be active
+# (the list of active jobs is only updated periodically by the daemon)
+min_job_dir_age_sec = 60 * 5
+
+# How often to check the free space, and how often to rescan the job directories
+free_space_check_interval_sec = 10
+scan_interval_sec = 60
+
+# The number of directories that are deleted at the same time
+max_simultaneous_deletions = 8
+
+class JobDirectoryJanitor:
+    """Reclaims disk space by deleting the working directories of jobs that are no longer running
+
+    The cleanup runs in a separate process, because it can take a long time to delete all the files
+    in the tmp directories (remfile is the culprit) and we don't want to block the daemon from handling jobs.
+    The daemon reports the jobs that are active on this node via set_active_job_ids, and the directories
+    of those jobs are never deleted. Nothing is deleted until the first report is received.
+    """
+    def __init__(self, *, jobs_dir: str) -> None:
+        self._jobs_dir = jobs_dir
+        self._active_job_ids_queue = multiprocessing.Queue()
+    def start(self):
+        multiprocessing.Process(target=_run_janitor, args=(self._jobs_dir, self._active_job_ids_queue), daemon=True).start()
+    def set_active_job_ids(self, job_ids: List[str]):
+        self._active_job_ids_queue.put(list(job_ids))
+
+@dataclass
+class _JobDirInfo:
+    size: int # bytes on disk
+    last_used: float # the most recent modification time of any file in the directory
+    time_scanned: float
+
+def _run_janitor(jobs_dir: str, active_job_ids_queue: multiprocessing.Queue):
+    active_job_ids: Union[Set[str], None] = None
+    job_dirs: Dict[str, _JobDirInfo] = {}
+    previously_active_job_ids: Set[str] = set()
+    time_of_last_scan = 0
+    while True:
+        # use the most recent report of the active jobs
+        try:
+            while True:
+                active_job_ids = set(active_job_ids_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if active_job_ids is None or not os.path.exists(jobs_dir):
+            time.sleep(free_space_check_interval_sec)
+            continue
+        try:
+            low_on_space = _get_free_fraction(jobs_dir) < low_watermark_free_fraction
+            elapsed_since_last_scan = time.time() - time_of_last_scan
+            if low_on_space or elapsed_since_last_scan > scan_interval_sec:
+                time_of_last_scan = time.time()
+                # directories of jobs that were active since the last scan need to be rescanned
+                _update_job_dirs(job_dirs, jobs_dir=jobs_dir, rescan_job_ids=active_job_ids | previously_active_job_ids)
+                previously_active_job_ids = set(active_job_ids)
+                job_ids_to_delete = _select_job_dirs_to_delete(job_dirs, jobs_dir=jobs_dir, active_job_ids=active_job_ids, low_on_space=low_on_space)
+                if len(job_ids_to_delete) > 0:
+                    _delete_job_dirs(job_dirs, jobs_dir=jobs_dir, job_ids=job_ids_to_delete)
+        except Exception as e:
+            print(f'Warning: problem cleaning up job working directories: {str(e)}')
+        time.sleep(free_space_check_interval_sec)
+
+def _update_job_dirs(job_dirs: Dict[str, _JobDirInfo], *, jobs_dir: str, rescan_job_ids: Set[str]):
+    """Update the sizes of the job directories -- only new directories and those of active jobs are scanned"""
+    job_ids = set()
+    for entry in os.scandir(jobs_dir):
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        job_id = entry.name
+        job_ids.add(job_id)
+        if job_id in job_dirs and job_id not in rescan_job_ids:
+            continue
+        size, last_used = _get_dir_size_and_last_used(entry.path)
+        job_dirs[job_id] = _JobDirInfo(size=size, last_used=last_used, time_scanned=time.time())
+    for job_id in list(job_dirs.keys()):
+        if job_id not in job_ids:
+            del job_dirs[job_id]
+
+def _select_job_dirs_to_delete(job_dirs: Dict[str, _JobDirInfo], *, jobs_dir: str, active_job_ids: Set[str], low_on_space: bool) -> List[str]:
+    now = time.time()
+    candidates = [
+        job_id for job_id, info in job_dirs.items()
+        if job_id not in active_job_ids and now - info.last_used > min_job_dir_age_sec
+    ]
+    ret = [job_id for job_id in candidates if now - job_dirs[job_id].last_used > max_job_dir_age_sec]
+    if low_on_space:
+        usage = shutil.disk_usage(jobs_dir)
+        num_bytes_needed = high_watermark_free_fraction * usage.total - usage.free - sum([job_dirs[job_id].size for job_id in ret])
+        # least recently used first
+        for job_id in sorted(candidates, key=lambda job_id: job_dirs[job_id].last_used):
+            if num_bytes_needed <= 0:
+                break
+            if job_id in ret:
+                continue
+            ret.append(job_id)
+            num_bytes_needed -= job_dirs[job_id].size
+        if num_bytes_needed > 0:
+            print(f'Warning: low on disk space in {jobs_dir}, and unable to free enough space by deleting working directories of finished jobs')
+    return ret
+
+def _delete_job_dirs(job_dirs: Dict[str, _JobDirInfo], *, jobs_dir: str, job_ids: List[str]):
+    def delete_job_dir(job_id: str):
+        print(f'Removing working dir of job {job_id} ({job_dirs[job_id].size / 1e9:.2f} GB)')
+        shutil.rmtree(os.path.join(jobs_dir, job_id), onerror=_on_rmtree_error)
+    with ThreadPoolExecutor(max_workers=max_simultaneous_deletions) as executor:
+        list(executor.map(delete_job_dir, job_ids))
+    for job_id in job_ids:
+        if not os.path.exists(os.path.join(jobs_dir, job_id)):
+            del job_dirs[job_id]
+
+def _on_rmtree_error(func, path, exc_info):
+    print(f'Warning: unable to remove {path}: {str(exc_info[1])}')
+
+def _get_dir_size_and_last_used(path: str):
+    size = 0
+    last_used = os.lstat(path).st_mtime
+    stack = [path]
+    while len(stack) > 0:
+        p = stack.pop()
+        try:
+            with os.scandir(p) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue # the file may have been deleted in the meantime
+                    # st_blocks is the space actually used on disk (files may be sparse)
+                    size += st.st_blocks * 512 if hasattr(st, 'st_blocks') else st.st_size
+                    last_used = max(last_used, st.st_mtime)
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+        except OSError:
+            continue
+    return size, last_used
+
+def _get_free_fraction(dir: str) -> float:
+    usage = shutil.disk_usage(dir)
+    return usage.free / usage.total
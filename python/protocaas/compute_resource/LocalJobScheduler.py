@@ -0,0 +1,126 @@
+from typing import List, Dict
+import os
+import math
+import shutil
+from dataclasses import dataclass
+from ..common.protocaas_types import ProtocaasJob
+from ._get_requested_job_resources import _get_requested_job_resources
+
+
+# Resources assumed for a job whose processor does not declare them
+default_job_num_cpus = 1
+default_job_memory_gb = 2
+default_job_disk_gb = 1
+
+# Once a pending job has been skipped (for lack of resources) for this long, smaller jobs are no longer allowed to jump ahead of it
+max_backfill_wait_sec = 60 * 30
+
+@dataclass
+class JobResources:
+    """Resources required by a job, or available on a node"""
+    num_cpus: float
+    memory_gb: float
+    disk_gb: float
+    def fits_in(self, other: 'JobResources') -> bool:
+        return self.num_cpus <= other.num_cpus and self.memory_gb <= other.memory_gb and self.disk_gb <= other.disk_gb
+    def minus(self, other: 'JobResources') -> 'JobResources':
+        return JobResources(
+            num_cpus=self.num_cpus - other.num_cpus,
+            memory_gb=self.memory_gb - other.memory_gb,
+            disk_gb=self.disk_gb - other.disk_gb
+        )
+    def clamped_to(self, other: 'JobResources') -> 'JobResources':
+        return JobResources(
+            num_cpus=min(self.num_cpus, other.num_cpus),
+            memory_gb=min(self.memory_gb, other.memory_gb),
+            disk_gb=min(self.disk_gb, other.disk_gb)
+        )
+
+class LocalJobScheduler:
+    """Decides which pending local jobs to start based on the capacity of this node"""
+    def __init__(self, *, jobs_dir: str) -> None:
+        self._jobs_dir = jobs_dir
+        self._num_cpus = _get_num_cpus()
+        self._memory_gb = _get_memory_gb()
+        # job ID -> when the job was first skipped because it did not fit
+        self._time_first_skipped: Dict[str, float] = {}
+    def get_capacity(self) -> JobResources:
+        """The total capacity of this node (disk is the space currently free in the jobs directory)"""
+        return JobResources(
+            num_cpus=self._num_cpus,
+            memory_gb=self._memory_gb,
+            disk_gb=_get_free_disk_gb(self._jobs_dir)
+        )
+    def select_jobs_to_start(self, *, running_jobs: List[ProtocaasJob], pending_jobs: List[ProtocaasJob], now: float) -> List[ProtocaasJob]:
+        """Bin-pack the pending jobs (in order) against the capacity that is not used by the running jobs"""
+        # forget the jobs that are no longer pending
+        pending_job_ids = set(job.jobId for job in pending_jobs)
+        self._time_first_skipped = {k: v for k, v in self._time_first_skipped.items() if k in pending_job_ids}
+        capacity = self.get_capacity()
+        remaining = JobResources(num_cpus=capacity.num_cpus, memory_gb=capacity.memory_gb, disk_gb=capacity.disk_gb)
+        for job in running_jobs:
+            # disk used by running jobs is already reflected in the free disk space
+            r = get_job_resources(job).clamped_to(capacity)
+            remaining = remaining.minus(JobResources(num_cpus=r.num_cpus, memory_gb=r.memory_gb, disk_gb=0))
+        ret: List[ProtocaasJob] = []
+        for job in pending_jobs:
+            # a job that requests more than the whole node can still run when the node is otherwise idle
+            r = get_job_resources(job).clamped_to(capacity)
+            if r.fits_in(remaining):
+                ret.append(job)
+                remaining = remaining.minus(r)
+                self._time_first_skipped.pop(job.jobId, None)
+            else:
+                # (not the age of the job, since on a long queue every job would be old enough to block the others)
+                elapsed = now - self._time_first_skipped.setdefault(job.jobId, now)
+                if elapsed > max_backfill_wait_sec:
+                    # reserve the remaining capacity for this job so it doesn't starve
+                    break
+        return ret
+
+def get_job_resources(job: ProtocaasJob) -> JobResources:
+    """Get the resources required by a job
+
+    These come from the resources declared by its processor (including per-job parameter overrides),
+    falling back to the num_cpus/memory_gb/disk_gb attributes of the processor, and then to the defaults.
+    """
+    requested = _get_requested_job_resources(job)
+    attrs = {a.name: a.value for a in job.processorSpec.attributes}
+    return JobResources(
+        num_cpus=requested.numCpus if requested.numCpus is not None else _get_numeric_attribute(job, attrs, 'num_cpus', default_job_num_cpus),
+        memory_gb=requested.memoryGb if requested.memoryGb is not None else _get_numeric_attribute(job, attrs, 'memory_gb', default_job_memory_gb),
+        disk_gb=requested.diskGb if requested.diskGb is not None else _get_numeric_attribute(job, attrs, 'disk_gb', default_job_disk_gb)
+    )
+
+def _get_numeric_attribute(job: ProtocaasJob, attrs: dict, name: str, default: float) -> float:
+    # a malformed attribute must not prevent the other jobs from being scheduled, so fall back to the default
+    value = attrs.get(name, None)
+    if value is None:
+        return default
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        value = None
+    if value is None or not math.isfinite(value) or value < 0:
+        print(f'Warning: ignoring invalid value of attribute {name} of processor {job.processorName} for job {job.jobId}: {attrs[name]}')
+        return default
+    return value
+
+def _get_num_cpus() -> int:
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0)) # respects cpu restrictions (e.g., taskset, cgroups cpusets)
+    return os.cpu_count() or 1
+
+def _get_memory_gb() -> float:
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1e9
+    except (ValueError, OSError, AttributeError):
+        print('Warning: unable to determine the amount of memory on this node. Assuming 8 GB.')
+        return 8
+
+def _get_free_disk_gb(dir: str) -> float:
+    # the jobs directory may not exist yet, so use the nearest existing parent
+    d = os.path.abspath(dir)
+    while not os.path.exists(d):
+        d = os.path.dirname(d)
+    return shutil.disk_usage(d).free / 1e9
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Callable, Union
 import queue
 from pubnub.pnconfiguration import PNConfiguration
 from pubnub.callbacks import SubscribeCallback
@@ -8,10 +8,13 @@ class MySubscribeCallback(SubscribeCallback):
     def __init__(self, message_queue: queue.Queue, compute_resource_id: str):
         self._message_queue = message_queue
         self._compute_resource_id = compute_resource_id
+        self._on_message: Union[Callable[[], None], None] = None
     def message(self, pubnub, message):
         msg = message.message
         if msg.get('computeResourceId', None) == self._compute_resource_id:
             self._message_queue.put(msg)
+            if self._on_message is not None:
+                self._on_message()
 
 class PubsubClient:
     def __init__(self, *,
@@ -25,8 +28,12 @@ class PubsubClient:
         pnconfig.subscribe_key = pubnub_subscribe_key
         pnconfig.user_id = pubnub_user
         pubnub = PubNub(pnconfig)
-        pubnub.add_listener(MySubscribeCallback(message_queue=self._message_queue, compute_resource_id=compute_resource_id))
+        self._callback = MySubscribeCallback(message_queue=self._message_queue, compute_resource_id=compute_resource_id)
+        pubnub.add_listener(self._callback)
         pubnub.subscribe().channels([pubnub_channel]).execute()
+    def set_on_message(self, on_message: Callable[[], None]):
+        """Set a function to be called (from the pubnub thread) whenever a message is received"""
+        self._callback._on_message = on_message
     def take_messages(self) -> List[dict]:
         ret = []
         while True:
@@ -0,0 +1,275 @@
+from typing import List, Dict, Tuple, Union, TYPE_CHECKING
+import os
+import json
+import re
+import math
+import time
+import subprocess
+from dataclasses import dataclass
+from ..sdk._run_job import _set_job_status
+from ..common.protocaas_types import ComputeResourceSlurmOpts, ProtocaasJob
+from ._get_requested_job_resources import _get_requested_job_resources
+
+if TYPE_CHECKING:
+    from .start_compute_resource_node import Daemon
+
+
+# The maximum number of jobs submitted in a single slurm job array
+max_jobs_in_array = 500
+
+# Wait this long after the last job was added before submitting, because maybe more will be added
+quiet_period_sec = 5
+
+# But never postpone submitting a job for longer than this
+max_wait_sec = 30
+
+# How often to check the state of the submitted array tasks with sacct
+sacct_interval_sec = 30
+
+# An array that sacct has not reported in this many consecutive checks (e.g., its accounting records were purged)
+# is considered lost, and its remaining tasks are marked failed -- otherwise their leases would be renewed forever
+max_sacct_checks_missing = 10
+
+# Array task states (as reported by sacct) that mean the task is finished
+slurm_terminal_states = ['COMPLETED', 'FAILED', 'CANCELLED', 'TIMEOUT', 'OUT_OF_MEMORY', 'NODE_FAIL', 'PREEMPTED', 'BOOT_FAIL', 'DEADLINE']
+
+@dataclass
+class SlurmArrayTask:
+    """A protocaas job that was submitted as a task of a slurm job array"""
+    job_id: str
+    job_private_key: str
+    command: str = '' # the shell command of the task (e.g., it refers to the SIF file of the container image)
+
+class SlurmJobHandler:
+    """Submits jobs as slurm job arrays and marks them failed if their array task fails
+
+    If a state file is given, the submitted array tasks are persisted to it, so they survive a restart of the daemon.
+    """
+    def __init__(self, daemon: 'Daemon', slurm_opts: ComputeResourceSlurmOpts, *, state_file_path: Union[str, None]=None):
+        self._daemon = daemon
+        self._slurm_opts = slurm_opts
+        self._jobs: List[ProtocaasJob] = []
+        self._job_ids = set()
+        self._time_of_first_job_added = 0
+        self._time_of_last_job_added = 0
+        # slurm job ID -> array task index -> task
+        self._state_file_path = state_file_path
+        self._submitted_arrays: Dict[str, Dict[int, SlurmArrayTask]] = _load_state_file(state_file_path) if state_file_path is not None else {}
+        self._time_of_last_sacct = 0
+        # slurm job ID -> number of consecutive sacct checks that did not report the array
+        self._num_sacct_checks_missing: Dict[str, int] = {}
+    def add_job(self, job: ProtocaasJob):
+        job_id = job.jobId
+        if job_id not in self._job_ids:
+            if len(self._jobs) == 0:
+                self._time_of_first_job_added = time.time()
+            self._jobs.append(job)
+            self._job_ids.add(job_id)
+            self._time_of_last_job_added = time.time()
+    def get_submitted_job_ids(self) -> List[str]:
+        """The protocaas jobs that were submitted in an array and have not finished (including those submitted before a restart)"""
+        return [task.job_id for tasks in self._submitted_arrays.values() for task in tasks.values()]
+    def get_submitted_commands(self) -> List[str]:
+        """The shell commands of the array tasks that were submitted and have not finished"""
+        return [task.command for tasks in self._submitted_arrays.values() for task in tasks.values()]
+    def do_work(self):
+        elapsed_since_last_sacct = time.time() - self._time_of_last_sacct
+        if len(self._submitted_arrays) > 0 and elapsed_since_last_sacct > sacct_interval_sec:
+            self._time_of_last_sacct = time.time()
+            self._check_submitted_arrays()
+
+        if len(self._jobs) == 0:
+            return
+        elapsed_since_last_job_added = time.time() - self._time_of_last_job_added
+        elapsed_since_first_job_added = time.time() - self._time_of_first_job_added
+        # The batch size adapts to the queue depth: a full array is submitted right away,
+        # otherwise we wait for a quiet period (but not too long) so that more jobs can be included
+        ready = (
+            len(self._jobs) >= max_jobs_in_array or
+            elapsed_since_last_job_added >= quiet_period_sec or
+            elapsed_since_first_job_added >= max_wait_sec
+        )
+        if not ready:
+            return
+        num_jobs_to_start = min(max_jobs_in_array, len(self._jobs))
+        jobs_to_start = self._jobs[:num_jobs_to_start]
+        self._jobs = self._jobs[num_jobs_to_start:]
+        for job in jobs_to_start:
+            self._job_ids.remove(job.jobId)
+        self._time_of_first_job_added = time.time() # for the jobs that remain
+        # all tasks of an array get the same allocation, so jobs with different resource requirements go in separate arrays
+        jobs_by_resource_opts: Dict[Tuple[str, ...], List[ProtocaasJob]] = {}
+        for job in jobs_to_start:
+            jobs_by_resource_opts.setdefault(tuple(_get_slurm_resource_opts(job)), []).append(job)
+        for resource_opts, jobs in jobs_by_resource_opts.items():
+            self._run_slurm_array(jobs, resource_opts=list(resource_opts))
+    def _run_slurm_array(self, jobs: List[ProtocaasJob], *, resource_opts: List[str]):
+        if not os.path.exists('slurm_scripts'):
+            os.mkdir('slurm_scripts')
+        random_str = os.urandom(16).hex()
+        slurm_script_fname = f'slurm_scripts/slurm_array_{random_str}.sh'
+        tasks: Dict[int, SlurmArrayTask] = {}
+        with open(slurm_script_fname, 'w') as f:
+            f.write('#!/bin/bash\n')
+            f.write('\n')
+            f.write('set -e\n')
+            f.write('\n')
+            for job in jobs:
+                cmd = self._daemon._start_job(job, run_process=False, return_shell_command=True)
+                if cmd:
+                    # important to use consecutive indices for the jobs that were actually started
+                    ii = len(tasks)
+                    f.write(f'if [ "$SLURM_ARRAY_TASK_ID" == "{ii}" ]; then\n')
+                    f.write(f'    {cmd}\n')
+                    f.write('fi\n')
+                    f.write('\n')
+                    tasks[ii] = SlurmArrayTask(job_id=job.jobId, job_private_key=job.jobPrivateKey, command=cmd)
+            f.write('\n')
+        if len(tasks) == 0:
+            # important not to submit an empty script
+            return
+        # each array task gets its own allocation with the resources below
+        oo = [f'--array=0-{len(tasks) - 1}']
+        oo.append(f'--output=slurm_scripts/slurm_array_{random_str}_%a.out')
+        if self._slurm_opts.cpusPerTask is not None:
+            oo.append(f'--cpus-per-task={self._slurm_opts.cpusPerTask}')
+        if self._slurm_opts.partition is not None:
+            oo.append(f'--partition={self._slurm_opts.partition}')
+        if self._slurm_opts.time is not None:
+            oo.append(f'--time={self._slurm_opts.time}')
+        if self._slurm_opts.otherOpts is not None:
+            for opt in self._slurm_opts.otherOpts.split(' '):
+                if opt:
+                    oo.append(opt)
+        # the resources declared by the processor take precedence (when an option is repeated, sbatch uses the last one)
+        oo.extend(resource_opts)
+        cmd = ['sbatch', '--parsable'] + oo + [slurm_script_fname]
+        print(f'Submitting slurm array: {" ".join(cmd)}')
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise Exception(f'sbatch returned {result.returncode}: {result.stderr.strip()}')
+            # the output is of the form <job_id> or <job_id>;<cluster_name>
+            slurm_job_id = result.stdout.strip().split(';')[0]
+            if not slurm_job_id.isdigit():
+                raise Exception(f'Unexpected output of sbatch: {result.stdout.strip()}')
+        except Exception as e:
+            msg = f'Failed to submit slurm array: {str(e)}'
+            print(msg)
+            for task in tasks.values():
+                _set_job_status_to_failed_if_possible(task, msg)
+            return
+        print(f'Slurm array submitted: {slurm_job_id} ({len(tasks)} jobs)')
+        self._submitted_arrays[slurm_job_id] = tasks
+        self._save_state_file()
+    def _check_submitted_arrays(self):
+        slurm_job_ids = list(self._submitted_arrays.keys())
+        cmd = ['sacct', '--jobs', ','.join(slurm_job_ids), '--format=JobID,State', '--noheader', '--parsable2']
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise Exception(f'sacct returned {result.returncode}: {result.stderr.strip()}')
+        except Exception as e:
+            print(f'Warning: unable to check the state of slurm arrays: {str(e)}')
+            return
+        reported_slurm_job_ids = set()
+        for slurm_job_id, task_index, state in _parse_sacct_output(result.stdout):
+            reported_slurm_job_ids.add(slurm_job_id)
+            tasks = self._submitted_arrays.get(slurm_job_id, None)
+            if tasks is None or task_index not in tasks:
+                continue
+            if state not in slurm_terminal_states:
+                continue
+            task = tasks[task_index]
+            del tasks[task_index]
+            if state != 'COMPLETED':
+                # if the job itself already reported failure, this will be rejected by the server, which is fine
+                _set_job_status_to_failed_if_possible(task, f'Slurm array task {slurm_job_id}_{task_index} finished with state {state}')
+        for slurm_job_id in slurm_job_ids:
+            if slurm_job_id in reported_slurm_job_ids:
+                self._num_sacct_checks_missing.pop(slurm_job_id, None)
+                continue
+            n = self._num_sacct_checks_missing.get(slurm_job_id, 0) + 1
+            self._num_sacct_checks_missing[slurm_job_id] = n
+            if n >= max_sacct_checks_missing:
+                print(f'Slurm array {slurm_job_id} was not reported by sacct in {n} consecutive checks')
+                for task_index, task in self._submitted_arrays[slurm_job_id].items():
+                    _set_job_status_to_failed_if_possible(task, f'Slurm array task {slurm_job_id}_{task_index} was lost (not reported by sacct)')
+                self._submitted_arrays[slurm_job_id] = {}
+        for slurm_job_id in slurm_job_ids:
+            if len(self._submitted_arrays[slurm_job_id]) == 0:
+                del self._submitted_arrays[slurm_job_id]
+                self._num_sacct_checks_missing.pop(slurm_job_id, None)
+        self._save_state_file()
+    def _save_state_file(self):
+        if self._state_file_path is None:
+            return
+        state = {
+            slurm_job_id: {str(ii): {'jobId': task.job_id, 'jobPrivateKey': task.job_private_key, 'command': task.command} for ii, task in tasks.items()}
+            for slurm_job_id, tasks in self._submitted_arrays.items()
+        }
+        tmp_fname = self._state_file_path + '.tmp'
+        with open(tmp_fname, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_fname, self._state_file_path)
+
+def _get_slurm_resource_opts(job: ProtocaasJob) -> List[str]:
+    resources = _get_requested_job_resources(job)
+    ret: List[str] = []
+    if resources.numCpus is not None:
+        ret.append(f'--cpus-per-task={math.ceil(resources.numCpus)}')
+    if resources.memoryGb is not None:
+        ret.append(f'--mem={math.ceil(resources.memoryGb * 1024)}M')
+    if resources.diskGb is not None:
+        ret.append(f'--tmp={math.ceil(resources.diskGb * 1024)}M')
+    if resources.timeMin is not None:
+        ret.append(f'--time={math.ceil(resources.timeMin)}')
+    return ret
+
+def _parse_sacct_output(output: str):
+    """Yield (slurm job ID, array task index, state) for each array task in the output of sacct --parsable2"""
+    for line in output.splitlines():
+        a = line.strip().split('|')
+        if len(a) < 2:
+            continue
+        state = a[1].split(' ')[0] # e.g., "CANCELLED by 1000"
+        m = re.match(r'^(\d+)_(\d+)$', a[0])
+        if m is not None:
+            yield m.group(1), int(m.group(2)), state
+            continue
+        # tasks that never started are reported as a range (e.g., 1234_[6-9,12%4] when pending, or when cancelled before starting)
+        m = re.match(r'^(\d+)_\[(\d+(?:-\d+)?(?:,\d+(?:-\d+)?)*)(?:%\d+)?\]$', a[0])
+        if m is not None:
+            for task_index in _parse_array_task_ranges(m.group(2)):
+                yield m.group(1), task_index, state
+        # job steps (e.g., 1234_5.batch) are skipped
+
+def _parse_array_task_ranges(ranges: str) -> List[int]:
+    ret: List[int] = []
+    for r in ranges.split(','):
+        if '-' in r:
+            i1, i2 = r.split('-', 1)
+            ret.extend(range(int(i1), int(i2) + 1))
+        elif r:
+            ret.append(int(r))
+    return ret
+
+def _set_job_status_to_failed_if_possible(task: SlurmArrayTask, error: str):
+    try:
+        _set_job_status(job_id=task.job_id, job_private_key=task.job_private_key, status='failed', error=error)
+    except Exception as e:
+        print(f'Unable to set status of job {task.job_id} to failed: {str(e)}')
+
+def _load_state_file(state_file_path: str) -> Dict[str, Dict[int, SlurmArrayTask]]:
+    if not os.path.exists(state_file_path):
+        return {}
+    try:
+        with open(state_file_path, 'r') as f:
+            state = json.load(f)
+        return {
+            slurm_job_id: {int(ii): SlurmArrayTask(job_id=t['jobId'], job_private_key=t['jobPrivateKey'], command=t.get('command', '')) for ii, t in tasks.items()}
+            for slurm_job_id, tasks in state.items()
+        }
+    except Exception as e:
+        print(f'Warning: unable to load {state_file_path}: {str(e)}')
+        return {}
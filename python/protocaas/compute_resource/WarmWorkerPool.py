@@ -0,0 +1,110 @@
+from typing import List, Dict, Union
+import os
+import json
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+from ..sdk.App import App
+
+
+# The maximum time to wait for a warm worker to start (this includes importing the app)
+worker_startup_timeout_sec = 60 * 2
+
+class WarmWorker:
+    """A fork-server process for an app (the app executable run with PROTOCAAS_FORK_SERVER_SOCKET set)"""
+    def __init__(self, *, executable_path: str, socket_path: str) -> None:
+        self._executable_path = executable_path
+        self._socket_path = socket_path
+        self._lock = threading.Lock()
+        self._process: Union[subprocess.Popen, None] = None
+        self._executable_mtime = None
+    def ensure_running(self):
+        with self._lock:
+            mtime = os.stat(self._executable_path).st_mtime
+            if self._process is not None and self._process.poll() is None:
+                if mtime == self._executable_mtime:
+                    return
+                print(f'App executable has changed, restarting warm worker: {self._executable_path}')
+                self._process.terminate()
+            if os.path.exists(self._socket_path):
+                os.remove(self._socket_path)
+            print(f'Starting warm worker: {self._executable_path}')
+            self._executable_mtime = mtime
+            self._process = subprocess.Popen(
+                [self._executable_path],
+                env={
+                    **os.environ,
+                    'PROTOCAAS_FORK_SERVER_SOCKET': self._socket_path
+                }
+            )
+            t0 = time.time()
+            while not os.path.exists(self._socket_path):
+                if self._process.poll() is not None:
+                    raise Exception(f'Warm worker exited with code {self._process.returncode}')
+                if time.time() - t0 > worker_startup_timeout_sec:
+                    self._process.terminate()
+                    raise Exception('Timed out waiting for warm worker to start')
+                time.sleep(0.1)
+    def fork_job(self, *, job_id: str, job_private_key: str, working_dir: str, env_vars: dict) -> int:
+        self.ensure_running()
+        request = {
+            'jobId': job_id,
+            'jobPrivateKey': job_private_key,
+            'workingDir': working_dir,
+            'env': env_vars
+        }
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(30)
+            s.connect(self._socket_path)
+            s.sendall((json.dumps(request) + '\n').encode('utf-8'))
+            buf = b''
+            while not buf.endswith(b'\n'):
+                x = s.recv(4096)
+                if len(x) == 0:
+                    break
+                buf += x
+        resp = json.loads(buf.decode('utf-8'))
+        if 'error' in resp:
+            raise Exception(resp['error'])
+        return resp['pid']
+
+class WarmWorkerPool:
+    """Warm workers for the apps that opted in (App(..., warm_worker=True)), used for local jobs without a container
+
+    Starting a job by forking from a process where the app has already been imported avoids
+    starting two new interpreters per job and importing the (possibly heavy) dependencies of the app.
+    """
+    def __init__(self, apps: List[App]) -> None:
+        # the socket paths need to be short (at most ~100 characters), so they are not in the compute resource directory
+        self._socket_dir = tempfile.mkdtemp(prefix='protocaas-warm-workers-')
+        self._workers: Dict[str, WarmWorker] = {} # by executable path
+        for app in apps:
+            if app._executable_path in self._workers:
+                continue
+            worker = WarmWorker(
+                executable_path=app._executable_path,
+                socket_path=os.path.join(self._socket_dir, f'{len(self._workers)}.sock')
+            )
+            self._workers[app._executable_path] = worker
+            # start in the background so the daemon can continue starting up
+            threading.Thread(target=_ensure_running_if_possible, args=(worker,), daemon=True).start()
+    def has_app(self, app: App) -> bool:
+        return app._executable_path in self._workers
+    def start_job(self, *, app: App, job_id: str, job_private_key: str, working_dir: str, env_vars: dict) -> bool:
+        """Returns False if the job could not be started in a warm worker (in which case it should be started normally)"""
+        worker = self._workers[app._executable_path]
+        try:
+            pid = worker.fork_job(job_id=job_id, job_private_key=job_private_key, working_dir=working_dir, env_vars=env_vars)
+        except Exception as e:
+            print(f'Warning: unable to start job {job_id} in warm worker: {str(e)}')
+            return False
+        print(f'Started job {job_id} in warm worker (pid {pid})')
+        return True
+
+def _ensure_running_if_possible(worker: WarmWorker):
+    try:
+        worker.ensure_running()
+    except Exception as e:
+        print(f'Warning: unable to start warm worker: {str(e)}')
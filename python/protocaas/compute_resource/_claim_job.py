@@ -0,0 +1,53 @@
+from typing import List
+from ..common._api_request import _compute_resource_post_api_request, _compute_resource_put_api_request
+
+
+# When a node claims a job, the job is moved from pending to starting and a lease is recorded.
+# The node must renew the lease while the job is starting. If the lease expires (e.g., the node went down),
+# the server returns the job to pending so that another node can claim it.
+job_lease_duration = 60 * 5
+
+def _claim_job(*,
+    job_id: str,
+    compute_resource_id: str,
+    compute_resource_private_key: str,
+    compute_resource_node_id: str,
+    compute_resource_node_name: str
+) -> bool:
+    """Atomically claim a pending job for this node. Returns False if the job was already claimed."""
+    url_path = f'/api/compute_resource/compute_resources/{compute_resource_id}/jobs/{job_id}/claim'
+    resp = _compute_resource_post_api_request(
+        url_path=url_path,
+        compute_resource_id=compute_resource_id,
+        compute_resource_private_key=compute_resource_private_key,
+        data={
+            'computeResourceNodeId': compute_resource_node_id,
+            'computeResourceNodeName': compute_resource_node_name,
+            'leaseDuration': job_lease_duration
+        }
+    )
+    if not resp['success']:
+        raise Exception(f'Error claiming job: {resp["error"]}')
+    return resp['claimed']
+
+def _renew_job_leases(*,
+    job_ids: List[str],
+    compute_resource_id: str,
+    compute_resource_private_key: str,
+    compute_resource_node_id: str
+) -> List[str]:
+    """Renew the leases of jobs claimed by this node. Returns the IDs of the jobs that are still starting."""
+    url_path = f'/api/compute_resource/compute_resources/{compute_resource_id}/job_leases'
+    resp = _compute_resource_put_api_request(
+        url_path=url_path,
+        compute_resource_id=compute_resource_id,
+        compute_resource_private_key=compute_resource_private_key,
+        data={
+            'jobIds': job_ids,
+            'computeResourceNodeId': compute_resource_node_id,
+            'leaseDuration': job_lease_duration
+        }
+    )
+    if not resp['success']:
+        raise Exception(f'Error renewing job leases: {resp["error"]}')
+    return resp['renewedJobIds']
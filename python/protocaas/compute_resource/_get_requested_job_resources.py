@@ -0,0 +1,36 @@
+import math
+from ..common.protocaas_types import ProtocaasJob, ComputeResourceSpecProcessorResources
+
+
+def _get_requested_job_resources(job: ProtocaasJob) -> ComputeResourceSpecProcessorResources:
+    """Get the resources declared by the processor of a job (see the @resources decorator), with the parameter overrides applied
+
+    Resources that were not declared are None.
+    """
+    resources = job.processorSpec.resources
+    if resources is None:
+        return ComputeResourceSpecProcessorResources()
+    ret = ComputeResourceSpecProcessorResources(
+        numCpus=resources.numCpus,
+        memoryGb=resources.memoryGb,
+        diskGb=resources.diskGb,
+        timeMin=resources.timeMin
+    )
+    parameter_values = {p.name: p.value for p in job.inputParameters}
+    for o in resources.parameterOverrides:
+        value = parameter_values.get(o.parameter, None)
+        if value is None:
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            value = None
+        if value is None or not math.isfinite(value):
+            # e.g., "nan" or "inf" would break the slurm options and never fit on a node
+            print(f'Warning: ignoring invalid value of parameter {o.parameter} for resource {o.resource} in job {job.jobId}: {parameter_values[o.parameter]}')
+            continue
+        if value <= 0:
+            # lets the parameter default to 0, meaning "use the declared value"
+            continue
+        setattr(ret, o.resource, value)
+    return ret
@@ -1,46 +1,33 @@
+from typing import Union
 import os
 import subprocess
 from ..sdk.App import App
-from ._run_job_in_aws_batch import _run_job_in_aws_batch
-from ..common._api_request import _processor_put_api_request
-from ..common.protocaas_types import ComputeResourceSlurmOpts
+from .AwsBatchJobHandler import AwsBatchJobHandler
+from .ContainerImageCache import ContainerImageCache
+from .WarmWorkerPool import WarmWorkerPool
+from ..common.protocaas_types import ComputeResourceSlurmOpts, ComputeResourceSpecProcessorResources
 
 
-def _set_job_status_to_starting(*,
-    job_id: str,
-    job_private_key: str
-):
-    url_path = f'/api/processor/jobs/{job_id}/status'
-    headers = {
-        'job-private-key': job_private_key
-    }
-    resp = _processor_put_api_request(
-        url_path=url_path,
-        headers=headers,
-        data={
-            'status': 'starting'
-        }
-    )
-    if not resp['success']:
-        raise Exception(f'Error setting job status to starting: {resp["error"]}')
-
 def _start_job(*,
     job_id: str,
     job_private_key: str,
     processor_name: str,
     app: App,
     run_process: bool = True,
-    return_shell_command: bool = False
+    return_shell_command: bool = False,
+    aws_batch_job_handler: Union[AwsBatchJobHandler, None] = None,
+    resources: Union[ComputeResourceSpecProcessorResources, None] = None,
+    container_image_cache: Union[ContainerImageCache, None] = None,
+    warm_worker_pool: Union[WarmWorkerPool, None] = None,
+    compute_resource_node_id: Union[str, None] = None
 ):
     if return_shell_command and run_process:
         raise Exception('Cannot set both run_process and return_shell_command to True')
     if not return_shell_command and not run_process:
         raise Exception('Cannot set both run_process and return_shell_command to False')
 
-    _set_job_status_to_starting(
-        job_id=job_id,
-        job_private_key=job_private_key
-    )
+    # Note: the job has already been claimed by this node (status set to starting) -- see _claim_job
+
     if not hasattr(app, '_executable_path'):
         raise Exception(f'App does not have an executable path')
     executable_path: str = app._executable_path
@@ -60,15 +47,19 @@ def _start_job(*,
             raise Exception(f'aws_batch_job_queue is set but aws_batch_job_definition is not set')
         if not container:
             raise Exception(f'aws_batch_job_queue is set but container is not set')
+        if aws_batch_job_handler is None:
+            raise Exception(f'aws_batch_job_queue is set but no AWS Batch job handler was provided')
         print(f'Running job in AWS Batch: {job_id} {processor_name} {aws_batch_job_queue} {aws_batch_job_definition}')
         try:
-            _run_job_in_aws_batch(
+            aws_batch_job_handler.submit_job(
                 job_id=job_id,
                 job_private_key=job_private_key,
                 aws_batch_job_queue=aws_batch_job_queue,
                 aws_batch_job_definition=aws_batch_job_definition,
                 container=container, # for verifying consistent with job definition
-                command=executable_path # for verifying consistent with job definition
+                command=executable_path, # for verifying consistent with job definition
+                compute_resource_node_id=compute_resource_node_id,
+                resources=resources if resources is not None else ComputeResourceSpecProcessorResources()
             )
         except Exception as e:
             raise Exception(f'Error running job in AWS Batch: {e}')
@@ -84,12 +75,24 @@ def _start_job(*,
         'JOB_PRIVATE_KEY': job_private_key,
         'APP_EXECUTABLE': executable_path
     }
+    if compute_resource_node_id is not None:
+        # the job reports the node that claimed it when it sets its status to running
+        env_vars['COMPUTE_RESOURCE_NODE_ID'] = compute_resource_node_id
     kachery_cloud_client_id, kachery_cloud_private_key = _get_kachery_cloud_credentials()
     if kachery_cloud_client_id is not None:
         env_vars['KACHERY_CLOUD_CLIENT_ID'] = kachery_cloud_client_id
         env_vars['KACHERY_CLOUD_PRIVATE_KEY'] = kachery_cloud_private_key
 
+    # input files are cached for all the jobs on this node (see InputFileCache)
+    input_cache_dir = os.getcwd() + '/input_cache'
+    os.makedirs(input_cache_dir, exist_ok=True)
+    env_vars['PROTOCAAS_INPUT_CACHE_DIR'] = input_cache_dir
+
     if not container:
+        if run_process and warm_worker_pool is not None and warm_worker_pool.has_app(app):
+            if warm_worker_pool.start_job(app=app, job_id=job_id, job_private_key=job_private_key, working_dir=working_dir, env_vars=env_vars):
+                return
+            # otherwise fall back to starting the job normally
         if run_process:
             print(f'Running: {executable_path}')
             process = subprocess.Popen(
@@ -105,9 +108,12 @@ def _start_job(*,
                 }
             )
         elif return_shell_command:
-            return f'cd {working_dir} && PYTHONUNBUFFERED=1 JOB_ID={job_id} JOB_PRIVATE_KEY={job_private_key} APP_EXECUTABLE={executable_path} {executable_path}'
+            node_id_str = f'COMPUTE_RESOURCE_NODE_ID={compute_resource_node_id} ' if compute_resource_node_id is not None else ''
+            return f'cd {working_dir} && PYTHONUNBUFFERED=1 JOB_ID={job_id} JOB_PRIVATE_KEY={job_private_key} APP_EXECUTABLE={executable_path} PROTOCAAS_INPUT_CACHE_DIR={input_cache_dir} {node_id_str}{executable_path}'
     else:
         container_method = os.environ.get('CONTAINER_METHOD', 'docker')
+        # the pre-pulled image if available (for singularity this is a SIF file)
+        image = container_image_cache.get_image_for_job(container) if container_image_cache is not None else None
         if container_method == 'docker':
             tmpdir = working_dir + '/tmp'
             os.makedirs(tmpdir, exist_ok=True)
@@ -115,11 +121,12 @@ def _start_job(*,
             cmd2 = [
                 'docker', 'run', '-it'
             ]
-            cmd2.extend(['v', f'{tmpdir}:/tmp'])
+            cmd2.extend(['-v', f'{tmpdir}:/tmp'])
+            cmd2.extend(['-v', f'{input_cache_dir}:{input_cache_dir}'])
             cmd2.extend(['--workdir', '/tmp/working']) # the working directory will be /tmp/working
             for k, v in env_vars.items():
                 cmd2.extend(['-e', f'{k}={v}'])
-            cmd2.extend([container])
+            cmd2.extend([image if image is not None else container])
             cmd2.extend([executable_path])
             if run_process:
                 print(f'Running: {" ".join(cmd2)}')
@@ -139,6 +146,7 @@ def _start_job(*,
             os.makedirs(tmpdir + '/working', exist_ok=True)
             cmd2 = ['singularity', 'exec']
             cmd2.extend(['--bind', f'{tmpdir}:/tmp'])
+            cmd2.extend(['--bind', f'{input_cache_dir}:{input_cache_dir}'])
             # The working directory should be /tmp/working so that if the container wants to write to the working directory, it will not run out of space
             cmd2.extend(['--pwd', '/tmp/working'])
             cmd2.extend(['--cleanenv']) # this is important to prevent singularity from passing environment variables to the container
@@ -146,7 +154,7 @@ def _start_job(*,
             cmd2.extend(['--nv'])
             for k, v in env_vars.items():
                 cmd2.extend(['--env', f'{k}={v}'])
-            cmd2.extend([f'docker://{container}'])
+            cmd2.extend([image if image is not None else f'docker://{container}'])
             cmd2.extend([executable_path])
             if run_process:
                 print(f'Running: {" ".join(cmd2)}')
@@ -1,11 +1,10 @@
-from typing import List, Dict
+from typing import List, Dict, Set, Union
 import os
 import yaml
 import time
-import subprocess
-from pathlib import Path
-import shutil
-import multiprocessing
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from ..common._api_request import _compute_resource_get_api_request, _compute_resource_put_api_request
 from .init_compute_resource_node import env_var_keys
 from ..sdk.App import App
@@ -13,10 +12,25 @@ from ..sdk._run_job import _set_job_status
 from .PubsubClient import PubsubClient
 from ..sdk.App import App
 from ._start_job import _start_job
-from ..common.protocaas_types import ProtocaasComputeResourceApp, ComputeResourceSlurmOpts, ProtocaasJob
+from ._claim_job import _claim_job, _renew_job_leases, job_lease_duration
+from ._get_requested_job_resources import _get_requested_job_resources
+from .LocalJobScheduler import LocalJobScheduler
+from .FairShareScheduler import FairShareScheduler
+from .SlurmJobHandler import SlurmJobHandler
+from .AwsBatchJobHandler import AwsBatchJobHandler
+from .JobDirectoryJanitor import JobDirectoryJanitor
+from .ContainerImageCache import ContainerImageCache
+from .WarmWorkerPool import WarmWorkerPool
+from ..common.protocaas_types import ProtocaasComputeResourceApp, ProtocaasJob
 
 
-max_simultaneous_local_jobs = 2
+# The maximum number of jobs that can be in the process of being started at the same time
+# Starting a job involves blocking calls (API requests, AWS Batch submission, launching processes),
+# so these are run in a thread pool, off of the event loop
+max_simultaneous_job_starts = 20
+
+# The maximum number of apps whose specs are extracted at the same time at startup
+max_simultaneous_app_loads = 8
 
 class Daemon:
     def __init__(self, *, dir: str):
@@ -28,24 +42,75 @@ class Daemon:
             raise ValueError('Compute resource has not been initialized in this directory, and the environment variable COMPUTE_RESOURCE_ID is not set.')
         if self._compute_resource_private_key is None:
             raise ValueError('Compute resource has not been initialized in this directory, and the environment variable COMPUTE_RESOURCE_PRIVATE_KEY is not set.')
+        # pre-pulls the container images of the apps that run jobs on this node (or its slurm cluster),
+        # starting with the images that the specs of the apps are extracted from (see App.from_executable)
+        container_method = os.environ.get('CONTAINER_METHOD', 'docker')
+        container_image_cache = ContainerImageCache(
+            cache_dir=os.getcwd() + '/container_image_cache',
+            container_method=container_method,
+            get_commands_of_submitted_jobs=self._get_commands_of_submitted_jobs
+        ) if container_method in ['docker', 'singularity'] else None
         self._apps: List[App] = _load_apps(
             compute_resource_id=self._compute_resource_id,
             compute_resource_private_key=self._compute_resource_private_key,
             compute_resource_node_name=self._node_name,
-            compute_resource_node_id=self._node_id
+            compute_resource_node_id=self._node_id,
+            container_image_cache=container_image_cache
         )
 
         # important to keep track of which jobs we attempted to start
         # so that we don't attempt multiple times in the case where starting failed
         self._attempted_to_start_job_ids = set()
 
+        # jobs claimed by this node that are still starting -- we need to keep renewing their leases
+        self._claimed_job_ids = set()
+        self._claimed_job_ids_lock = threading.Lock()
+
+        self._executor = ThreadPoolExecutor(max_workers=max_simultaneous_job_starts)
+
         print(f'Loaded apps: {", ".join([app._name for app in self._apps])}')
 
+        self._local_job_scheduler = LocalJobScheduler(jobs_dir=os.getcwd() + '/jobs')
+        capacity = self._local_job_scheduler.get_capacity()
+        print(f'Local capacity: {capacity.num_cpus} CPUs | {capacity.memory_gb:.1f} GB memory | {capacity.disk_gb:.1f} GB free disk')
+
+        # deletes the working directories of finished jobs, by age and when the disk is getting full
+        self._job_directory_janitor = JobDirectoryJanitor(jobs_dir=os.getcwd() + '/jobs')
+
+        # determines the order in which pending local jobs are started
+        self._fair_share_scheduler = FairShareScheduler()
+
         self._slurm_job_handlers_by_processor: Dict[str, SlurmJobHandler] = {}
         for app in self._apps:
             for processor in app._processors:
                 if app._slurm_opts is not None:
-                    self._slurm_job_handlers_by_processor[processor._name] = SlurmJobHandler(self, app._slurm_opts)
+                    self._slurm_job_handlers_by_processor[processor._name] = SlurmJobHandler(
+                        self,
+                        app._slurm_opts,
+                        state_file_path=os.getcwd() + f'/slurm_jobs_{processor._name}.json'
+                    )
+
+        # one long-lived handler for all the AWS Batch jobs (only if some app uses AWS Batch)
+        self._aws_batch_job_handler: Union[AwsBatchJobHandler, None] = None
+        if any(app._aws_batch_job_queue is not None for app in self._apps):
+            self._aws_batch_job_handler = AwsBatchJobHandler(state_file_path=os.getcwd() + '/aws_batch_jobs.json')
+
+        # the jobs that were submitted before a restart may still be queued (in the starting state), so keep renewing their leases
+        self._claimed_job_ids.update(self._get_submitted_job_ids())
+
+        # keep the container images of the apps up to date
+        self._container_image_cache: Union[ContainerImageCache, None] = None
+        containers = [app._executable_container for app in self._apps if app._executable_container and app._aws_batch_job_queue is None]
+        if len(containers) > 0 and container_image_cache is not None:
+            self._container_image_cache = container_image_cache
+            for container in containers:
+                self._container_image_cache.prepare(container)
+
+        # warm workers for the local apps (without a container) that opted in
+        self._warm_worker_pool: Union[WarmWorkerPool, None] = None
+        warm_worker_apps = [app for app in self._apps if app._warm_worker and not app._executable_container and app._aws_batch_job_queue is None and app._slurm_opts is None]
+        if len(warm_worker_apps) > 0:
+            self._warm_worker_pool = WarmWorkerPool(warm_worker_apps)
 
         spec_apps = []
         for app in self._apps:
@@ -80,15 +145,22 @@ class Daemon:
             compute_resource_id=self._compute_resource_id
         )
     def start(self):
-        timer_handle_jobs = 0
-
-        # Start cleaning up old job directories
-        # It's important to do this in a separate process
-        # because it can take a long time to delete all the files in the tmp directories (remfile is the culprit)
-        # and we don't want to block the main process from handling jobs
-        multiprocessing.Process(target=_cleanup_old_job_working_directories, args=(os.getcwd() + '/jobs',)).start()
+        # Start cleaning up job working directories (in a separate process)
+        self._job_directory_janitor.start()
 
         print('Starting compute resource')
+        asyncio.run(self._run())
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        # wake up the main loop as soon as a pubsub message arrives (the callback is called from the pubnub thread)
+        wake_event = asyncio.Event()
+        self._pubsub_client.set_on_message(lambda: loop.call_soon_threadsafe(wake_event.set))
+
+        # renew before the first request for the unfinished jobs, which releases the expired leases
+        await loop.run_in_executor(self._executor, self._renew_job_leases)
+
+        timer_handle_jobs = 0
+        timer_renew_job_leases = time.time()
         while True:
             elapsed_handle_jobs = time.time() - timer_handle_jobs
             need_to_handle_jobs = elapsed_handle_jobs > 60 * 10 # normally we will get pubsub messages for updates, but if we don't, we should check every 10 minutes
@@ -96,44 +168,83 @@ class Daemon:
             for msg in messages:
                 if msg['type'] == 'newPendingJob':
                     need_to_handle_jobs = True
-                if msg['type'] == 'jobStatusChaged':
+                if msg['type'] == 'jobStatusChanged':
                     need_to_handle_jobs = True
             if need_to_handle_jobs:
                 timer_handle_jobs = time.time()
-                self._handle_jobs()
-            
+                try:
+                    await self._handle_jobs()
+                except Exception as e:
+                    print(f'Error handling jobs: {str(e)}')
+
             for slurm_job_handler in self._slurm_job_handlers_by_processor.values():
-                slurm_job_handler.do_work()
+                await loop.run_in_executor(self._executor, slurm_job_handler.do_work)
+
+            if self._aws_batch_job_handler is not None:
+                await loop.run_in_executor(self._executor, self._aws_batch_job_handler.do_work)
 
-            time.sleep(2)
-    def _handle_jobs(self):
+            if self._container_image_cache is not None:
+                await loop.run_in_executor(self._executor, self._container_image_cache.do_work)
+
+            elapsed_renew_job_leases = time.time() - timer_renew_job_leases
+            if elapsed_renew_job_leases > job_lease_duration / 3:
+                timer_renew_job_leases = time.time()
+                await loop.run_in_executor(self._executor, self._renew_job_leases)
+
+            # wait for the next pubsub message, but wake up periodically for the slurm handlers and lease renewals
+            try:
+                await asyncio.wait_for(wake_event.wait(), timeout=2)
+            except asyncio.TimeoutError:
+                pass
+            wake_event.clear()
+    async def _handle_jobs(self):
+        loop = asyncio.get_running_loop()
         url_path = f'/api/compute_resource/compute_resources/{self._compute_resource_id}/unfinished_jobs'
-        resp = _compute_resource_get_api_request(
+        resp = await loop.run_in_executor(self._executor, lambda: _compute_resource_get_api_request(
             url_path=url_path,
             compute_resource_id=self._compute_resource_id,
             compute_resource_private_key=self._compute_resource_private_key,
             compute_resource_node_name=self._node_name,
             compute_resource_node_id=self._node_id
-        )
+        ))
         jobs = resp['jobs']
         jobs = [ProtocaasJob(**job) for job in jobs] # validation
 
-        # Local jobs
-        local_jobs = [job for job in jobs if self._is_local_job(job)]
-        num_non_pending_local_jobs = len([job for job in local_jobs if job.status != 'pending'])
-        if num_non_pending_local_jobs < max_simultaneous_local_jobs:
-            pending_local_jobs = [job for job in local_jobs if job.status == 'pending']
-            pending_local_jobs = _sort_jobs_by_timestamp_created(pending_local_jobs)
-            num_to_start = min(max_simultaneous_local_jobs - num_non_pending_local_jobs, len(pending_local_jobs))
-            local_jobs_to_start = pending_local_jobs[:num_to_start]
-            for job in local_jobs_to_start:
-                self._start_job(job)
-        
+        # jobs that this node claimed but that are not running yet (e.g., claimed before a restart)
+        with self._claimed_job_ids_lock:
+            for job in jobs:
+                if job.status == 'starting' and job.computeResourceNodeId == self._node_id:
+                    self._claimed_job_ids.add(job.jobId)
+
+        # Local jobs (only count the ones running on this node, since other nodes may share this compute resource)
+        local_jobs = [job for job in jobs if self._is_local_job(job) and (job.status == 'pending' or job.computeResourceNodeId == self._node_id)]
+        running_local_jobs = [job for job in local_jobs if job.status != 'pending']
+        pending_local_jobs = [job for job in local_jobs if job.status == 'pending' and job.jobId not in self._attempted_to_start_job_ids]
+        pending_local_jobs = self._fair_share_scheduler.order_jobs(pending_local_jobs, now=time.time())
+        local_jobs_to_start = self._local_job_scheduler.select_jobs_to_start(
+            running_jobs=running_local_jobs,
+            pending_jobs=pending_local_jobs,
+            now=time.time()
+        )
+        for job in local_jobs_to_start:
+            self._fair_share_scheduler.record_job_start(job, now=time.time())
+
+        # the working directories of the jobs on this node must not be deleted
+        with self._claimed_job_ids_lock:
+            active_job_ids = set(self._claimed_job_ids)
+        for job in jobs:
+            if job.status != 'pending' and job.computeResourceNodeId == self._node_id:
+                active_job_ids.add(job.jobId)
+        for job in local_jobs_to_start:
+            active_job_ids.add(job.jobId)
+        self._job_directory_janitor.set_active_job_ids(list(active_job_ids))
+
         # AWS Batch jobs
-        aws_batch_jobs = [job for job in jobs if self._is_aws_batch_job(job)]
-        for job in aws_batch_jobs:
-            self._start_job(job)
-        
+        aws_batch_jobs = [job for job in jobs if self._is_aws_batch_job(job) and self._job_is_pending(job)]
+
+        # start the local and AWS Batch jobs concurrently
+        await self._start_jobs(local_jobs_to_start + aws_batch_jobs)
+
         # SLURM jobs
         slurm_jobs = [job for job in jobs if self._is_slurm_job(job) and self._job_is_pending(job)]
         for job in slurm_jobs:
@@ -142,6 +253,14 @@ class Daemon:
                 raise Exception(f'Unexpected: Could not find slurm job handler for processor {processor_name}')
             self._slurm_job_handlers_by_processor[processor_name].add_job(job)
 
+    async def _start_jobs(self, jobs: List[ProtocaasJob]):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_simultaneous_job_starts)
+        async def start_job(job: ProtocaasJob):
+            async with semaphore:
+                await loop.run_in_executor(self._executor, self._start_job, job)
+        await asyncio.gather(*[start_job(job) for job in jobs])
+
     def _get_job_resource_type(self, job: ProtocaasJob) -> str:
         processor_name = job.processorName
         app: App = self._find_app_with_processor(processor_name)
@@ -163,11 +282,34 @@ class Daemon:
         return job.status == 'pending'
     def _start_job(self, job: ProtocaasJob, run_process: bool = True, return_shell_command: bool = False):
         job_id = job.jobId
-        if job_id in self._attempted_to_start_job_ids:
+        already_submitted = job_id in self._get_submitted_job_ids()
+        if job_id in self._attempted_to_start_job_ids and not already_submitted:
             return '' # see above comment about why this is necessary
         self._attempted_to_start_job_ids.add(job_id)
         job_private_key = job.jobPrivateKey
         processor_name = job.processorName
+        try:
+            claimed = _claim_job(
+                job_id=job_id,
+                compute_resource_id=self._compute_resource_id,
+                compute_resource_private_key=self._compute_resource_private_key,
+                compute_resource_node_id=self._node_id,
+                compute_resource_node_name=self._node_name
+            )
+        except Exception as e:
+            print(f'Failed to claim job {job_id}: {str(e)}')
+            self._attempted_to_start_job_ids.remove(job_id) # we can try again next time
+            return ''
+        if not claimed:
+            print(f'Job {job_id} was claimed by another node')
+            return ''
+        with self._claimed_job_ids_lock:
+            self._claimed_job_ids.add(job_id)
+        if already_submitted:
+            # its lease expired while it was queued (e.g., this node was down for a while), so it went back to pending
+            # -- we have claimed it again, but it must not be submitted a second time
+            print(f'Job {job_id} was already submitted')
+            return ''
         app = self._find_app_with_processor(processor_name)
         if app is None:
             msg = f'Could not find app with processor name {processor_name}'
@@ -182,7 +324,12 @@ class Daemon:
                 processor_name=processor_name,
                 app=app,
                 run_process=run_process,
-                return_shell_command=return_shell_command
+                return_shell_command=return_shell_command,
+                aws_batch_job_handler=self._aws_batch_job_handler,
+                resources=_get_requested_job_resources(job),
+                container_image_cache=self._container_image_cache,
+                warm_worker_pool=self._warm_worker_pool,
+                compute_resource_node_id=self._node_id
             )
         except Exception as e:
             msg = f'Failed to start job: {str(e)}'
@@ -190,6 +337,41 @@ class Daemon:
             _set_job_status(job_id=job_id, job_private_key=job_private_key, status='failed', error=msg)
             return ''
 
+    def _renew_job_leases(self):
+        with self._claimed_job_ids_lock:
+            job_ids = list(self._claimed_job_ids)
+        if len(job_ids) == 0:
+            return
+        try:
+            renewed_job_ids = _renew_job_leases(
+                job_ids=job_ids,
+                compute_resource_id=self._compute_resource_id,
+                compute_resource_private_key=self._compute_resource_private_key,
+                compute_resource_node_id=self._node_id
+            )
+        except Exception as e:
+            print(f'Failed to renew job leases: {str(e)}')
+            return
+        # jobs that are no longer starting (e.g., running, finished, or deleted) no longer need a lease
+        with self._claimed_job_ids_lock:
+            self._claimed_job_ids -= set(job_ids) - set(renewed_job_ids)
+
+    def _get_submitted_job_ids(self) -> Set[str]:
+        # the jobs that were submitted to slurm or AWS Batch and have not finished
+        ret = set()
+        for slurm_job_handler in self._slurm_job_handlers_by_processor.values():
+            ret.update(slurm_job_handler.get_submitted_job_ids())
+        if self._aws_batch_job_handler is not None:
+            ret.update(self._aws_batch_job_handler.get_submitted_job_ids())
+        return ret
+
+    def _get_commands_of_submitted_jobs(self) -> List[str]:
+        # the slurm array tasks that may not have started yet (they refer to the SIF files of their container images)
+        ret = []
+        for slurm_job_handler in self._slurm_job_handlers_by_processor.values():
+            ret.extend(slurm_job_handler.get_submitted_commands())
+        return ret
+
     def _find_app_with_processor(self, processor_name: str) -> App:
         for app in self._apps:
             for p in app._processors:
@@ -197,7 +379,13 @@ class Daemon:
                     return app
         return None
 
-def _load_apps(*, compute_resource_id: str, compute_resource_private_key: str, compute_resource_node_name: str=None, compute_resource_node_id: str=None) -> List[App]:
+def _load_apps(*,
+    compute_resource_id: str,
+    compute_resource_private_key: str,
+    compute_resource_node_name: str=None,
+    compute_resource_node_id: str=None,
+    container_image_cache: Union[ContainerImageCache, None]=None
+) -> List[App]:
     url_path = f'/api/compute_resource/compute_resources/{compute_resource_id}/apps'
     resp = _compute_resource_get_api_request(
         url_path=url_path,
@@ -208,8 +396,9 @@ def _load_apps(*, compute_resource_id: str, compute_resource_private_key: str, c
     )
     apps = resp['apps']
     apps = [ProtocaasComputeResourceApp(**app) for app in apps] # validation
-    ret = []
-    for a in apps:
+    # the specs are extracted in parallel (and cached), since each may require running a container
+    spec_cache_dir = os.getcwd() + '/app_spec_cache'
+    def load_app(a: ProtocaasComputeResourceApp) -> App:
         container = a.container
         aws_batch_opts = a.awsBatch
         slurm_opts = a.slurm
@@ -248,11 +437,17 @@ def _load_apps(*, compute_resource_id: str, compute_resource_private_key: str, c
             container=container,
             aws_batch_job_queue=aws_batch_job_queue,
             aws_batch_job_definition=aws_batch_job_definition,
-            slurm_opts=slurm_opts
+            slurm_opts=slurm_opts,
+            spec_cache_dir=spec_cache_dir,
+            # AWS Batch jobs don't run from the images of this node
+            container_image_cache=container_image_cache if aws_batch_opts is None else None
         )
-        print(f'  {len(app._processors)} processors')
-        ret.append(app)
-    return ret
+        print(f'Loaded app {a.executablePath}: {len(app._processors)} processors')
+        return app
+    if len(apps) == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_simultaneous_app_loads, len(apps))) as executor:
+        return list(executor.map(load_app, apps))
 
 def start_compute_resource_node(dir: str):
     config_fname = os.path.join(dir, '.protocaas-compute-resource-node.yaml')
@@ -279,94 +474,3 @@ def get_pubsub_subscription(*, compute_resource_id: str, compute_resource_privat
         compute_resource_node_id=compute_resource_node_id
     )
     return resp['subscription']
-
-def _sort_jobs_by_timestamp_created(jobs: List[ProtocaasJob]) -> List[dict]:
-    return sorted(jobs, key=lambda job: job.timestampCreated)
-
-def _cleanup_old_job_working_directories(dir: str):
-    """Delete working dirs that are more than 24 hours old"""
-    jobs_dir = Path(dir)
-    while True:
-        if not jobs_dir.exists():
-            continue
-        for job_dir in jobs_dir.iterdir():
-            if job_dir.is_dir():
-                elapsed = time.time() - job_dir.stat().st_mtime
-                if elapsed > 24 * 60 * 60:
-                    print(f'Removing old working dir {job_dir}')
-                    shutil.rmtree(job_dir)
-        time.sleep(60)
-
-class SlurmJobHandler:
-    def __init__(self, daemon: Daemon, slurm_opts: ComputeResourceSlurmOpts):
-        self._daemon = daemon
-        self._slurm_opts = slurm_opts
-        self._jobs: List[ProtocaasJob] = []
-        self._job_ids = set()
-        self._time_of_last_job_added = 0
-    def add_job(self, job: ProtocaasJob):
-        job_id = job.jobId
-        if job_id not in self._job_ids:
-            self._jobs.append(job)
-            self._job_ids.add(job_id)
-            self._time_of_last_job_added = time.time()
-    def do_work(self):
-        if len(self._jobs) == 0:
-            return
-        elapsed_since_last_job_added = time.time() - self._time_of_last_job_added
-        # wait a bit before starting jobs because maybe more will be added, and we want to start them all at once
-        if elapsed_since_last_job_added < 5:
-            return
-        max_jobs_in_batch = 20
-        num_jobs_to_start = min(max_jobs_in_batch, len(self._jobs))
-        if num_jobs_to_start > 0:
-            jobs_to_start = self._jobs[:num_jobs_to_start]
-            self._jobs = self._jobs[num_jobs_to_start:]
-            for job in jobs_to_start:
-                self._job_ids.remove(job.jobId)
-            self._run_slurm_batch(jobs_to_start)
-    def _run_slurm_batch(self, jobs: List[dict]):
-        if not os.path.exists('slurm_scripts'):
-            os.mkdir('slurm_scripts')
-        random_str = os.urandom(16).hex()
-        slurm_script_fname = f'slurm_scripts/slurm_batch_{random_str}.sh'
-        script_has_at_least_one_job = False # important to do this so we don't run an empty script
-        with open(slurm_script_fname, 'w') as f:
-            f.write('#!/bin/bash\n')
-            f.write('\n')
-            f.write('set -e\n')
-            f.write('\n')
-            for ii, job in enumerate(jobs):
-                cmd = self._daemon._start_job(job, run_process=False, return_shell_command=True)
-                if cmd:
-                    f.write(f'if [ "$SLURM_PROCID" == "{ii}" ]; then\n')
-                    f.write(f'    {cmd}\n')
-                    f.write('fi\n')
-                    f.write('\n')
-                    script_has_at_least_one_job = True
-            f.write('\n')
-        if script_has_at_least_one_job:
-            # run the slurm script with srun
-            slurm_cpus_per_task = self._slurm_opts.cpusPerTask
-            slurm_partition = self._slurm_opts.partition
-            slurm_time = self._slurm_opts.time
-            slurm_other_opts = self._slurm_opts.otherOpts
-            oo = []
-            if slurm_cpus_per_task is not None:
-                oo.append(f'--cpus-per-task={slurm_cpus_per_task}')
-            if slurm_partition is not None:
-                oo.append(f'--partition={slurm_partition}')
-            if slurm_time is not None:
-                oo.append(f'--time={slurm_time}')
-            if slurm_other_opts is not None:
-                for opt in slurm_other_opts.split(' '):
-                    oo.append(opt)
-            slurm_opts_str = ' '.join(oo)
-            cmd = f'srun -n {len(jobs)} {slurm_opts_str} bash {slurm_script_fname}'
-            print(f'Running slurm batch: {cmd}')
-            subprocess.Popen(
-                cmd.split(' '),
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                start_new_session=True
-            )
\ No newline at end of file
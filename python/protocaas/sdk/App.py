@@ -1,25 +1,37 @@
-from typing import List, Any, Union
+from typing import List, Any, Union, TYPE_CHECKING
 import os
 import json
 import subprocess
 import shutil
 import tempfile
+import hashlib
+import threading
 from dataclasses import dataclass
 from .InputFile import InputFile
 from .OutputFile import OutputFile
 from .AppProcessor import AppProcessor
 from .Job import Job
 from ._run_job import _run_job
+from ._run_fork_server import _run_fork_server
 from ..common.protocaas_types import ComputeResourceSlurmOpts
 from ..common.protocaas_types import ProcessorGetJobResponse
 from ..common._api_request import _processor_get_api_request
 
+if TYPE_CHECKING:
+    from ..compute_resource.ContainerImageCache import ContainerImageCache
+
 
 class App:
     """An app"""
-    def __init__(self, name, *, help: str) -> None:
+    def __init__(self, name, *, help: str, warm_worker: bool = False) -> None:
+        """
+        Set warm_worker=True to have local jobs (without a container) forked from a worker process
+        in which the app has already been imported, rather than starting a new interpreter for each job.
+        Only use this if the app is safe to fork after import (e.g., it doesn't start threads at import time).
+        """
         self._name = name
         self._help = help
+        self._warm_worker = warm_worker
         self._processors: List[AppProcessor] = []
         self._executable_path: str = None
         self._executable_container: str = None
@@ -35,6 +47,10 @@ class App:
         JOB_INTERNAL = os.environ.get('JOB_INTERNAL', None)
         APP_EXECUTABLE = os.environ.get('APP_EXECUTABLE', None)
         SPEC_OUTPUT_FILE = os.environ.get('SPEC_OUTPUT_FILE', None)
+        FORK_SERVER_SOCKET = os.environ.get('PROTOCAAS_FORK_SERVER_SOCKET', None)
+        if FORK_SERVER_SOCKET is not None:
+            # In this mode, we wait for requests from the compute resource daemon and fork a process for each job (see WarmWorkerPool)
+            return _run_fork_server(app=self, socket_path=FORK_SERVER_SOCKET)
         if SPEC_OUTPUT_FILE is not None:
             if JOB_ID is not None:
                 raise Exception('Cannot set both JOB_ID and SPEC_OUTPUT_FILE')
@@ -69,12 +85,15 @@ class App:
             'help': self._help,
             'processors': processors
         }
+        if self._warm_worker:
+            spec['warmWorker'] = True
         return spec
     @staticmethod
     def from_spec(spec):
         app = App(
             name=spec['name'],
-            help=spec['help']
+            help=spec['help'],
+            warm_worker=spec.get('warmWorker', False)
         )
         for processor_spec in spec['processors']:
             processor = AppProcessor.from_spec(processor_spec)
@@ -86,50 +105,38 @@ class App:
         container: str=None,
         aws_batch_job_queue: str=None,
         aws_batch_job_definition: str=None,
-        slurm_opts: ComputeResourceSlurmOpts=None
+        slurm_opts: ComputeResourceSlurmOpts=None,
+        spec_cache_dir: Union[str, None]=None,
+        container_image_cache: Union['ContainerImageCache', None]=None
     ):
-        with TemporaryDirectory() as tmpdir:
-            spec_fname = os.path.join(tmpdir, 'spec.json')
-            if not container:
-                # run executable with SPEC_OUTPUT_FILE set to spec_fname
-                env = os.environ.copy()
-                env['SPEC_OUTPUT_FILE'] = spec_fname
-                subprocess.run([executable_path], env=env)
-            else:
-                container_method = os.environ.get('CONTAINER_METHOD', 'docker')
-                if container_method == 'docker':
-                    # run executable in container
-                    cmd = ['docker', 'run', '-it', '-v', f'{tmpdir}:{tmpdir}', '-e', f'SPEC_OUTPUT_FILE={spec_fname}', container, executable_path]
-                    print(f'Running: {" ".join(cmd)}')
-                    subprocess.run(cmd)
-                elif container_method == 'singularity':
-                    # run executable in container
-                    cmd = [
-                        'singularity',
-                        'exec',
-                        '--cleanenv', # this is important to prevent singularity from passing environment variables to the container
-                        '--contain', # we don't want singularity to mount the home or tmp directories of the host
-                        '--env', f'SPEC_OUTPUT_FILE={spec_fname}',
-                        '--bind', f'{tmpdir}:{tmpdir}',
-                        '--nv',
-                        f'docker://{container}',
-                        executable_path
-                    ]
-                    print(f'Running: {" ".join(cmd)}')
-                    subprocess.run(
-                        cmd
-                    )
-                else:
-                    raise Exception(f'Unknown container method: {container_method}')
-            with open(spec_fname, 'r') as f:
-                spec = json.load(f)
-            a = App.from_spec(spec)
-            setattr(a, '_executable_path', executable_path)
-            setattr(a, "_executable_container", container)
-            setattr(a, "_aws_batch_job_queue", aws_batch_job_queue)
-            setattr(a, "_aws_batch_job_definition", aws_batch_job_definition)
-            setattr(a, "_slurm_opts", slurm_opts)
-            return a
+        # Getting the spec requires running the executable (possibly in a container), which can be slow,
+        # so the spec of an app that runs in a container is cached, keyed by the executable and the container image digest
+        image_digest = None
+        image = None
+        if container and container_image_cache is not None:
+            # the image is pulled now (for singularity, into a SIF file) and is also the one that the jobs will use
+            try:
+                image_digest, image = container_image_cache.get_image_for_spec(container)
+            except Exception as e:
+                print(f'Warning: unable to prepare container image {container}: {str(e)}')
+        cache_key = _get_spec_cache_key(executable_path, container, image_digest=image_digest) if spec_cache_dir is not None else None
+        spec = _read_spec_cache(spec_cache_dir, cache_key) if cache_key is not None else None
+        if spec is None:
+            spec = _get_spec_from_executable(executable_path, container, image=image)
+            if spec_cache_dir is not None:
+                # the image may have just been pulled, in which case the digest is now known
+                cache_key = _get_spec_cache_key(executable_path, container, image_digest=image_digest)
+                if cache_key is not None:
+                    _write_spec_cache(spec_cache_dir, cache_key, spec)
+        else:
+            print(f'Using cached spec for {executable_path}')
+        a = App.from_spec(spec)
+        setattr(a, '_executable_path', executable_path)
+        setattr(a, "_executable_container", container)
+        setattr(a, "_aws_batch_job_queue", aws_batch_job_queue)
+        setattr(a, "_aws_batch_job_definition", aws_batch_job_definition)
+        setattr(a, "_slurm_opts", slurm_opts)
+        return a
     def _run_job(self, *, job_id: str, job_private_key: str):
         job: Job = _get_job(job_id=job_id, job_private_key=job_private_key)
         processor_name = job.processor_name
@@ -178,6 +185,101 @@ class App:
             if not output_file._was_set:
                 raise Exception(f'Output was not set: {output.name}')
 
+def _get_spec_from_executable(executable_path: str, container: Union[str, None], *, image: Union[str, None]=None):
+    # image is the image argument to run instead of the container (e.g., a SIF file prepared by ContainerImageCache)
+    with TemporaryDirectory() as tmpdir:
+        spec_fname = os.path.join(tmpdir, 'spec.json')
+        if not container:
+            # run executable with SPEC_OUTPUT_FILE set to spec_fname
+            env = os.environ.copy()
+            env['SPEC_OUTPUT_FILE'] = spec_fname
+            subprocess.run([executable_path], env=env)
+        else:
+            container_method = os.environ.get('CONTAINER_METHOD', 'docker')
+            if container_method == 'docker':
+                # run executable in container (not interactively, since several apps may be loaded at the same time)
+                cmd = ['docker', 'run', '--rm', '-v', f'{tmpdir}:{tmpdir}', '-e', f'SPEC_OUTPUT_FILE={spec_fname}', image if image is not None else container, executable_path]
+                print(f'Running: {" ".join(cmd)}')
+                subprocess.run(cmd)
+            elif container_method == 'singularity':
+                # run executable in container
+                cmd = [
+                    'singularity',
+                    'exec',
+                    '--cleanenv', # this is important to prevent singularity from passing environment variables to the container
+                    '--contain', # we don't want singularity to mount the home or tmp directories of the host
+                    '--env', f'SPEC_OUTPUT_FILE={spec_fname}',
+                    '--bind', f'{tmpdir}:{tmpdir}',
+                    '--nv',
+                    image if image is not None else f'docker://{container}',
+                    executable_path
+                ]
+                print(f'Running: {" ".join(cmd)}')
+                subprocess.run(
+                    cmd
+                )
+            else:
+                raise Exception(f'Unknown container method: {container_method}')
+        with open(spec_fname, 'r') as f:
+            spec = json.load(f)
+    return spec
+
+def _get_spec_cache_key(executable_path: str, container: Union[str, None], *, image_digest: Union[str, None]=None) -> Union[str, None]:
+    """Returns None if the spec should not be cached
+
+    image_digest is the digest of the image that was resolved by the container image cache, if any.
+    """
+    if not container:
+        # The spec of a local executable depends on the modules and packages it imports, which may change
+        # without the executable changing, so it is not cached (running a local executable is cheap anyway)
+        return None
+    digest = image_digest if image_digest is not None else _get_container_image_digest(container)
+    if digest is None:
+        return None
+    return json.dumps(['container', executable_path, container, digest])
+
+def _get_container_image_digest(container: str) -> Union[str, None]:
+    """Get the digest of the image that will be used to run the container, or None if it can't be determined"""
+    if '@sha256:' in container:
+        return container.split('@')[-1]
+    container_method = os.environ.get('CONTAINER_METHOD', 'docker')
+    if container_method == 'docker':
+        # the ID of the local image is what docker run will use (if the image is not present locally, it will be pulled)
+        try:
+            result = subprocess.run(['docker', 'image', 'inspect', '--format', '{{.Id}}', container], capture_output=True, text=True)
+        except OSError:
+            return None
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip()
+    # singularity pulls docker://<container> from the registry, so the digest of a tag can't be determined locally
+    return None
+
+def _read_spec_cache(spec_cache_dir: str, cache_key: str) -> Union[dict, None]:
+    fname = os.path.join(spec_cache_dir, _get_spec_cache_file_name(cache_key))
+    if not os.path.exists(fname):
+        return None
+    try:
+        with open(fname, 'r') as f:
+            x = json.load(f)
+        if x['key'] != cache_key:
+            return None
+        return x['spec']
+    except Exception as e:
+        print(f'Warning: unable to read cached spec {fname}: {str(e)}')
+        return None
+
+def _write_spec_cache(spec_cache_dir: str, cache_key: str, spec: dict):
+    os.makedirs(spec_cache_dir, exist_ok=True)
+    fname = os.path.join(spec_cache_dir, _get_spec_cache_file_name(cache_key))
+    tmp_fname = f'{fname}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_fname, 'w') as f:
+        json.dump({'key': cache_key, 'spec': spec}, f)
+    os.replace(tmp_fname, fname)
+
+def _get_spec_cache_file_name(cache_key: str) -> str:
+    return hashlib.sha1(cache_key.encode('utf-8')).hexdigest() + '.json'
+
 class TemporaryDirectory:
     """A context manager for temporary directories"""
     def __init__(self):
@@ -1,4 +1,4 @@
-from typing import Any, List, Union
+from typing import Any, List, Dict, Union
 from dataclasses import dataclass
 
 
@@ -110,6 +110,48 @@ class AppProcessorTag:
             tag=spec['tag']
         )
 
+# resource names in the spec, keyed by the name used in the @resources decorator
+_RESOURCE_SPEC_NAMES = {
+    'num_cpus': 'numCpus',
+    'memory_gb': 'memoryGb',
+    'disk_gb': 'diskGb',
+    'time_min': 'timeMin'
+}
+
+@dataclass
+class AppProcessorResources:
+    """The resources required by a processor in an app"""
+    num_cpus: Union[float, None] = None
+    memory_gb: Union[float, None] = None
+    disk_gb: Union[float, None] = None
+    time_min: Union[float, None] = None
+    parameter_overrides: Union[Dict[str, str], None] = None # resource -> parameter name
+    def get_spec(self):
+        ret = {}
+        for k, k2 in _RESOURCE_SPEC_NAMES.items():
+            v = getattr(self, k)
+            if v is not None:
+                ret[k2] = v
+        if self.parameter_overrides:
+            ret['parameterOverrides'] = [
+                {
+                    'resource': _RESOURCE_SPEC_NAMES[k],
+                    'parameter': v
+                }
+                for k, v in self.parameter_overrides.items()
+            ]
+        return ret
+    @staticmethod
+    def from_spec(spec):
+        resource_names = {v: k for k, v in _RESOURCE_SPEC_NAMES.items()}
+        return AppProcessorResources(
+            num_cpus=spec.get('numCpus', None),
+            memory_gb=spec.get('memoryGb', None),
+            disk_gb=spec.get('diskGb', None),
+            time_min=spec.get('timeMin', None),
+            parameter_overrides={resource_names[o['resource']]: o['parameter'] for o in spec.get('parameterOverrides', [])}
+        )
+
 class AppProcessor:
     """A processor in an app"""
     def __init__(self, *,
@@ -120,6 +162,7 @@ class AppProcessor:
         parameters: List[AppProcessorParameter],
         attributes: List[AppProcessorAttribute],
         tags: List[AppProcessorTag],
+        resources: Union[AppProcessorResources, None] = None,
         func=None
     ) -> None:
         self._name = name
@@ -129,9 +172,10 @@ class AppProcessor:
         self._parameters = parameters
         self._attributes = attributes
         self._tags = tags
+        self._resources = resources
         self._processor_func = func
     def get_spec(self):
-        return {
+        ret = {
             'name': self._name,
             'help': self._help,
             'inputs': [i.get_spec() for i in self._inputs],
@@ -140,6 +184,9 @@ class AppProcessor:
             'attributes': [a.get_spec() for a in self._attributes],
             'tags': [t.get_spec() for t in self._tags]
         }
+        if self._resources is not None:
+            ret['resources'] = self._resources.get_spec()
+        return ret
     @staticmethod
     def from_spec(spec):
         inputs = [AppProcessorInput.from_spec(i) for i in spec['inputs']]
@@ -147,6 +194,7 @@ class AppProcessor:
         parameters = [AppProcessorParameter.from_spec(p) for p in spec['parameters']]
         attributes = [AppProcessorAttribute.from_spec(a) for a in spec['attributes']]
         tags = [AppProcessorTag.from_spec(t) for t in spec['tags']]
+        resources = AppProcessorResources.from_spec(spec['resources']) if spec.get('resources', None) is not None else None
         return AppProcessor(
             name=spec['name'],
             help=spec['help'],
@@ -154,7 +202,8 @@ class AppProcessor:
             outputs=outputs,
             parameters=parameters,
             attributes=attributes,
-            tags=tags
+            tags=tags,
+            resources=resources
         )
     @staticmethod
     def from_func(processor_func):
@@ -168,11 +217,17 @@ class AppProcessor:
         parameters = getattr(processor_func, 'protocaas_parameters', [])
         attributes = getattr(processor_func, 'protocaas_attributes', [])
         tags = getattr(processor_func, 'protocaas_tags', [])
+        resources = getattr(processor_func, 'protocaas_resources', None)
         _inputs = [AppProcessorInput(name=i['name'], help=i['help'], list=i['list']) for i in inputs]
         _outputs = [AppProcessorOutput(name=o['name'], help=o['help']) for o in outputs]
         _parameters = [AppProcessorParameter(name=p['name'], help=p['help'], type=p['type'], default=p['default'], options=p.get('options', None), secret=p.get('secret', False)) for p in parameters]
         _attributes = [AppProcessorAttribute(name=a['name'], value=a['value']) for a in attributes]
         _tags = [AppProcessorTag(tag=t) for t in tags]
+        _resources = AppProcessorResources(**resources) if resources is not None else None
+        if _resources is not None:
+            for p in (_resources.parameter_overrides or {}).values():
+                if p not in [pp.name for pp in _parameters]:
+                    raise Exception(f'Resource override parameter not found in processor {name}: {p}')
         return AppProcessor(
             name=name,
             help=help,
@@ -181,6 +236,7 @@ class AppProcessor:
             parameters=_parameters,
             attributes=_attributes,
             tags=_tags,
+            resources=_resources,
             func=processor_func
         )
 
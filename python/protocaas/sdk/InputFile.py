@@ -1,5 +1,7 @@
-import requests
 from typing import TYPE_CHECKING
+from .InputFileCache import InputFileCache
+from ._download_file import _download_file
+from .RemoteInputFile import RemoteInputFile
 if TYPE_CHECKING:
     from .Job import Job
 
@@ -9,14 +11,28 @@ class InputFile:
         self._job = job
     def get_url(self) -> str:
         return self._job._get_download_url_for_input_file(name=self._name)
-    def download(self, dest_file_path: str):
+    def open(self) -> RemoteInputFile:
+        """Open the remote file for reading, without downloading it
+
+        Returns a seekable file-like object (e.g., it can be passed to h5py.File) that reads the data as needed.
+        """
+        cache = InputFileCache.from_env()
+        return RemoteInputFile(
+            get_url=lambda refresh: self._job._get_download_url_for_input_file(name=self._name, refresh=refresh),
+            block_cache=cache
+        )
+    def download(self, dest_file_path: str, *, verify: bool = False):
+        """Download the file, using concurrent ranged requests when possible
+
+        If verify is True, the downloaded file is checked against the MD5 ETag of the object (when available).
+        """
         url = self.get_url()
+        # when running on a compute resource node, the file is downloaded only once for all the jobs on the node
+        cache = InputFileCache.from_env()
+        if cache is not None:
+            cache.get(url=url, dest_file_path=dest_file_path, download=lambda path: self._download(url, path, verify=verify))
+        else:
+            self._download(url, dest_file_path, verify=verify)
+    def _download(self, url: str, dest_file_path: str, *, verify: bool):
         print(f'Downloading {url} to {dest_file_path}')
-        # stream the download
-        r = requests.get(url, stream=True)
-        if r.status_code != 200:
-            raise Exception(f'Problem downloading {url}')
-        with open(dest_file_path, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=1024):
-                if chunk:
-                    f.write(chunk)
\ No newline at end of file
+        _download_file(url, dest_file_path, verify=verify)
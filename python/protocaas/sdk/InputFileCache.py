@@ -0,0 +1,193 @@
+from typing import Callable, Union
+import os
+import re
+import time
+import fcntl
+import errno
+import shutil
+import hashlib
+from contextlib import contextmanager
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+
+# The cache is bounded by this size, or this fraction of the disk, whichever is smaller
+max_input_cache_size_gb = 100
+max_input_cache_disk_fraction = 0.25
+
+# The blocks of one remote file that is read without being downloaded may use at most this fraction of the cache
+# (further blocks are only kept in memory)
+max_block_dir_cache_fraction = 0.5
+
+# Query parameters of presigned URLs (S3, CloudFront, Google Cloud Storage, Azure SAS), which don't identify the file
+# (compared case-insensitively, and X-Amz-* and X-Goog-* parameters are matched by prefix)
+presigning_query_parameters = [
+    'awsaccesskeyid', 'signature', 'expires', 'policy', 'key-pair-id', 'googleaccessid',
+    'sv', 'ss', 'srt', 'sp', 'se', 'st', 'spr', 'sig', 'sr', 'si', 'sdd', 'skoid', 'sktid', 'skt', 'ske', 'sks', 'skv'
+]
+presigning_query_parameter_prefixes = ['x-amz-', 'x-goog-']
+
+# ioctl for making a copy-on-write clone of a file (Linux, e.g., btrfs and xfs)
+_FICLONE = 0x40049409
+
+class InputFileCache:
+    """A cache of input files that is shared by the jobs on a compute resource node
+
+    Files are keyed by the identity of the remote file (e.g., the DANDI asset ID, or the URL without the signature),
+    so that each file is downloaded only once even if many jobs use it. Files are materialized in the
+    job directories by reflink (copy-on-write) if possible, otherwise by hard link, otherwise by copying.
+    Since hard links share the data with the cache, the cached files are read-only.
+    The least recently used files are evicted when the cache exceeds its size limit.
+    """
+    def __init__(self, cache_dir: str) -> None:
+        self._cache_dir = cache_dir
+        self._objects_dir = os.path.join(cache_dir, 'objects')
+        self._blocks_dir = os.path.join(cache_dir, 'blocks')
+        os.makedirs(self._objects_dir, exist_ok=True)
+    @staticmethod
+    def from_env() -> Union['InputFileCache', None]:
+        """The compute resource daemon sets PROTOCAAS_INPUT_CACHE_DIR for the jobs that it starts"""
+        cache_dir = os.environ.get('PROTOCAAS_INPUT_CACHE_DIR', None)
+        if not cache_dir:
+            return None
+        return InputFileCache(cache_dir)
+    def get_block_cache_dir(self) -> str:
+        """The directory for the blocks of remote files that are read without being downloaded (see RemoteInputFile)"""
+        os.makedirs(self._blocks_dir, exist_ok=True)
+        self._evict_if_needed()
+        return self._blocks_dir
+    def get_max_block_dir_size(self) -> float:
+        """The maximum size in bytes of the blocks of one remote file (see RemoteInputFile)"""
+        return max_block_dir_cache_fraction * self._get_max_size()
+    def get(self, *, url: str, dest_file_path: str, download: Callable[[str], None]):
+        """Materialize the file at dest_file_path, calling download(path) to download it into the cache if needed"""
+        key = get_input_file_cache_key(url)
+        h = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        path = os.path.join(self._objects_dir, h)
+        with self._locked(h, exclusive=False):
+            if os.path.exists(path):
+                print(f'Using cached input file for {key}')
+                _touch(path)
+                _materialize(path, dest_file_path)
+                return
+        with self._locked(h, exclusive=True):
+            # another job may have downloaded it while we were waiting for the lock
+            if not os.path.exists(path):
+                # we hold the exclusive lock, so the temporary path can be fixed, which lets an interrupted download be resumed
+                tmp_path = f'{path}.download'
+                download(tmp_path)
+                os.chmod(tmp_path, 0o444)
+                os.replace(tmp_path, path)
+            _touch(path)
+            _materialize(path, dest_file_path)
+        self._evict_if_needed()
+    def _get_max_size(self) -> float:
+        usage = shutil.disk_usage(self._objects_dir)
+        return min(max_input_cache_size_gb * 1e9, max_input_cache_disk_fraction * usage.total)
+    def _evict_if_needed(self):
+        max_size = self._get_max_size()
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self._objects_dir):
+            if not re.match(r'^[0-9a-f]{64}$', entry.name):
+                continue # lock files and downloads in progress
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, entry.name, st.st_size))
+            total_size += st.st_size
+        block_dir_entries = []
+        if os.path.exists(self._blocks_dir):
+            for entry in os.scandir(self._blocks_dir):
+                if entry.is_dir():
+                    size = sum([_get_size_if_exists(e) for e in os.scandir(entry.path)])
+                    block_dir_entries.append((entry.stat().st_mtime, entry.name, size))
+                    total_size += size
+        if total_size <= max_size:
+            return
+        # least recently used first (downloaded files and block directories share the same budget)
+        for _, h, size in sorted(entries + [(t, f'blocks/{name}', size) for t, name, size in block_dir_entries]):
+            if total_size <= max_size:
+                break
+            if h.startswith('blocks/'):
+                # readers of remote files refetch blocks that are missing, so no lock is needed
+                print(f'Evicting remote file blocks {h} from cache ({size / 1e9:.2f} GB)')
+                shutil.rmtree(os.path.join(self._cache_dir, h), ignore_errors=True)
+                total_size -= size
+                continue
+            try:
+                with self._locked(h, exclusive=True, blocking=False):
+                    print(f'Evicting input file {h} from cache ({size / 1e9:.2f} GB)')
+                    os.remove(os.path.join(self._objects_dir, h))
+                    total_size -= size
+            except BlockingIOError:
+                continue # in use
+            except FileNotFoundError:
+                continue
+    @contextmanager
+    def _locked(self, h: str, *, exclusive: bool, blocking: bool = True):
+        lock_path = os.path.join(self._objects_dir, f'{h}.lock')
+        with open(lock_path, 'a') as f:
+            flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+            if not blocking:
+                flags |= fcntl.LOCK_NB
+            fcntl.flock(f.fileno(), flags)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _get_size_if_exists(entry: os.DirEntry) -> int:
+    try:
+        return entry.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+def get_input_file_cache_key(url: str) -> str:
+    """The identity of a remote file, which does not depend on the signature of the URL"""
+    p = urlparse(url)
+    m = re.search(r'/assets/([0-9a-f-]{36})/', p.path)
+    if m is not None and 'dandiarchive' in p.netloc:
+        return f'dandi-asset:{m.group(1)}'
+    # presigned URLs of the same file differ only in their signing parameters, but other query parameters
+    # (e.g., ?versionId=..., or the file ID of an API download endpoint) identify the file
+    query = sorted(
+        (k, v) for k, v in parse_qsl(p.query, keep_blank_values=True)
+        if not _is_presigning_query_parameter(k)
+    )
+    if len(query) == 0:
+        return f'{p.netloc}{p.path}'
+    return f'{p.netloc}{p.path}?{urlencode(query)}'
+
+def _is_presigning_query_parameter(name: str) -> bool:
+    name = name.lower()
+    return name in presigning_query_parameters or any(name.startswith(prefix) for prefix in presigning_query_parameter_prefixes)
+
+def _materialize(path: str, dest_file_path: str):
+    if os.path.exists(dest_file_path):
+        os.remove(dest_file_path)
+    try:
+        _reflink(path, dest_file_path)
+        return
+    except OSError:
+        if os.path.exists(dest_file_path):
+            os.remove(dest_file_path)
+    try:
+        os.link(path, dest_file_path)
+        return
+    except OSError as e:
+        if e.errno not in [errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP]:
+            raise
+    shutil.copyfile(path, dest_file_path)
+
+def _reflink(src: str, dst: str):
+    with open(src, 'rb') as f_src:
+        with open(dst, 'wb') as f_dst:
+            fcntl.ioctl(f_dst.fileno(), _FICLONE, f_src.fileno())
+
+def _touch(path: str):
+    # the modification time is used for LRU eviction (access times are often not recorded)
+    try:
+        os.utime(path, (time.time(), time.time()))
+    except PermissionError:
+        pass
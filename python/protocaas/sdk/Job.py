@@ -79,19 +79,19 @@ class Job:
         )
         upload_url = resp['uploadUrl'] # This will be a presigned AWS S3 URL
         return upload_url
-    def _get_download_url_for_input_file(self, *, name: str) -> str:
-        """Get a signed download URL for an input file"""
-        self._api_request_job_if_needed()
+    def _get_download_url_for_input_file(self, *, name: str, refresh: bool = False) -> str:
+        """Get a signed download URL for an input file (set refresh=True if the previous URL has expired)"""
+        self._api_request_job_if_needed(force=refresh)
         resp_inputs = self._api_request_job_response.inputs
         resp_input = next((i for i in resp_inputs if i.name == name), None)
         if resp_input is None:
             raise Exception(f'Input not found when trying to get download URL: {name}')
         download_url = resp_input.url
         return download_url
-    def _api_request_job_if_needed(self):
+    def _api_request_job_if_needed(self, force: bool = False):
         """Get the job info from the protocaas API"""
         elapsed = time.time() - self._api_request_job_timestamp
-        if elapsed < 30 * 60:
+        if elapsed < 30 * 60 and not force:
             # typically, signed download URLs will expire after an hour
             return
         url_path = f'/api/processor/jobs/{self._job_id}'
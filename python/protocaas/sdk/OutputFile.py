@@ -1,23 +1,110 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Union
+import os
+import tempfile
 import requests
 
 if TYPE_CHECKING:
     from .Job import Job
 
 
+# Size of the pieces that are read from a stream and sent
+upload_block_size = 1024 * 1024
+
+# Streams of unknown size are buffered in memory up to this size before spilling to a temporary file
+max_in_memory_stream_buffer_size = 64 * 1024 * 1024
+
 class OutputFile:
     def __init__(self, *, name: str, job: 'Job') -> None:
         self._name = name
         self._job = job
         self._was_set = False
     def set(self, local_file_path: str):
-        upload_url = self._job._get_upload_url_for_output_file(name=self._name)
-
         # Upload the file to the URL
         with open(local_file_path, 'rb') as f:
-            resp_upload = requests.put(upload_url, data=f)
-            if resp_upload.status_code != 200:
-                print(upload_url)
-                raise Exception(f'Error uploading file to bucket ({resp_upload.status_code}) {resp_upload.reason}: {resp_upload.text}')
-        
-        self._was_set = True
\ No newline at end of file
+            self._upload(f)
+    def set_bytes(self, data: Any):
+        """Set the output from bytes or any object supporting the buffer protocol (e.g., a numpy array)
+
+        Contiguous buffers are sent without being copied.
+        """
+        if isinstance(data, str):
+            raise Exception('OutputFile.set_bytes requires a bytes-like object, not str')
+        mv = memoryview(data)
+        if mv.c_contiguous:
+            mv = mv.cast('B')
+        else:
+            # same byte order as numpy's tobytes()
+            mv = memoryview(mv.tobytes())
+        self._upload(mv)
+    def set_stream(self, stream: Union[Iterable[bytes], Any], *, size: Union[int, None] = None):
+        """Set the output from a readable file-like object or an iterable of bytes chunks
+
+        The data is streamed to the bucket in chunks. Presigned upload URLs require the size to be known in advance,
+        so if it is not given (and cannot be determined from the file), the stream is first buffered in memory,
+        spilling to a temporary file when it is large.
+        """
+        if size is None:
+            size = _get_remaining_size_of_file(stream)
+        if size is not None:
+            self._upload(_SizedStream(_iterate_chunks(stream), size=size))
+            return
+        with tempfile.SpooledTemporaryFile(max_size=max_in_memory_stream_buffer_size) as f:
+            size = 0
+            for chunk in _iterate_chunks(stream):
+                f.write(chunk)
+                size += len(chunk)
+            f.seek(0)
+            self._upload(_SizedStream(_iterate_chunks(f), size=size))
+    def _upload(self, data):
+        upload_url = self._job._get_upload_url_for_output_file(name=self._name)
+        resp_upload = requests.put(upload_url, data=data)
+        if resp_upload.status_code != 200:
+            print(upload_url)
+            raise Exception(f'Error uploading file to bucket ({resp_upload.status_code}) {resp_upload.reason}: {resp_upload.text}')
+        self._was_set = True
+
+class _SizedStream:
+    """An iterable of chunks with a known total size, so it is sent with a Content-Length header"""
+    def __init__(self, chunks: Iterator[bytes], *, size: int) -> None:
+        self._chunks = chunks
+        self._size = size
+    def __len__(self) -> int:
+        return self._size
+    def __iter__(self):
+        num_bytes_sent = 0
+        for chunk in self._chunks:
+            num_bytes_sent += len(chunk)
+            if num_bytes_sent > self._size:
+                raise Exception(f'Stream is larger than the declared size ({self._size} bytes)')
+            yield chunk
+        if num_bytes_sent != self._size:
+            raise Exception(f'Stream is smaller than the declared size ({num_bytes_sent} != {self._size} bytes)')
+
+def _iterate_chunks(stream: Union[Iterable[bytes], Any]) -> Iterator[bytes]:
+    if hasattr(stream, 'read'):
+        while True:
+            chunk = stream.read(upload_block_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        for chunk in stream:
+            if chunk:
+                yield chunk
+
+def _get_remaining_size_of_file(stream: Any) -> Union[int, None]:
+    if not hasattr(stream, 'read'):
+        return None
+    try:
+        return os.fstat(stream.fileno()).st_size - stream.tell()
+    except Exception:
+        pass
+    try:
+        if stream.seekable():
+            pos = stream.tell()
+            end = stream.seek(0, os.SEEK_END)
+            stream.seek(pos)
+            return end - pos
+    except Exception:
+        pass
+    return None
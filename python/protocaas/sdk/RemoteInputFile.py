@@ -0,0 +1,220 @@
+from typing import TYPE_CHECKING, Callable, Dict, List, Union
+import os
+import io
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import requests
+from .InputFileCache import get_input_file_cache_key
+if TYPE_CHECKING:
+    from .InputFileCache import InputFileCache
+
+
+# Remote data is read and cached in aligned blocks of this size
+block_size = 1024 * 1024
+
+# When reading sequentially, the amount read ahead doubles on each read, up to this many blocks
+max_read_ahead_blocks = 16
+
+# Blocks kept in memory (in addition to the on-disk cache)
+max_memory_cache_blocks = 64
+
+# While blocks are written to the on-disk cache, the cache is trimmed to its size limit after every this many bytes
+block_cache_eviction_interval_bytes = 256 * 1024 * 1024
+
+class RemoteInputFile(io.RawIOBase):
+    """A read-only, seekable file-like object for a remote file, backed by HTTP Range requests
+
+    Blocks are cached in memory and, when running on a compute resource node, in an on-disk block cache
+    that is shared by the jobs on the node (keyed by the identity of the remote file, not by the signed URL).
+    When the signed URL expires, a new one is obtained with get_url(refresh=True).
+    """
+    def __init__(self, *, get_url: Callable[[bool], str], block_cache: Union['InputFileCache', None] = None) -> None:
+        super().__init__()
+        self._get_url = get_url
+        self._lock = threading.Lock()
+        self._url = get_url(False)
+        self._resolved_url, self._size = self._probe(self._url)
+        self._position = 0
+        self._memory_cache: 'OrderedDict[int, bytes]' = OrderedDict()
+        self._read_ahead_blocks = 1
+        self._last_read_end = None
+        self._block_cache = block_cache
+        self._block_dir = None
+        self._block_dir_size = 0
+        self._max_block_dir_size = 0
+        self._bytes_written_since_eviction = 0
+        if block_cache is not None:
+            key = get_input_file_cache_key(self._url)
+            h = hashlib.sha256(f'{key}:{self._size}'.encode('utf-8')).hexdigest()
+            self._block_dir = os.path.join(block_cache.get_block_cache_dir(), h)
+            os.makedirs(self._block_dir, exist_ok=True)
+            # the modification time of the directory is used for LRU eviction (see InputFileCache)
+            os.utime(self._block_dir, (time.time(), time.time()))
+            self._block_dir_size = _get_dir_size(self._block_dir)
+            self._max_block_dir_size = block_cache.get_max_block_dir_size()
+    @property
+    def size(self) -> int:
+        return self._size
+    def readable(self) -> bool:
+        return True
+    def seekable(self) -> bool:
+        return True
+    def tell(self) -> int:
+        return self._position
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f'Invalid whence: {whence}')
+        if position < 0:
+            raise ValueError(f'Negative seek position: {position}')
+        self._position = position
+        return position
+    def read(self, size: int = -1) -> bytes:
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+        if size is None or size < 0:
+            size = self._size - self._position
+        start = self._position
+        end = min(start + size, self._size)
+        if end <= start:
+            return b''
+        with self._lock:
+            # read ahead when reading sequentially
+            if self._last_read_end == start:
+                self._read_ahead_blocks = min(self._read_ahead_blocks * 2, max_read_ahead_blocks)
+            else:
+                self._read_ahead_blocks = 1
+            self._last_read_end = end
+            read_ahead_blocks = self._read_ahead_blocks - 1
+        first_block = start // block_size
+        last_block = (end - 1) // block_size
+        blocks = self._get_blocks(first_block, last_block, read_ahead_blocks=read_ahead_blocks)
+        data = b''.join([blocks[i] for i in range(first_block, last_block + 1)])
+        offset = start - first_block * block_size
+        ret = data[offset:offset + (end - start)]
+        self._position = end
+        return ret
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+    def _get_blocks(self, first_block: int, last_block: int, *, read_ahead_blocks: int) -> Dict[int, bytes]:
+        ret: Dict[int, bytes] = {}
+        missing: List[int] = []
+        with self._lock:
+            for i in range(first_block, last_block + 1):
+                data = self._get_cached_block(i)
+                if data is not None:
+                    ret[i] = data
+                else:
+                    missing.append(i)
+            if len(missing) == 0:
+                return ret
+            num_blocks = (self._size + block_size - 1) // block_size
+            # one request for the range of missing blocks, extended by the read-ahead
+            fetch_first = missing[0]
+            fetch_last = min(missing[-1] + read_ahead_blocks, num_blocks - 1)
+            while fetch_last > missing[-1] and self._get_cached_block(fetch_last, memory_only=True) is not None:
+                fetch_last -= 1
+        # the lock is not held during the request, so that other threads can read the cached blocks in the meantime
+        data = self._fetch_range(fetch_first * block_size, min((fetch_last + 1) * block_size, self._size))
+        with self._lock:
+            for i in range(fetch_first, fetch_last + 1):
+                block = data[(i - fetch_first) * block_size:(i - fetch_first + 1) * block_size]
+                self._put_cached_block(i, block)
+                if first_block <= i <= last_block:
+                    ret[i] = block
+        return ret
+    def _get_cached_block(self, i: int, memory_only: bool = False) -> Union[bytes, None]:
+        if i in self._memory_cache:
+            self._memory_cache.move_to_end(i)
+            return self._memory_cache[i]
+        if memory_only or self._block_dir is None:
+            return None
+        try:
+            with open(os.path.join(self._block_dir, str(i)), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        self._put_memory_cached_block(i, data)
+        return data
+    def _put_cached_block(self, i: int, data: bytes):
+        self._put_memory_cached_block(i, data)
+        if self._block_dir is None:
+            return
+        if not os.path.exists(self._block_dir):
+            # the directory was evicted in the meantime
+            self._block_dir_size = 0
+        if self._block_dir_size + len(data) > self._max_block_dir_size:
+            return # the blocks of this file already use their share of the cache, so the block is only kept in memory
+        try:
+            os.makedirs(self._block_dir, exist_ok=True)
+            fname = os.path.join(self._block_dir, str(i))
+            tmp_fname = f'{fname}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_fname, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_fname, fname) # atomic, so other jobs never see a partial block
+        except OSError as e:
+            print(f'Warning: unable to write to block cache: {str(e)}')
+            return
+        self._block_dir_size += len(data)
+        self._bytes_written_since_eviction += len(data)
+        if self._bytes_written_since_eviction >= block_cache_eviction_interval_bytes:
+            self._bytes_written_since_eviction = 0
+            self._block_cache._evict_if_needed()
+    def _put_memory_cached_block(self, i: int, data: bytes):
+        self._memory_cache[i] = data
+        self._memory_cache.move_to_end(i)
+        while len(self._memory_cache) > max_memory_cache_blocks:
+            self._memory_cache.popitem(last=False)
+    def _fetch_range(self, start: int, end: int) -> bytes:
+        for attempt in range(3):
+            r = requests.get(self._resolved_url, headers={'Range': f'bytes={start}-{end - 1}'}, timeout=60)
+            if r.status_code == 206:
+                if len(r.content) != end - start:
+                    raise Exception(f'Unexpected number of bytes in range request: {len(r.content)} != {end - start}')
+                return r.content
+            if r.status_code in [400, 403]:
+                # the signed URL has probably expired
+                print(f'Refreshing the URL of the remote file (status {r.status_code})')
+                self._refresh_url(get_new_url=attempt > 0)
+                continue
+            raise Exception(f'Problem reading remote file: {r.status_code}')
+        raise Exception('Unable to read remote file: the URL could not be refreshed')
+    def _refresh_url(self, *, get_new_url: bool):
+        if not get_new_url:
+            # first try the original URL (e.g., DANDI API URLs redirect to a newly signed URL)
+            try:
+                self._resolved_url, _ = self._probe(self._url)
+                return
+            except Exception:
+                pass
+        self._url = self._get_url(True)
+        self._resolved_url, _ = self._probe(self._url)
+    def _probe(self, url: str):
+        """Returns the URL after redirects, and the size of the file"""
+        r = requests.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=60)
+        try:
+            if r.status_code != 206:
+                raise Exception(f'Unable to open remote file (status {r.status_code}): the server must support range requests')
+            size = int(r.headers['Content-Range'].split('/')[-1])
+            return r.url, size
+        finally:
+            r.close()
+
+def _get_dir_size(path: str) -> int:
+    size = 0
+    for entry in os.scandir(path):
+        try:
+            size += entry.stat().st_size
+        except FileNotFoundError:
+            pass
+    return size
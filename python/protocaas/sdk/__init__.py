@@ -2,4 +2,4 @@ from .InputFile import InputFile
 from .OutputFile import OutputFile
 from .App import App
 
-from .decorators import processor, input, output, parameter, attribute, tags, input_list
\ No newline at end of file
+from .decorators import processor, input, output, parameter, attribute, tags, input_list, resources
\ No newline at end of file
@@ -0,0 +1,161 @@
+from typing import Union
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+# Files are downloaded in chunks of this size, using several concurrent HTTP Range requests
+download_chunk_size = 8 * 1024 * 1024
+max_simultaneous_chunk_downloads = 8
+
+# Each chunk is retried (resuming from where it left off) this many times
+max_chunk_download_attempts = 5
+
+# Size of the pieces that are read from the response and written to the file
+write_block_size = 1024 * 1024
+
+def _download_file(url: str, dest_file_path: str, *, verify: bool = False):
+    """Download a file, using concurrent ranged requests if the server supports them
+
+    Progress is recorded in <dest_file_path>.download-state, so an interrupted download is resumed
+    when this is called again with the same destination. If verify is True, the file is checked against
+    the MD5 ETag of the object (when the server provides one).
+    """
+    r = requests.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=60)
+    try:
+        total_size = _get_total_size_from_content_range(r.headers.get('Content-Range', '')) if r.status_code in [206, 416] else None
+        etag = r.headers.get('ETag', None)
+        final_url = r.url # after redirects (e.g., from the DANDI API to S3)
+    finally:
+        r.close()
+    t0 = time.time()
+    if r.status_code == 416 and total_size == 0:
+        # the range can't be satisfied because the file is empty (Content-Range: bytes */0)
+        with open(dest_file_path, 'wb'):
+            pass
+    elif r.status_code != 206 or total_size is None:
+        # the server does not support range requests (or rejected the probe), so use a plain GET
+        _download_file_single_stream(url, dest_file_path)
+    else:
+        _download_file_in_chunks(final_url, dest_file_path, total_size=total_size, etag=etag)
+    elapsed = time.time() - t0
+    size = os.path.getsize(dest_file_path)
+    print(f'Downloaded {size / 1e6:.1f} MB in {elapsed:.1f} s ({size / 1e6 / max(elapsed, 1e-3):.1f} MB/s)')
+    if verify:
+        _verify_md5_etag(dest_file_path, etag)
+
+def _download_file_single_stream(url: str, dest_file_path: str):
+    r = requests.get(url, stream=True, timeout=60)
+    if r.status_code != 200:
+        raise Exception(f'Problem downloading {url}: {r.status_code}')
+    with open(dest_file_path, 'wb') as f:
+        for chunk in r.iter_content(chunk_size=write_block_size):
+            if chunk:
+                f.write(chunk)
+
+def _download_file_in_chunks(url: str, dest_file_path: str, *, total_size: int, etag: Union[str, None]):
+    num_chunks = (total_size + download_chunk_size - 1) // download_chunk_size
+    state_file_path = dest_file_path + '.download-state'
+    completed_chunks = _load_download_state(state_file_path, total_size=total_size, etag=etag)
+    if len(completed_chunks) > 0 and os.path.exists(dest_file_path):
+        print(f'Resuming download ({len(completed_chunks)} of {num_chunks} chunks already downloaded)')
+    else:
+        completed_chunks = set()
+    state_lock = threading.Lock()
+    fd = os.open(dest_file_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.fstat(fd).st_size != total_size:
+            os.ftruncate(fd, total_size)
+            if hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(fd, 0, total_size)
+                except OSError:
+                    pass # not supported by all filesystems
+        def download_chunk(i: int):
+            start = i * download_chunk_size
+            end = min(start + download_chunk_size, total_size) # exclusive
+            pos = start
+            for attempt in range(max_chunk_download_attempts):
+                try:
+                    r = requests.get(url, headers={'Range': f'bytes={pos}-{end - 1}'}, stream=True, timeout=60)
+                    try:
+                        if r.status_code != 206:
+                            raise Exception(f'Unexpected status code for range request: {r.status_code}')
+                        for block in r.iter_content(chunk_size=write_block_size):
+                            if block:
+                                os.pwrite(fd, block, pos)
+                                pos += len(block)
+                    finally:
+                        r.close()
+                    if pos != end:
+                        raise Exception(f'Incomplete chunk: got {pos - start} of {end - start} bytes')
+                    break
+                except Exception as e:
+                    if attempt == max_chunk_download_attempts - 1:
+                        raise
+                    # resume from where we left off
+                    print(f'Retrying chunk {i} at byte {pos}: {str(e)}')
+                    time.sleep(min(2 ** attempt, 30))
+            with state_lock:
+                completed_chunks.add(i)
+                _save_download_state(state_file_path, total_size=total_size, etag=etag, completed_chunks=completed_chunks)
+        chunks_to_download = [i for i in range(num_chunks) if i not in completed_chunks]
+        with ThreadPoolExecutor(max_workers=max_simultaneous_chunk_downloads) as executor:
+            # raises the first exception, if any
+            list(executor.map(download_chunk, chunks_to_download))
+    finally:
+        os.close(fd)
+    if os.path.exists(state_file_path):
+        os.remove(state_file_path)
+
+def _get_total_size_from_content_range(content_range: str) -> Union[int, None]:
+    # e.g., bytes 0-0/123456, or bytes */0 when the range can't be satisfied
+    m = re.match(r'^bytes (?:\d+-\d+|\*)/(\d+)$', content_range.strip())
+    if m is None:
+        return None
+    return int(m.group(1))
+
+def _load_download_state(state_file_path: str, *, total_size: int, etag: Union[str, None]) -> set:
+    if not os.path.exists(state_file_path):
+        return set()
+    try:
+        with open(state_file_path, 'r') as f:
+            state = json.load(f)
+    except Exception:
+        return set()
+    if state.get('totalSize', None) != total_size or state.get('etag', None) != etag or state.get('chunkSize', None) != download_chunk_size:
+        # the remote file has changed
+        return set()
+    return set(state.get('completedChunks', []))
+
+def _save_download_state(state_file_path: str, *, total_size: int, etag: Union[str, None], completed_chunks: set):
+    tmp_fname = state_file_path + '.tmp'
+    with open(tmp_fname, 'w') as f:
+        json.dump({
+            'totalSize': total_size,
+            'etag': etag,
+            'chunkSize': download_chunk_size,
+            'completedChunks': sorted(completed_chunks)
+        }, f)
+    os.replace(tmp_fname, state_file_path)
+
+def _verify_md5_etag(file_path: str, etag: Union[str, None]):
+    md5 = etag.strip('"') if etag is not None else ''
+    if not re.match(r'^[0-9a-f]{32}$', md5):
+        # e.g., multipart uploads have ETags of the form <md5>-<num_parts>
+        print(f'Warning: unable to verify {file_path}: the ETag is not an MD5 hash')
+        return
+    h = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        while True:
+            x = f.read(write_block_size)
+            if not x:
+                break
+            h.update(x)
+    if h.hexdigest() != md5:
+        raise Exception(f'Downloaded file does not match its ETag: {h.hexdigest()} != {md5}')
@@ -0,0 +1,93 @@
+import os
+import io
+import sys
+import json
+import socket
+import signal
+import traceback
+from ._run_job import _run_job
+
+
+# This function is called when the app executable is started by the compute resource daemon in warm worker mode (see WarmWorkerPool)
+# * The app module has already been imported, so the (possibly slow) imports are done only once
+# * For each request from the daemon, a job runner process is forked, which does what the protocaas CLI would do for a job
+#   (status reporting, console output, etc.), except that the processor is run in a process forked from it
+#   rather than by running the app executable again
+
+def _run_fork_server(*, app, socket_path: str):
+    parent_pid = os.getppid()
+    # the job runners are not waited for, so make sure they don't become zombies
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(16)
+    server.settimeout(5)
+    print(f'Warm worker for app {app._name} is ready (pid {os.getpid()})')
+    while True:
+        if os.getppid() != parent_pid:
+            # the daemon has exited (jobs that were already started are not affected)
+            print(f'Warm worker for app {app._name} is exiting')
+            return
+        try:
+            conn, _ = server.accept()
+        except socket.timeout:
+            continue
+        try:
+            conn.settimeout(10)
+            request = json.loads(_read_line(conn))
+            pid = _fork_job_runner(app=app, server=server, conn=conn, request=request)
+            conn.sendall((json.dumps({'pid': pid}) + '\n').encode('utf-8'))
+        except Exception as e:
+            print(f'Warm worker for app {app._name}: error handling request: {str(e)}')
+            try:
+                conn.sendall((json.dumps({'error': str(e)}) + '\n').encode('utf-8'))
+            except Exception:
+                pass
+        finally:
+            conn.close()
+
+def _fork_job_runner(*, app, server: socket.socket, conn: socket.socket, request: dict) -> int:
+    job_id: str = request['jobId']
+    job_private_key: str = request['jobPrivateKey']
+    working_dir: str = request['workingDir']
+    env: dict = request['env']
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid != 0:
+        return pid
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL) # the job runner needs to wait for the processor process
+        server.close()
+        conn.close()
+        os.setsid() # so the job keeps running even if the compute resource is stopped
+        os.chdir(working_dir)
+        # output to devnull, as for jobs that are started with subprocess.Popen by the daemon
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in [0, 1, 2]:
+            os.dup2(devnull, fd)
+        os.close(devnull)
+        sys.stdout = io.TextIOWrapper(io.FileIO(1, 'w', closefd=False), write_through=True)
+        sys.stderr = io.TextIOWrapper(io.FileIO(2, 'w', closefd=False), write_through=True)
+        os.environ.update(env)
+        _run_job(
+            job_id=job_id,
+            job_private_key=job_private_key,
+            app_executable=env.get('APP_EXECUTABLE', ''),
+            processor_func=lambda: app._run_job(job_id=job_id, job_private_key=job_private_key)
+        )
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        os._exit(0)
+
+def _read_line(conn: socket.socket) -> str:
+    buf = b''
+    while not buf.endswith(b'\n'):
+        x = conn.recv(4096)
+        if len(x) == 0:
+            break
+        buf += x
+    return buf.decode('utf-8')
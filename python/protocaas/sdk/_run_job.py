@@ -1,7 +1,12 @@
+from typing import Callable, Union
 import os
+import io
+import sys
+import signal
 import threading
 import queue
 import time
+import traceback
 import subprocess
 import requests
 from ..common._api_request import _processor_get_api_request, _processor_put_api_request
@@ -13,11 +18,14 @@ from ..common._api_request import _processor_get_api_request, _processor_put_api
 # * Monitors the job output, updating the database periodically via the API
 # * Sets the job status to completed or failed in the database via the API
 
-def _run_job(*, job_id: str, job_private_key: str, app_executable: str):
+def _run_job(*, job_id: str, job_private_key: str, app_executable: str, processor_func: Union[Callable[[], None], None] = None):
+    """If processor_func is provided (warm worker mode), the job is run by calling it in a forked process
+    rather than by running the app executable"""
     _run_job_timer = time.time()
 
     _debug_log(f'Running job {job_id}')
-    _set_job_status(job_id=job_id, job_private_key=job_private_key, status='running')
+    # the server only accepts this from the node that claimed the job (it may have been claimed again by another node)
+    _set_job_status(job_id=job_id, job_private_key=job_private_key, status='running', compute_resource_node_id=os.environ.get('COMPUTE_RESOURCE_NODE_ID', None))
 
     cmd = app_executable
     env = os.environ.copy()
@@ -26,13 +34,17 @@ def _run_job(*, job_id: str, job_private_key: str, app_executable: str):
     env['JOB_INTERNAL'] = '1'
     env['PYTHONUNBUFFERED'] = '1'
     print(f'Running {app_executable} (Job ID: {job_id})) (Job private key: {job_private_key})')
-    _debug_log('Opening subprocess')
-    proc = subprocess.Popen(
-        cmd,
-        env=env,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT
-    )
+    if processor_func is None:
+        _debug_log('Opening subprocess')
+        proc = subprocess.Popen(
+            cmd,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+    else:
+        _debug_log('Forking subprocess')
+        proc = _ForkedProcess(processor_func, env=env)
 
     def output_reader(proc, outq: queue.Queue):
         while True:
@@ -70,8 +82,10 @@ def _run_job(*, job_id: str, job_private_key: str, app_executable: str):
     try:
         while True:
             try:
-                retcode = proc.wait(1)
+                # returns as soon as the process finishes, which matters for short jobs
+                retcode = proc.wait(5)
                 # don't check this now -- wait until after we had a chance to read the last console output
+                output_reader_thread.join(timeout=5) # the remaining output may not have been read yet
             except subprocess.TimeoutExpired:
                 retcode = None
             while True:
@@ -136,7 +150,6 @@ def _run_job(*, job_id: str, job_private_key: str, app_executable: str):
                     raise ValueError('Job does not exist (was probably canceled)')
                 if job_status != 'running':
                     raise ValueError(f'Unexpected job status: {job_status}')
-            time.sleep(5)
         succeeded = True # No exception
     except Exception as e:
         _debug_log(f'Error running job: {str(e)}')
@@ -175,6 +188,56 @@ def _run_job(*, job_id: str, job_private_key: str, app_executable: str):
         print('WARNING: problem setting final job status: ' + str(e))
         pass
     
+class _ForkedProcess:
+    """Calls a function in a forked process, with its output captured as in subprocess.Popen(..., stdout=PIPE, stderr=STDOUT)"""
+    def __init__(self, func: Callable[[], None], *, env: dict) -> None:
+        read_fd, write_fd = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                os.close(read_fd)
+                os.dup2(write_fd, 1)
+                os.dup2(write_fd, 2)
+                os.close(write_fd)
+                # unbuffered, so that the output is captured even if the process is terminated
+                sys.stdout = io.TextIOWrapper(io.FileIO(1, 'w', closefd=False), write_through=True)
+                sys.stderr = io.TextIOWrapper(io.FileIO(2, 'w', closefd=False), write_through=True)
+                os.environ.clear()
+                os.environ.update(env)
+                func()
+                exit_code = 0
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(exit_code)
+        os.close(write_fd)
+        self.pid = pid
+        self.stdout = os.fdopen(read_fd, 'rb', buffering=0)
+        self.stderr = None
+        self.returncode = None
+    def wait(self, timeout: Union[float, None] = None):
+        t0 = time.time()
+        while self.returncode is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid != 0:
+                self.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+                break
+            if timeout is not None and time.time() - t0 > timeout:
+                raise subprocess.TimeoutExpired(f'forked process {self.pid}', timeout)
+            time.sleep(0.05)
+        return self.returncode
+    def terminate(self):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
 def _get_job_status(*, job_id: str, job_private_key: str) -> str:
     """Get a job from the protocaas API"""
     url_path = f'/api/processor/jobs/{job_id}/status'
@@ -187,7 +250,7 @@ def _get_job_status(*, job_id: str, job_private_key: str) -> str:
     )
     return res['status']
 
-def _set_job_status(*, job_id: str, job_private_key: str, status: str, error: str = None):
+def _set_job_status(*, job_id: str, job_private_key: str, status: str, error: str = None, compute_resource_node_id: str = None):
     """Set the status of a job in the protocaas API"""
     url_path = f'/api/processor/jobs/{job_id}/status'
     headers = {
@@ -198,6 +261,8 @@ def _set_job_status(*, job_id: str, job_private_key: str, status: str, error: st
     }
     if error is not None:
         data['error'] = error
+    if compute_resource_node_id is not None:
+        data['computeResourceNodeId'] = compute_resource_node_id
     resp = _processor_put_api_request(
         url_path=url_path,
         headers=headers,
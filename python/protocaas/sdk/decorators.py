@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Dict
 from .AppProcessor import _NO_DEFAULT
 
 
@@ -73,4 +73,21 @@ def parameter(name, *, help: str, type, default=_NO_DEFAULT, options: list=None,
             pp['secret'] = True
         parameters.insert(0, pp)
         return func
-    return decorator
\ No newline at end of file
+    return decorator
+
+# This decorator is used to declare the resources required by a processor
+# parameter_overrides maps a resource to a parameter whose value (when set for a job) overrides it, e.g., {'memory_gb': 'max_memory_gb'}
+def resources(*, num_cpus: float=None, memory_gb: float=None, disk_gb: float=None, time_min: float=None, parameter_overrides: Dict[str, str]=None):
+    for k in (parameter_overrides or {}).keys():
+        if k not in ['num_cpus', 'memory_gb', 'disk_gb', 'time_min']:
+            raise Exception(f'Unexpected resource in parameter_overrides: {k}')
+    def decorator(func):
+        setattr(func, 'protocaas_resources', {
+            'num_cpus': num_cpus,
+            'memory_gb': memory_gb,
+            'disk_gb': disk_gb,
+            'time_min': time_min,
+            'parameter_overrides': dict(parameter_overrides or {})
+        })
+        return func
+    return decorator
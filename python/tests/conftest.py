@@ -0,0 +1,6 @@
+import os
+import sys
+
+
+# the tests of the server helpers import api_helpers from the root of the repository
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
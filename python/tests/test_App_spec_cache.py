@@ -0,0 +1,74 @@
+import os
+import json
+import stat
+from types import SimpleNamespace
+import pytest
+import protocaas.compute_resource.ContainerImageCache as container_image_cache_module
+from protocaas.compute_resource.ContainerImageCache import ContainerImageCache
+from protocaas.sdk.App import App
+
+
+# singularity is replaced by a script on the PATH: "singularity pull" writes a fake SIF file, and "singularity exec"
+# writes the spec of an app to SPEC_OUTPUT_FILE. Each call is recorded in singularity_calls.jsonl.
+
+fake_singularity_script = '''#!/usr/bin/env python3
+import sys, os, json
+args = sys.argv[1:]
+with open(os.path.join(os.environ['FAKE_SINGULARITY_DIR'], 'singularity_calls.jsonl'), 'a') as f:
+    f.write(json.dumps(args) + '\\n')
+if args[0] == 'pull':
+    with open(args[2], 'w') as f:
+        f.write('sif of ' + args[3])
+elif args[0] == 'exec':
+    env = dict(args[i + 1].split('=', 1) for i in range(len(args)) if args[i] == '--env')
+    spec = {'name': 'app1', 'help': 'image ' + args[-2], 'processors': []}
+    with open(env['SPEC_OUTPUT_FILE'], 'w') as f:
+        json.dump(spec, f)
+'''
+
+@pytest.fixture
+def fake_singularity(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    p = bin_dir / 'singularity'
+    p.write_text(fake_singularity_script)
+    p.chmod(p.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ['PATH'])
+    monkeypatch.setenv('FAKE_SINGULARITY_DIR', str(tmp_path))
+    monkeypatch.setenv('CONTAINER_METHOD', 'singularity')
+    # the digest of the tag, as reported by the registry
+    digests = {'org/app:latest': 'sha256:aaaa'}
+    monkeypatch.setattr(container_image_cache_module, '_get_image_digest', lambda container: digests[container])
+    def get_calls():
+        fname = tmp_path / 'singularity_calls.jsonl'
+        return [json.loads(line) for line in fname.read_text().splitlines()] if fname.exists() else []
+    return SimpleNamespace(dir=tmp_path, digests=digests, get_calls=get_calls)
+
+def load_app(fake_singularity):
+    cache = ContainerImageCache(cache_dir=str(fake_singularity.dir / 'container_image_cache'), container_method='singularity')
+    return App.from_executable(
+        '/app/main.py',
+        container='org/app:latest',
+        spec_cache_dir=str(fake_singularity.dir / 'app_spec_cache'),
+        container_image_cache=cache
+    )
+
+def test_spec_is_extracted_from_the_cached_sif(fake_singularity):
+    app = load_app(fake_singularity)
+    sif_path = str(fake_singularity.dir / 'container_image_cache' / 'sha256-aaaa.sif')
+    assert app._help == f'image {sif_path}'
+    calls = fake_singularity.get_calls()
+    assert [c[0] for c in calls] == ['pull', 'exec']
+    assert calls[0][-1] == 'docker://org/app@sha256:aaaa'
+    assert sif_path in calls[1]
+
+def test_spec_is_cached_by_digest(fake_singularity):
+    load_app(fake_singularity)
+    # restart with the same image: the SIF and the spec are reused
+    load_app(fake_singularity)
+    assert [c[0] for c in fake_singularity.get_calls()] == ['pull', 'exec']
+    # a new image is pushed with the same tag
+    fake_singularity.digests['org/app:latest'] = 'sha256:bbbb'
+    app = load_app(fake_singularity)
+    assert [c[0] for c in fake_singularity.get_calls()] == ['pull', 'exec', 'pull', 'exec']
+    assert app._help.endswith('sha256-bbbb.sif')
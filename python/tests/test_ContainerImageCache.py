@@ -0,0 +1,50 @@
+import time
+import pytest
+import protocaas.compute_resource.ContainerImageCache as container_image_cache_module
+from protocaas.compute_resource.ContainerImageCache import ContainerImageCache, _parse_image_reference, _get_registry_token
+
+
+def test_parse_image_reference():
+    assert _parse_image_reference('ubuntu') == ('registry-1.docker.io', 'library/ubuntu', 'latest', None)
+    assert _parse_image_reference('org/img:1.2') == ('registry-1.docker.io', 'org/img', '1.2', None)
+    assert _parse_image_reference('docker.io/org/img') == ('registry-1.docker.io', 'org/img', 'latest', None)
+    assert _parse_image_reference('docker.io/ubuntu:22.04') == ('registry-1.docker.io', 'library/ubuntu', '22.04', None)
+    assert _parse_image_reference('index.docker.io/org/img') == ('registry-1.docker.io', 'org/img', 'latest', None)
+    assert _parse_image_reference('ghcr.io/org/img:v1') == ('ghcr.io', 'org/img', 'v1', None)
+    assert _parse_image_reference('localhost:5000/img@sha256:abc') == ('localhost:5000', 'img', 'latest', 'sha256:abc')
+
+def test_missing_registry_token_raises(monkeypatch):
+    class Resp:
+        status_code = 200
+        def json(self):
+            return {'expires_in': 300}
+    monkeypatch.setattr(container_image_cache_module.requests, 'get', lambda url, params, timeout: Resp())
+    with pytest.raises(Exception, match='no token'):
+        _get_registry_token('Bearer realm="https://auth.example.org/token",service="registry"')
+
+def test_superseded_sifs_referenced_by_submitted_jobs_are_kept(tmp_path, monkeypatch):
+    commands = []
+    cache = ContainerImageCache(cache_dir=str(tmp_path), container_method='singularity', get_commands_of_submitted_jobs=lambda: commands)
+    old_sifs = []
+    for name in ['a', 'b']:
+        p = tmp_path / f'sha256-{name}.sif'
+        p.write_text('')
+        old_sifs.append(str(p))
+        cache._superseded_sifs.append((str(p), 0))
+    commands.append(f'cd /jobs/j1 && singularity exec --nv {old_sifs[0]} /app/main.py')
+    cache._delete_superseded_sifs()
+    assert (tmp_path / 'sha256-a.sif').exists()
+    assert not (tmp_path / 'sha256-b.sif').exists()
+    # once the task has finished, the SIF is deleted
+    commands.clear()
+    cache._delete_superseded_sifs()
+    assert not (tmp_path / 'sha256-a.sif').exists()
+    assert cache._superseded_sifs == []
+
+def test_recently_superseded_sifs_are_kept(tmp_path):
+    cache = ContainerImageCache(cache_dir=str(tmp_path), container_method='singularity')
+    p = tmp_path / 'sha256-a.sif'
+    p.write_text('')
+    cache._superseded_sifs.append((str(p), time.time()))
+    cache._delete_superseded_sifs()
+    assert p.exists()
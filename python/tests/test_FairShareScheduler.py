@@ -0,0 +1,95 @@
+import random
+from types import SimpleNamespace
+from protocaas.compute_resource.FairShareScheduler import FairShareScheduler
+
+
+# Deterministic simulation of the order in which a compute resource node starts pending local jobs.
+# User A submits a large batch of jobs, and then users B and C submit a few jobs shortly afterward.
+# The queue waits of each user are compared for first-come-first-served ordering and for fair-share ordering.
+
+num_slots = 8 # number of jobs that can run at the same time on the node (each job uses one CPU)
+min_job_duration = 60 * 3
+max_job_duration = 60 * 7
+dispatch_interval = 30
+seed = 0
+
+# With fair share, the users with few jobs must not wait behind the large batch of user A
+max_light_user_wait_sec = 60 * 15
+
+# ... and this must not cost user A much (relative to first come first served)
+max_heavy_user_wait_increase = 0.05
+
+def make_job(job_id: str, user_id: str, timestamp_created: float, duration: float, priority: int=None):
+    return SimpleNamespace(
+        jobId=job_id,
+        userId=user_id,
+        workspaceId=f'ws-{user_id}',
+        timestampCreated=timestamp_created,
+        priority=priority,
+        inputParameters=[],
+        processorSpec=SimpleNamespace(attributes=[], resources=None),
+        duration=duration # used by the simulation only
+    )
+
+def make_submissions():
+    rng = random.Random(seed)
+    def duration():
+        return rng.uniform(min_job_duration, max_job_duration)
+    jobs = []
+    for i in range(500):
+        jobs.append(make_job(f'a{i:04d}', 'A', rng.uniform(0, 60), duration()))
+    for i in range(10):
+        jobs.append(make_job(f'b{i:04d}', 'B', rng.uniform(600, 660), duration()))
+    for i in range(5):
+        jobs.append(make_job(f'c{i:04d}', 'C', rng.uniform(1800, 1860), duration(), priority=5))
+    return jobs
+
+def simulate(*, fair_share: bool):
+    """Return the queue waits of the jobs of each user"""
+    submissions = sorted(make_submissions(), key=lambda job: (job.timestampCreated, job.jobId))
+    scheduler = FairShareScheduler()
+    pending = []
+    running_until = [] # end times of running jobs
+    waits = {}
+    t = 0
+    while len(submissions) > 0 or len(pending) > 0:
+        while len(submissions) > 0 and submissions[0].timestampCreated <= t:
+            pending.append(submissions.pop(0))
+        running_until = [x for x in running_until if x > t]
+        if fair_share:
+            ordered = scheduler.order_jobs(pending, now=t)
+        else:
+            ordered = sorted(pending, key=lambda job: (job.timestampCreated, job.jobId))
+        num_free = num_slots - len(running_until)
+        for job in ordered[:num_free]:
+            scheduler.record_job_start(job, now=t)
+            pending.remove(job)
+            running_until.append(t + job.duration)
+            waits.setdefault(job.userId, []).append(t - job.timestampCreated)
+        t += dispatch_interval
+    return waits
+
+def test_fair_share_bounds_the_waits_of_light_users():
+    fcfs_waits = simulate(fair_share=False)
+    fair_share_waits = simulate(fair_share=True)
+    for user_id in ['B', 'C']:
+        # otherwise the scenario does not test anything
+        assert max(fcfs_waits[user_id]) > max_light_user_wait_sec
+        assert max(fair_share_waits[user_id]) <= max_light_user_wait_sec
+    assert max(fair_share_waits['A']) <= max(fcfs_waits['A']) * (1 + max_heavy_user_wait_increase)
+    for user_id, w in fcfs_waits.items():
+        assert len(fair_share_waits[user_id]) == len(w)
+
+def test_simulation_is_deterministic():
+    assert simulate(fair_share=True) == simulate(fair_share=True)
+
+def test_usage_interleaves_users():
+    scheduler = FairShareScheduler()
+    jobs = [make_job(f'a{i}', 'A', i, 0) for i in range(3)] + [make_job('b0', 'B', 10, 0)]
+    ordered = scheduler.order_jobs(jobs, now=10)
+    # the job of B goes before the second job of A, which is charged the usage of the first
+    assert [job.jobId for job in ordered] == ['a0', 'b0', 'a1', 'a2']
+    for job in ordered[:2]:
+        scheduler.record_job_start(job, now=10)
+    assert scheduler.get_user_usage('A', now=10) == 1
+    assert scheduler.get_user_usage('A', now=10 + 60 * 60) == 0.5
@@ -0,0 +1,28 @@
+from protocaas.sdk.InputFileCache import get_input_file_cache_key
+
+
+def test_signatures_are_ignored():
+    base = 'https://bucket.s3.amazonaws.com/data/file.nwb'
+    k = get_input_file_cache_key(base)
+    assert k == 'bucket.s3.amazonaws.com/data/file.nwb'
+    assert get_input_file_cache_key(base + '?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Credential=abc&X-Amz-Date=20240101T000000Z&X-Amz-Expires=3600&X-Amz-SignedHeaders=host&X-Amz-Signature=def') == k
+    assert get_input_file_cache_key(base + '?AWSAccessKeyId=abc&Signature=def&Expires=123') == k
+    assert get_input_file_cache_key(base + '?GoogleAccessId=abc&Expires=123&Signature=def') == k
+    assert get_input_file_cache_key(base + '?sv=2022-11-02&sp=r&se=2024-01-01&sr=b&sig=abc') == k
+    assert get_input_file_cache_key(base + '?x-amz-signature=abc') == k
+
+def test_identifying_query_parameters_are_kept():
+    base = 'https://bucket.s3.amazonaws.com/data/file.nwb'
+    k1 = get_input_file_cache_key(base + '?versionId=1&X-Amz-Signature=abc')
+    k2 = get_input_file_cache_key(base + '?versionId=2&X-Amz-Signature=abc')
+    assert k1 != k2
+    assert k1 == 'bucket.s3.amazonaws.com/data/file.nwb?versionId=1'
+    assert get_input_file_cache_key('https://api.example.org/download?id=1') != get_input_file_cache_key('https://api.example.org/download?id=2')
+
+def test_query_parameter_order_does_not_matter():
+    assert get_input_file_cache_key('https://example.org/f?b=2&a=1') == get_input_file_cache_key('https://example.org/f?a=1&b=2&Signature=x')
+
+def test_dandi_assets_are_keyed_by_asset_id():
+    asset_id = '0a1b2c3d-0000-1111-2222-333344445555'
+    url = f'https://api.dandiarchive.org/api/assets/{asset_id}/download/'
+    assert get_input_file_cache_key(url) == f'dandi-asset:{asset_id}'
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+import protocaas.compute_resource.LocalJobScheduler as local_job_scheduler_module
+from protocaas.compute_resource.LocalJobScheduler import LocalJobScheduler, JobResources, get_job_resources
+
+
+def make_job(job_id: str, *, num_cpus: float, timestamp_created: float = 0, attributes: list = None):
+    return SimpleNamespace(
+        jobId=job_id,
+        processorName='proc',
+        timestampCreated=timestamp_created,
+        inputParameters=[],
+        processorSpec=SimpleNamespace(
+            attributes=attributes if attributes is not None else [],
+            resources=SimpleNamespace(numCpus=num_cpus, memoryGb=1, diskGb=0, timeMin=None, parameterOverrides=[])
+        )
+    )
+
+def create_scheduler(tmp_path, monkeypatch, *, num_cpus: float):
+    scheduler = LocalJobScheduler(jobs_dir=str(tmp_path))
+    monkeypatch.setattr(scheduler, 'get_capacity', lambda: JobResources(num_cpus=num_cpus, memory_gb=100, disk_gb=100))
+    return scheduler
+
+def test_jobs_are_bin_packed_in_order(tmp_path, monkeypatch):
+    scheduler = create_scheduler(tmp_path, monkeypatch, num_cpus=8)
+    running = [make_job('r', num_cpus=4)]
+    pending = [make_job('a', num_cpus=2), make_job('b', num_cpus=4), make_job('c', num_cpus=2)]
+    selected = scheduler.select_jobs_to_start(running_jobs=running, pending_jobs=pending, now=0)
+    # b does not fit, so c is backfilled
+    assert [job.jobId for job in selected] == ['a', 'c']
+
+def test_old_queue_still_backfills(tmp_path, monkeypatch):
+    # all the jobs were created long ago, but the large job has only just been skipped
+    scheduler = create_scheduler(tmp_path, monkeypatch, num_cpus=8)
+    now = 100 * local_job_scheduler_module.max_backfill_wait_sec
+    running = [make_job('r', num_cpus=6)]
+    pending = [make_job('big', num_cpus=4), make_job('small', num_cpus=2)]
+    selected = scheduler.select_jobs_to_start(running_jobs=running, pending_jobs=pending, now=now)
+    assert [job.jobId for job in selected] == ['small']
+
+def test_job_skipped_for_too_long_blocks_backfill(tmp_path, monkeypatch):
+    scheduler = create_scheduler(tmp_path, monkeypatch, num_cpus=8)
+    running = [make_job('r', num_cpus=6)]
+    big = make_job('big', num_cpus=4)
+    t0 = 1000
+    selected = scheduler.select_jobs_to_start(running_jobs=running, pending_jobs=[big, make_job('s1', num_cpus=2)], now=t0)
+    assert [job.jobId for job in selected] == ['s1']
+    t1 = t0 + local_job_scheduler_module.max_backfill_wait_sec + 1
+    selected = scheduler.select_jobs_to_start(running_jobs=running, pending_jobs=[big, make_job('s2', num_cpus=2)], now=t1)
+    assert selected == []
+    # once the big job is no longer pending, it is forgotten
+    selected = scheduler.select_jobs_to_start(running_jobs=running, pending_jobs=[make_job('s3', num_cpus=2)], now=t1)
+    assert [job.jobId for job in selected] == ['s3']
+    assert scheduler._time_first_skipped == {}
+
+def test_malformed_attributes_fall_back_to_defaults():
+    job = make_job('j', num_cpus=None, attributes=[
+        SimpleNamespace(name='num_cpus', value='lots'),
+        SimpleNamespace(name='memory_gb', value='nan'),
+        SimpleNamespace(name='disk_gb', value='3')
+    ])
+    job.processorSpec.resources = None
+    r = get_job_resources(job)
+    assert r.num_cpus == local_job_scheduler_module.default_job_num_cpus
+    assert r.memory_gb == local_job_scheduler_module.default_job_memory_gb
+    assert r.disk_gb == 3
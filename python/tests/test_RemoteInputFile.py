@@ -0,0 +1,99 @@
+import os
+import threading
+from types import SimpleNamespace
+import pytest
+import protocaas.sdk.InputFileCache as input_file_cache_module
+import protocaas.sdk.RemoteInputFile as remote_input_file_module
+from protocaas.sdk.InputFileCache import InputFileCache
+from protocaas.sdk.RemoteInputFile import RemoteInputFile
+
+
+url = 'https://example.org/data/file.bin'
+file_content = bytes([i % 251 for i in range(2000)])
+
+class FakeRequests:
+    """Serves the range requests for file_content, optionally waiting on an event before serving data"""
+    def __init__(self):
+        self.ranges = []
+        self.release = None
+        self.in_request = threading.Event()
+    def get(self, u: str, *, headers: dict, timeout: float, stream: bool = False):
+        assert u == url
+        start, end = [int(x) for x in headers['Range'][len('bytes='):].split('-')]
+        if (start, end) != (0, 0):
+            self.ranges.append((start, end))
+            if self.release is not None:
+                self.in_request.set()
+                self.release.wait()
+        return SimpleNamespace(
+            status_code=206,
+            url=u,
+            content=file_content[start:end + 1],
+            headers={'Content-Range': f'bytes {start}-{end}/{len(file_content)}'},
+            close=lambda: None
+        )
+
+@pytest.fixture
+def fake_requests(monkeypatch):
+    r = FakeRequests()
+    monkeypatch.setattr(remote_input_file_module, 'requests', r)
+    monkeypatch.setattr(remote_input_file_module, 'block_size', 100)
+    return r
+
+def open_file(block_cache=None):
+    return RemoteInputFile(get_url=lambda refresh: url, block_cache=block_cache)
+
+def test_reads_are_served_from_blocks(fake_requests):
+    f = open_file()
+    assert f.size == len(file_content)
+    f.seek(150)
+    assert f.read(100) == file_content[150:250]
+    assert f.read(10) == file_content[250:260] # already read ahead
+    assert fake_requests.ranges == [(100, 299)]
+    f.seek(0)
+    assert f.read() == file_content
+
+def test_block_dir_is_capped(fake_requests, tmp_path, monkeypatch):
+    # a cache of 1000 bytes, of which the blocks of one file may use half
+    monkeypatch.setattr(input_file_cache_module, 'max_input_cache_size_gb', 1000 / 1e9)
+    cache = InputFileCache(str(tmp_path))
+    f = open_file(cache)
+    assert f.read() == file_content
+    block_dirs = os.listdir(tmp_path / 'blocks')
+    assert len(block_dirs) == 1
+    block_dir = tmp_path / 'blocks' / block_dirs[0]
+    assert sum([p.stat().st_size for p in block_dir.iterdir()]) == 500
+    # the blocks that were not written to disk are still served from memory
+    f.seek(1900)
+    assert f.read() == file_content[1900:]
+    assert len(fake_requests.ranges) == 1
+
+def test_cache_is_trimmed_while_blocks_are_written(fake_requests, tmp_path, monkeypatch):
+    monkeypatch.setattr(remote_input_file_module, 'block_cache_eviction_interval_bytes', 100)
+    monkeypatch.setattr(input_file_cache_module, 'max_input_cache_size_gb', 1000 / 1e9)
+    cache = InputFileCache(str(tmp_path))
+    # a large downloaded file that was used before the remote file was opened
+    with open(tmp_path / 'objects' / ('0' * 64), 'wb') as f:
+        f.write(b'x' * 800)
+    os.utime(tmp_path / 'objects' / ('0' * 64), (0, 0))
+    f = open_file(cache)
+    f.read(300)
+    assert not os.path.exists(tmp_path / 'objects' / ('0' * 64))
+
+def test_cached_blocks_are_read_while_a_range_is_fetched(fake_requests):
+    f = open_file()
+    assert f.read(100) == file_content[:100]
+    fake_requests.release = threading.Event()
+    t = threading.Thread(target=lambda: (f.seek(1000), f.read(100)))
+    t.start()
+    try:
+        assert fake_requests.in_request.wait(timeout=10)
+        # the fetch of the other thread must not block reading a cached block
+        result = []
+        t2 = threading.Thread(target=lambda: (f.seek(0), result.append(f.read(100))))
+        t2.start()
+        t2.join(timeout=10)
+        assert result == [file_content[:100]]
+    finally:
+        fake_requests.release.set()
+        t.join()
@@ -0,0 +1,224 @@
+import os
+import json
+import stat
+from types import SimpleNamespace
+import pytest
+from protocaas.common.protocaas_types import ComputeResourceSlurmOpts
+import protocaas.compute_resource.SlurmJobHandler as slurm_job_handler_module
+from protocaas.compute_resource.SlurmJobHandler import SlurmJobHandler, _parse_sacct_output
+
+
+# sbatch and sacct are replaced by scripts on the PATH:
+# the stub sbatch records its arguments in sbatch_calls.jsonl and prints consecutive slurm job IDs (starting at 1000),
+# and the stub sacct prints the contents of sacct_output.txt
+
+fake_sbatch = '''#!/usr/bin/env python3
+import sys, os, json
+d = os.environ['FAKE_SLURM_DIR']
+if os.path.exists(os.path.join(d, 'sbatch_fail')):
+    print('sbatch: error: Batch job submission failed', file=sys.stderr)
+    sys.exit(1)
+with open(os.path.join(d, 'sbatch_calls.jsonl'), 'a') as f:
+    f.write(json.dumps(sys.argv[1:]) + '\\n')
+with open(os.path.join(d, 'sbatch_calls.jsonl')) as f:
+    n = len(f.readlines())
+print(f'{999 + n};cluster1')
+'''
+
+fake_sacct = '''#!/usr/bin/env python3
+import os
+with open(os.path.join(os.environ['FAKE_SLURM_DIR'], 'sacct_output.txt')) as f:
+    print(f.read(), end='')
+'''
+
+class FakeDaemon:
+    def _start_job(self, job, run_process: bool = True, return_shell_command: bool = False):
+        assert not run_process and return_shell_command
+        return f'run-job {job.jobId}'
+
+def make_job(job_id: str):
+    return SimpleNamespace(
+        jobId=job_id,
+        jobPrivateKey=f'pk-{job_id}',
+        inputParameters=[],
+        processorSpec=SimpleNamespace(attributes=[], resources=None)
+    )
+
+@pytest.fixture
+def fake_slurm(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    for name, source in [('sbatch', fake_sbatch), ('sacct', fake_sacct)]:
+        p = bin_dir / name
+        p.write_text(source)
+        p.chmod(p.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ['PATH'])
+    monkeypatch.setenv('FAKE_SLURM_DIR', str(tmp_path))
+    # the slurm scripts are written to the working directory
+    monkeypatch.chdir(tmp_path)
+    # submit right away, and check the state with sacct on every call of do_work
+    monkeypatch.setattr(slurm_job_handler_module, 'quiet_period_sec', 0)
+    monkeypatch.setattr(slurm_job_handler_module, 'sacct_interval_sec', -1)
+    # record the jobs that are marked failed instead of sending the status to the server
+    failed_jobs = {}
+    def _set_job_status(*, job_id: str, job_private_key: str, status: str, error: str = None):
+        assert status == 'failed'
+        assert job_private_key == f'pk-{job_id}'
+        failed_jobs[job_id] = error
+    monkeypatch.setattr(slurm_job_handler_module, '_set_job_status', _set_job_status)
+    return SimpleNamespace(dir=tmp_path, failed_jobs=failed_jobs)
+
+def get_sbatch_calls(fake_slurm):
+    fname = fake_slurm.dir / 'sbatch_calls.jsonl'
+    if not fname.exists():
+        return []
+    return [json.loads(line) for line in fname.read_text().splitlines()]
+
+def set_sacct_output(fake_slurm, lines):
+    (fake_slurm.dir / 'sacct_output.txt').write_text(''.join(line + '\n' for line in lines))
+
+def create_handler(**kwargs):
+    return SlurmJobHandler(FakeDaemon(), ComputeResourceSlurmOpts(partition='gpu', otherOpts='--gpus=1'), **kwargs)
+
+def test_jobs_are_submitted_as_one_array(fake_slurm):
+    handler = create_handler()
+    for i in range(3):
+        handler.add_job(make_job(f'j{i}'))
+    handler.add_job(make_job('j0')) # added twice, submitted once
+    handler.do_work()
+    calls = get_sbatch_calls(fake_slurm)
+    assert len(calls) == 1
+    args = calls[0]
+    assert args[0] == '--parsable'
+    assert '--array=0-2' in args
+    assert '--partition=gpu' in args
+    assert '--gpus=1' in args
+    script = (fake_slurm.dir / args[-1]).read_text()
+    for i in range(3):
+        assert f'if [ "$SLURM_ARRAY_TASK_ID" == "{i}" ]; then\n    run-job j{i}\n' in script
+    assert sorted(handler.get_submitted_job_ids()) == ['j0', 'j1', 'j2']
+    # nothing left to submit
+    handler.do_work()
+    assert len(get_sbatch_calls(fake_slurm)) == 1
+
+def test_jobs_are_split_into_arrays_of_at_most_max_jobs_in_array(fake_slurm, monkeypatch):
+    monkeypatch.setattr(slurm_job_handler_module, 'max_jobs_in_array', 2)
+    monkeypatch.setattr(slurm_job_handler_module, 'quiet_period_sec', 1000)
+    monkeypatch.setattr(slurm_job_handler_module, 'max_wait_sec', 1000)
+    set_sacct_output(fake_slurm, [])
+    handler = create_handler()
+    for i in range(5):
+        handler.add_job(make_job(f'j{i}'))
+    # full arrays are submitted without waiting for a quiet period
+    handler.do_work()
+    handler.do_work()
+    handler.do_work()
+    calls = get_sbatch_calls(fake_slurm)
+    assert len(calls) == 2
+    assert all('--array=0-1' in args for args in calls)
+    # the remaining job waits for the quiet period
+    monkeypatch.setattr(slurm_job_handler_module, 'quiet_period_sec', 0)
+    handler.do_work()
+    calls = get_sbatch_calls(fake_slurm)
+    assert len(calls) == 3
+    assert '--array=0-0' in calls[2]
+    assert sorted(handler.get_submitted_job_ids()) == [f'j{i}' for i in range(5)]
+
+def test_parse_sacct_output():
+    output = '\n'.join([
+        '123|RUNNING',
+        '123_4|FAILED',
+        '123_4.batch|FAILED',
+        '123_4.extern|COMPLETED',
+        '123_5|TIMEOUT',
+        '123_6|OUT_OF_MEMORY',
+        '123_7|CANCELLED by 1000',
+        '123_[8-10,12%4]|PENDING',
+        '124_[0-1]|CANCELLED by 1000',
+        ''
+    ])
+    assert list(_parse_sacct_output(output)) == [
+        ('123', 4, 'FAILED'),
+        ('123', 5, 'TIMEOUT'),
+        ('123', 6, 'OUT_OF_MEMORY'),
+        ('123', 7, 'CANCELLED'),
+        ('123', 8, 'PENDING'),
+        ('123', 9, 'PENDING'),
+        ('123', 10, 'PENDING'),
+        ('123', 12, 'PENDING'),
+        ('124', 0, 'CANCELLED'),
+        ('124', 1, 'CANCELLED')
+    ]
+
+def test_failed_and_lost_tasks_are_marked_failed(fake_slurm):
+    handler = create_handler()
+    for i in range(7):
+        handler.add_job(make_job(f'j{i}'))
+    handler.do_work()
+    assert len(get_sbatch_calls(fake_slurm)) == 1
+    set_sacct_output(fake_slurm, [
+        '1000_0|COMPLETED',
+        '1000_1|FAILED',
+        '1000_2|TIMEOUT',
+        '1000_3|OUT_OF_MEMORY',
+        '1000_4|NODE_FAIL',
+        '1000_5|RUNNING',
+        '1000_6|PENDING'
+    ])
+    handler.do_work()
+    assert sorted(fake_slurm.failed_jobs.keys()) == ['j1', 'j2', 'j3', 'j4']
+    assert 'finished with state OUT_OF_MEMORY' in fake_slurm.failed_jobs['j3']
+    assert sorted(handler.get_submitted_job_ids()) == ['j5', 'j6']
+    # the pending task is cancelled before it starts, so it is only reported as part of a range
+    set_sacct_output(fake_slurm, [
+        '1000_5|COMPLETED',
+        '1000_[6]|CANCELLED by 1000'
+    ])
+    handler.do_work()
+    assert sorted(fake_slurm.failed_jobs.keys()) == ['j1', 'j2', 'j3', 'j4', 'j6']
+    assert handler.get_submitted_job_ids() == []
+
+def test_jobs_are_marked_failed_when_sbatch_fails(fake_slurm):
+    (fake_slurm.dir / 'sbatch_fail').write_text('')
+    handler = create_handler()
+    handler.add_job(make_job('j0'))
+    handler.add_job(make_job('j1'))
+    handler.do_work()
+    assert sorted(fake_slurm.failed_jobs.keys()) == ['j0', 'j1']
+    assert 'Batch job submission failed' in fake_slurm.failed_jobs['j0']
+    assert handler.get_submitted_job_ids() == []
+
+def test_submitted_tasks_survive_a_restart(fake_slurm):
+    state_file_path = str(fake_slurm.dir / 'slurm_jobs.json')
+    handler = create_handler(state_file_path=state_file_path)
+    handler.add_job(make_job('j0'))
+    handler.add_job(make_job('j1'))
+    handler.do_work()
+    handler = create_handler(state_file_path=state_file_path)
+    assert sorted(handler.get_submitted_job_ids()) == ['j0', 'j1']
+    set_sacct_output(fake_slurm, ['1000_0|COMPLETED', '1000_1|FAILED'])
+    handler.do_work()
+    assert sorted(fake_slurm.failed_jobs.keys()) == ['j1']
+    assert create_handler(state_file_path=state_file_path).get_submitted_job_ids() == []
+
+def test_arrays_missing_from_sacct_are_marked_failed(fake_slurm, monkeypatch):
+    monkeypatch.setattr(slurm_job_handler_module, 'max_sacct_checks_missing', 3)
+    handler = create_handler()
+    handler.add_job(make_job('j0'))
+    handler.add_job(make_job('j1'))
+    handler.do_work()
+    # the array is reported again before the limit, so it is not lost
+    set_sacct_output(fake_slurm, [])
+    handler.do_work()
+    handler.do_work()
+    set_sacct_output(fake_slurm, ['1000_0|COMPLETED', '1000_1|RUNNING'])
+    handler.do_work()
+    set_sacct_output(fake_slurm, [])
+    handler.do_work()
+    handler.do_work()
+    assert fake_slurm.failed_jobs == {}
+    assert handler.get_submitted_job_ids() == ['j1']
+    handler.do_work()
+    assert sorted(fake_slurm.failed_jobs.keys()) == ['j1']
+    assert 'was lost' in fake_slurm.failed_jobs['j1']
+    assert handler.get_submitted_job_ids() == []
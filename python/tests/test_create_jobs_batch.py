@@ -0,0 +1,60 @@
+import pytest
+import api_helpers.services.gui.create_jobs_batch as create_jobs_batch_module
+from api_helpers.services.gui.create_jobs_batch import CreateJobsBatchRequestJob, _expand_parameter_grid, _filter_output_file_name
+from api_helpers.services.gui.create_job import CreateJobRequestInputParameter
+
+
+def make_request_job(*, input_parameters: list = None, parameter_grid: list = None):
+    return CreateJobsBatchRequestJob(
+        processorName='proc',
+        inputFiles=[{'name': 'input', 'fileName': 'in.nwb'}],
+        outputFiles=[{'name': 'output', 'fileName': 'out_${parameter:a}_${parameter:b}.nwb'}],
+        inputParameters=input_parameters if input_parameters is not None else [],
+        parameterGrid=parameter_grid,
+        priority=3,
+        forceRerun=True
+    )
+
+def get_parameters(job: CreateJobsBatchRequestJob):
+    return {p.name: p.value for p in job.inputParameters}
+
+def test_job_without_grid_is_not_expanded():
+    job = make_request_job(input_parameters=[{'name': 'a', 'value': 1}])
+    assert _expand_parameter_grid(job) == [job]
+
+def test_grid_is_expanded_to_all_combinations():
+    job = make_request_job(
+        input_parameters=[{'name': 'a', 'value': 0}, {'name': 'c', 'value': 'fixed'}],
+        parameter_grid=[{'name': 'a', 'values': [1, 2, 3]}, {'name': 'b', 'values': ['x', 'y']}]
+    )
+    jobs = _expand_parameter_grid(job)
+    assert len(jobs) == 6
+    # the grid values replace the given value of a parameter, and the other parameters are kept
+    assert [get_parameters(j) for j in jobs] == [
+        {'c': 'fixed', 'a': a, 'b': b} for a in [1, 2, 3] for b in ['x', 'y']
+    ]
+    for j in jobs:
+        assert j.parameterGrid is None
+        assert j.priority == 3 and j.forceRerun
+        assert j.outputFiles == job.outputFiles
+
+def test_duplicate_grid_parameters_are_rejected():
+    job = make_request_job(parameter_grid=[{'name': 'a', 'values': [1]}, {'name': 'a', 'values': [2]}])
+    with pytest.raises(Exception, match='Duplicate parameter'):
+        _expand_parameter_grid(job)
+
+def test_grid_is_limited(monkeypatch):
+    monkeypatch.setattr(create_jobs_batch_module, 'max_jobs_per_batch', 10)
+    assert len(_expand_parameter_grid(make_request_job(parameter_grid=[{'name': 'a', 'values': list(range(10))}]))) == 10
+    with pytest.raises(Exception, match='Too many jobs'):
+        _expand_parameter_grid(make_request_job(parameter_grid=[{'name': 'a', 'values': list(range(1000))}, {'name': 'b', 'values': list(range(1000))}]))
+
+def test_output_file_names_are_substituted():
+    params = [CreateJobRequestInputParameter(name='a', value=1), CreateJobRequestInputParameter(name='b', value='x')]
+    assert _filter_output_file_name('out_${parameter:a}_${parameter:b}.nwb', job_id='j1', input_parameters=params) == 'out_1_x.nwb'
+    assert _filter_output_file_name('jobs/${job-id}/out.nwb', job_id='j1', input_parameters=params) == 'jobs/j1/out.nwb'
+
+def test_unresolved_output_file_name_parameters_are_rejected():
+    params = [CreateJobRequestInputParameter(name='a', value=1)]
+    with pytest.raises(Exception, match='Unresolved parameter'):
+        _filter_output_file_name('out_${parameter:b}.nwb', job_id='j1', input_parameters=params)
@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+from protocaas.compute_resource._get_requested_job_resources import _get_requested_job_resources
+from protocaas.compute_resource.SlurmJobHandler import _get_slurm_resource_opts
+
+
+def make_job(parameter_values: dict):
+    return SimpleNamespace(
+        jobId='j',
+        inputParameters=[SimpleNamespace(name=k, value=v) for k, v in parameter_values.items()],
+        processorSpec=SimpleNamespace(
+            attributes=[],
+            resources=SimpleNamespace(
+                numCpus=2,
+                memoryGb=4,
+                diskGb=None,
+                timeMin=60,
+                parameterOverrides=[
+                    SimpleNamespace(parameter='n_jobs', resource='numCpus'),
+                    SimpleNamespace(parameter='memory', resource='memoryGb'),
+                    SimpleNamespace(parameter='time_limit', resource='timeMin')
+                ]
+            )
+        )
+    )
+
+def test_parameter_overrides():
+    r = _get_requested_job_resources(make_job({'n_jobs': 8, 'memory': '16.5', 'time_limit': 0}))
+    assert (r.numCpus, r.memoryGb, r.diskGb, r.timeMin) == (8, 16.5, None, 60)
+
+def test_invalid_parameter_overrides_are_ignored():
+    for value in ['nan', 'inf', '-inf', '1e400', 'many', [1], float('nan')]:
+        job = make_job({'n_jobs': value, 'memory': value, 'time_limit': value})
+        r = _get_requested_job_resources(job)
+        assert (r.numCpus, r.memoryGb, r.timeMin) == (2, 4, 60)
+        assert _get_slurm_resource_opts(job) == ['--cpus-per-task=2', '--mem=4096M', '--time=60']
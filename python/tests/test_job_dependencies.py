@@ -0,0 +1,109 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from devel.benchmarks.memory_mongo import MemoryMongoClient
+import api_helpers.services._job_dependencies as job_dependencies_module
+from api_helpers.services._job_dependencies import _on_job_completed, _on_job_failed
+from api_helpers.services.gui.create_jobs_batch import _check_for_dependency_cycles
+from api_helpers.clients.db import resolve_job_dependency, fetch_job
+
+
+def make_job_doc(job_id: str, *, input_file_names: list, waiting_for_job_ids: list = None, output_file_names: list = None):
+    doc = {
+        'projectId': 'p1',
+        'workspaceId': 'w1',
+        'jobId': job_id,
+        'jobPrivateKey': '',
+        'userId': 'u1',
+        'processorName': 'proc',
+        'inputFiles': [{'name': f'input{i}', 'fileName': name} for i, name in enumerate(input_file_names)],
+        'inputFileIds': [],
+        'inputParameters': [],
+        'outputFiles': [{'name': f'output{i}', 'fileName': name} for i, name in enumerate(output_file_names or [])],
+        'timestampCreated': 0,
+        'computeResourceId': 'cr1',
+        'status': 'waiting' if waiting_for_job_ids else 'pending',
+        'processorSpec': {'name': 'proc', 'help': '', 'inputs': [], 'outputs': [], 'parameters': [], 'attributes': [], 'tags': []}
+    }
+    if waiting_for_job_ids:
+        doc['waitingForJobIds'] = waiting_for_job_ids
+    return doc
+
+@pytest.fixture
+def jobs_db(monkeypatch):
+    """Runs coroutines against an in-memory database, recording the pubsub messages instead of sending them"""
+    client = MemoryMongoClient()
+    messages = []
+    async def publish_pubsub_message(*, channel: str, message: dict):
+        messages.append(message)
+    monkeypatch.setattr(job_dependencies_module, 'publish_pubsub_message', publish_pubsub_message)
+    def run(coro_fn):
+        async def main():
+            asyncio.get_event_loop()._mongo_client = client
+            return await coro_fn()
+        return asyncio.run(main())
+    run(lambda: client['protocaas']['projects'].insert_one({'projectId': 'p1', 'timestampModified': 0}))
+    def insert_jobs(docs):
+        run(lambda: client['protocaas']['jobs'].insert_many(docs))
+    def get_job(job_id: str):
+        return run(lambda: fetch_job(job_id))
+    return SimpleNamespace(run=run, insert_jobs=insert_jobs, get_job=get_job, messages=messages)
+
+def test_dependency_cycles_are_detected():
+    def job(job_id: str, waiting_for: list):
+        return SimpleNamespace(jobId=job_id, waitingForJobIds=waiting_for)
+    # a chain, and a job that waits for a job outside of the batch
+    _check_for_dependency_cycles([job('a', None), job('b', ['a']), job('c', ['b', 'a']), job('d', ['other'])])
+    with pytest.raises(Exception, match=r'cycle \(2 jobs involved\)'):
+        _check_for_dependency_cycles([job('a', None), job('b', ['c']), job('c', ['b'])])
+    with pytest.raises(Exception, match=r'cycle \(1 jobs involved\)'):
+        _check_for_dependency_cycles([job('a', ['a'])])
+    # a job downstream of a cycle is reported as well, since it would never start either
+    with pytest.raises(Exception, match=r'cycle \(3 jobs involved\)'):
+        _check_for_dependency_cycles([job('a', ['b']), job('b', ['a']), job('c', ['a'])])
+
+def test_job_becomes_pending_when_all_upstream_jobs_completed(jobs_db):
+    jobs_db.insert_jobs([
+        make_job_doc('j', input_file_names=['u1.nwb', 'u2.nwb', 'raw.nwb'], waiting_for_job_ids=['u1', 'u2'])
+    ])
+    assert not jobs_db.run(lambda: resolve_job_dependency('j', upstream_job_id='u1', output_file_ids={'u1.nwb': 'f1'}))
+    job = jobs_db.get_job('j')
+    assert job.status == 'waiting'
+    assert job.waitingForJobIds == ['u2']
+    assert [f.fileId for f in job.inputFiles] == ['f1', None, None]
+    assert jobs_db.run(lambda: resolve_job_dependency('j', upstream_job_id='u2', output_file_ids={'u2.nwb': 'f2', 'other.nwb': 'f3'}))
+    job = jobs_db.get_job('j')
+    assert job.status == 'pending'
+    assert job.waitingForJobIds is None
+    assert [f.fileId for f in job.inputFiles] == ['f1', 'f2', None]
+    assert sorted(job.inputFileIds) == ['f1', 'f2']
+    # resolving a dependency again (e.g., see _check_new_waiting_jobs) has no effect
+    assert not jobs_db.run(lambda: resolve_job_dependency('j', upstream_job_id='u2', output_file_ids={'u2.nwb': 'f2'}))
+
+def test_completed_upstream_job_notifies_new_pending_jobs(jobs_db):
+    jobs_db.insert_jobs([
+        make_job_doc('u', input_file_names=['raw.nwb'], output_file_names=['u.nwb']),
+        make_job_doc('j1', input_file_names=['u.nwb'], waiting_for_job_ids=['u']),
+        make_job_doc('j2', input_file_names=['u.nwb'], waiting_for_job_ids=['u', 'other'])
+    ])
+    upstream_job = jobs_db.get_job('u')
+    upstream_job.outputFiles[0].fileId = 'fu'
+    jobs_db.run(lambda: _on_job_completed(upstream_job))
+    assert jobs_db.get_job('j1').status == 'pending'
+    assert jobs_db.get_job('j2').status == 'waiting'
+    assert [m['jobIds'] for m in jobs_db.messages] == [['j1']]
+
+def test_failure_propagates_downstream(jobs_db):
+    jobs_db.insert_jobs([
+        make_job_doc('a', input_file_names=['raw.nwb'], output_file_names=['a.nwb']),
+        make_job_doc('b', input_file_names=['a.nwb'], waiting_for_job_ids=['a'], output_file_names=['b.nwb']),
+        make_job_doc('c', input_file_names=['b.nwb'], waiting_for_job_ids=['b']),
+        make_job_doc('d', input_file_names=['raw.nwb'], waiting_for_job_ids=['other'])
+    ])
+    jobs_db.run(lambda: _on_job_failed('a', error='Upstream job failed: a'))
+    assert jobs_db.get_job('b').status == 'failed'
+    assert jobs_db.get_job('b').error == 'Upstream job failed: a'
+    assert jobs_db.get_job('c').status == 'failed'
+    assert jobs_db.get_job('c').error == 'Upstream job failed: b'
+    assert jobs_db.get_job('d').status == 'waiting'
+    assert jobs_db.messages == []
@@ -0,0 +1,88 @@
+import asyncio
+from api_helpers.core.protocaas_types import ProtocaasJob, ProtocaasComputeResource, ComputeResourceSpecProcessor
+from api_helpers.core._get_job_fingerprint import _get_job_fingerprint
+import api_helpers.services._job_memoization as job_memoization_module
+from api_helpers.services._job_memoization import _set_job_fingerprints
+
+
+pinned_image = 'org/app@sha256:' + '0' * 64
+
+def make_processor_spec(*, attributes: list = None):
+    return ComputeResourceSpecProcessor(
+        name='proc',
+        help='',
+        inputs=[{'name': 'input', 'help': ''}],
+        outputs=[{'name': 'output', 'help': ''}],
+        parameters=[
+            {'name': 'a', 'help': '', 'type': 'int', 'default': 1},
+            {'name': 'b', 'help': '', 'type': 'str', 'default': 'x'},
+            {'name': 'token', 'help': '', 'type': 'str', 'secret': True}
+        ],
+        attributes=attributes if attributes is not None else [],
+        tags=[]
+    )
+
+def make_job(job_id: str = 'j1', *, input_file_id: str = 'f1', input_parameters: list = None, attributes: list = None, output_file_name: str = 'out.nwb'):
+    return ProtocaasJob(
+        projectId='p1',
+        workspaceId='w1',
+        jobId=job_id,
+        jobPrivateKey='',
+        userId='u1',
+        processorName='proc',
+        inputFiles=[{'name': 'input', 'fileId': input_file_id, 'fileName': 'in.nwb'}],
+        inputFileIds=[input_file_id],
+        inputParameters=input_parameters if input_parameters is not None else [],
+        outputFiles=[{'name': 'output', 'fileName': output_file_name}],
+        timestampCreated=0,
+        computeResourceId='cr1',
+        status='pending',
+        processorSpec=make_processor_spec(attributes=attributes)
+    )
+
+def make_compute_resource(container: str):
+    return ProtocaasComputeResource(
+        computeResourceId='cr1',
+        ownerId='u1',
+        name='cr',
+        timestampCreated=0,
+        apps=[{'name': 'app', 'executablePath': '/app/main.py', 'container': container}],
+        spec={'apps': [{'name': 'app', 'help': '', 'processors': [{'name': 'proc'}]}]}
+    )
+
+def test_fingerprint_ignores_what_does_not_affect_outputs():
+    f = _get_job_fingerprint(make_job(), app_image=pinned_image)
+    # the job ID, the output file names and the secret parameters don't matter
+    assert _get_job_fingerprint(make_job('j2', output_file_name='other.nwb'), app_image=pinned_image) == f
+    assert _get_job_fingerprint(make_job(input_parameters=[{'name': 'token', 'value': 'secret'}]), app_image=pinned_image) == f
+    # omitted parameters take their default values
+    assert _get_job_fingerprint(make_job(input_parameters=[{'name': 'a', 'value': 1}, {'name': 'b', 'value': 'x'}]), app_image=pinned_image) == f
+
+def test_fingerprint_depends_on_inputs_parameters_and_image():
+    f = _get_job_fingerprint(make_job(), app_image=pinned_image)
+    assert _get_job_fingerprint(make_job(input_file_id='f2'), app_image=pinned_image) != f
+    assert _get_job_fingerprint(make_job(input_parameters=[{'name': 'a', 'value': 2}]), app_image=pinned_image) != f
+    assert _get_job_fingerprint(make_job(), app_image='org/app@sha256:' + '1' * 64) != f
+
+def set_fingerprints(monkeypatch, jobs, *, container: str):
+    async def fetch_compute_resource(compute_resource_id: str):
+        return make_compute_resource(container)
+    monkeypatch.setattr(job_memoization_module, 'fetch_compute_resource', fetch_compute_resource)
+    asyncio.run(_set_job_fingerprints(jobs, compute_resource_id='cr1'))
+
+def test_jobs_of_pinned_images_are_fingerprinted(monkeypatch):
+    job = make_job()
+    set_fingerprints(monkeypatch, [job], container=pinned_image)
+    assert job.fingerprint == _get_job_fingerprint(job, app_image=pinned_image)
+
+def test_jobs_of_mutable_images_are_not_fingerprinted(monkeypatch):
+    # a new image can be pushed under the same tag, so the outputs of earlier jobs must not be reused
+    for container in ['org/app:latest', 'org/app', None]:
+        job = make_job()
+        set_fingerprints(monkeypatch, [job], container=container)
+        assert job.fingerprint is None
+
+def test_non_deterministic_processors_are_not_fingerprinted(monkeypatch):
+    job = make_job(attributes=[{'name': 'deterministic', 'value': False}])
+    set_fingerprints(monkeypatch, [job], container=pinned_image)
+    assert job.fingerprint is None
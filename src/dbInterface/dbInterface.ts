@@ -366,19 +366,95 @@ export const createJob = async (
         processorSpec: ComputeResourceSpecProcessor,
         files: ProtocaasFile[],
         batchId?: string
+        priority?: number
+        forceRerun?: boolean // by default, an identical job (or its outputs) is reused
     },
     auth: Auth
 ) : Promise<string> => {
-    const {workspaceId, projectId, jobDefinition, processorSpec, files, batchId} = a
+    const {workspaceId, projectId, jobDefinition, processorSpec, files, batchId, priority, forceRerun} = a
     const processorName = jobDefinition.processorName
     const inputFiles = jobDefinition.inputFiles
     const inputParameters = jobDefinition.inputParameters
     const outputFiles = jobDefinition.outputFiles
     const url = `/api/gui/jobs`
+    const dandiApiKey = getDandiApiKeyForInputFiles(inputFiles.map(f => f.fileName), files)
+    const body: {[key: string]: any} = {
+        workspaceId,
+        projectId,
+        processorName,
+        inputFiles,
+        inputParameters,
+        outputFiles,
+        processorSpec,
+        batchId
+    }
+    if (dandiApiKey) {
+        body.dandiApiKey = dandiApiKey
+    }
+    if (priority !== undefined) {
+        body.priority = priority
+    }
+    if (forceRerun) {
+        body.forceRerun = true
+    }
+    const response = await postRequest(url, body, auth)
+    if (!response.success) throw Error(`Error in createJob: ${response.error}`)
+    return response.jobId
+}
+
+// Submit many jobs in one request. A job with a parameterGrid is expanded by the server into one job per
+// combination of values, and ${parameter:NAME} in its output file names is replaced by the value of NAME.
+export const createJobsBatch = async (
+    a: {
+        workspaceId: string,
+        projectId: string,
+        jobs: {
+            jobDefinition: ProtocaasProcessingJobDefinition,
+            parameterGrid?: {name: string, values: any[]}[]
+            priority?: number
+            forceRerun?: boolean
+        }[],
+        processorSpecs: ComputeResourceSpecProcessor[],
+        files: ProtocaasFile[],
+        batchId?: string
+        priority?: number
+    },
+    auth: Auth
+) : Promise<string[]> => {
+    const {workspaceId, projectId, jobs, processorSpecs, files, batchId, priority} = a
+    const url = `/api/gui/jobs/batch`
+    const dandiApiKey = getDandiApiKeyForInputFiles(jobs.map(j => j.jobDefinition.inputFiles.map(f => f.fileName)).flat(), files)
+    const body: {[key: string]: any} = {
+        workspaceId,
+        projectId,
+        jobs: jobs.map(j => ({
+            processorName: j.jobDefinition.processorName,
+            inputFiles: j.jobDefinition.inputFiles,
+            outputFiles: j.jobDefinition.outputFiles,
+            inputParameters: j.jobDefinition.inputParameters,
+            parameterGrid: j.parameterGrid,
+            priority: j.priority,
+            forceRerun: j.forceRerun
+        })),
+        processorSpecs,
+        batchId
+    }
+    if (dandiApiKey) {
+        body.dandiApiKey = dandiApiKey
+    }
+    if (priority !== undefined) {
+        body.priority = priority
+    }
+    const response = await postRequest(url, body, auth)
+    if (!response.success) throw Error(`Error in createJobsBatch: ${response.error}`)
+    return response.jobIds
+}
+
+const getDandiApiKeyForInputFiles = (inputFileNames: string[], files: ProtocaasFile[]): string | undefined => {
     let needToSendDandiApiKey = false
     let needToSendDandiStagingApiKey = false
-    for (const inputFile of inputFiles) {
-        const ff = files.find(f => f.fileName === inputFile.fileName)
+    for (const inputFileName of inputFileNames) {
+        const ff = files.find(f => f.fileName === inputFileName)
         if (ff) {
             if (ff.content.startsWith('url:')) {
                 const url = ff.content.slice('url:'.length)
@@ -391,29 +467,13 @@ export const createJob = async (
             }
         }
     }
-    let dandiApiKey: string | undefined = undefined
     if (needToSendDandiApiKey) {
-        dandiApiKey = localStorage.getItem('dandiApiKey') || undefined
+        return localStorage.getItem('dandiApiKey') || undefined
     }
     else if (needToSendDandiStagingApiKey) {
-        dandiApiKey = localStorage.getItem('dandiStagingApiKey') || undefined
+        return localStorage.getItem('dandiStagingApiKey') || undefined
     }
-    const body: {[key: string]: any} = {
-        workspaceId,
-        projectId,
-        processorName,
-        inputFiles,
-        inputParameters,
-        outputFiles,
-        processorSpec,
-        batchId
-    }
-    if (dandiApiKey) {
-        body.dandiApiKey = dandiApiKey
-    }
-    const response = await postRequest(url, body, auth)
-    if (!response.success) throw Error(`Error in createJob: ${response.error}`)
-    return response.jobId
+    return undefined
 }
 
 export const deleteJob = async (jobId: string, auth: Auth): Promise<void> => {
@@ -0,0 +1,55 @@
+// Changes to the jobs and files of a project, streamed by the server (see /api/gui/projects/{projectId}/events)
+// The EventSource reconnects automatically, resuming from the last event it received
+export type ProjectEvent = {
+    type: 'hello' // sent when the stream starts; the project should be (re)loaded
+} | {
+    type: 'reset' // the events since the last event are no longer available; the project should be reloaded
+} | {
+    type: 'jobCreated'
+    jobId: string
+} | {
+    type: 'jobsCreated' // a batch of jobs
+    jobIds: string[]
+} | {
+    type: 'jobUpdated'
+    jobId: string
+    update: {[key: string]: any} // fields with null values were removed from the job
+} | {
+    type: 'jobDeleted'
+    jobId: string
+} | {
+    type: 'fileUpdated'
+    fileName: string
+    file: {[key: string]: any} // the content is omitted when it is large
+} | {
+    type: 'fileDeleted'
+    fileName: string
+}
+
+export const subscribeToProjectEvents = (projectId: string, callback: (event: ProjectEvent) => void) => {
+    const eventSource = new EventSource(`/api/gui/projects/${projectId}/events`)
+    eventSource.onmessage = (e: MessageEvent) => {
+        let event: ProjectEvent
+        try {
+            event = JSON.parse(e.data)
+        }
+        catch (err) {
+            console.warn('Unable to parse project event', e.data)
+            return
+        }
+        callback(event)
+    }
+    const cancel = () => {
+        eventSource.close()
+    }
+    return cancel
+}
+
+export const applyUpdate = <T extends {[key: string]: any}>(x: T, update: {[key: string]: any}): T => {
+    const ret: {[key: string]: any} = {...x}
+    for (const k in update) {
+        if (update[k] === null) delete ret[k]
+        else ret[k] = update[k]
+    }
+    return ret as T
+}
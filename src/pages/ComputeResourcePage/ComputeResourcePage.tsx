@@ -47,7 +47,7 @@ const ComputeResourcesPage: FunctionComponent<Props> = ({width, height, computeR
     const sortedJobs = useMemo(() => {
         return jobs ? [...jobs].sort((a, b) => (b.timestampCreated - a.timestampCreated))
             .sort((a, b) => {
-                const statuses = ['running', 'starting', 'pending', 'failed', 'completed']
+                const statuses = ['running', 'starting', 'pending', 'waiting', 'failed', 'completed']
                 return statuses.indexOf(a.status) - statuses.indexOf(b.status)
             }) : undefined
     }, [jobs])
@@ -140,7 +140,7 @@ const SpikeSortingOutputSection: FunctionComponent<SpikeSortingOutputSectionProp
         )
     }
 
-    if (['pending', 'queued', 'starting', 'running'].includes(status || '')) {
+    if (['waiting', 'pending', 'queued', 'starting', 'running'].includes(status || '')) {
         return <div>Spike sorting view: {status}</div>
     }
 
@@ -114,7 +114,7 @@ const JobView: FunctionComponent<Props> = ({ width, height, jobId }) => {
                     </tr>
                     <tr>
                         <td>Job status:</td>
-                        <td>{job.status}</td>
+                        <td>{job.status}{job.reusedOutputsFromJobId ? ` (outputs reused from identical job ${job.reusedOutputsFromJobId})` : ''}</td>
                     </tr>
                     <tr>
                         <td>Error:</td>
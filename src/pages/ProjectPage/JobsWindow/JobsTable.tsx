@@ -60,7 +60,8 @@ const JobsTable: FunctionComponent<Props> = ({ width, height, fileName, jobs, on
                 throw Error('should not happen')
             }
             const timestampCreated = computeMin(batchJobs.map(jj => jj.timestampCreated))
-            const statuses = batchJobs.map(jj => jj.status)
+            // (a job waiting for upstream jobs is shown as pending in the batch status)
+            const statuses = batchJobs.map(jj => (jj.status === 'waiting' ? 'pending' : jj.status))
             let status = 'pending'
             // all statuses are completed
             if (statuses.every(s => s === 'completed')) {
@@ -340,6 +341,8 @@ const JobsTable: FunctionComponent<Props> = ({ width, height, fileName, jobs, on
 const JobIcon: FunctionComponent<{status: string}> = ({status}) => {
     // 🔴🟠🟡🟢🔵🟣⚫️⚪️🟤
     switch (status) {
+        case 'waiting':
+            return <span title="Job is waiting for upstream jobs">🟤</span>
         case 'pending':
             return <span title="Job is pending">⚪️</span>
         case 'queued':
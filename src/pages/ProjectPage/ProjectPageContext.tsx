@@ -1,7 +1,7 @@
 import React, { FunctionComponent, PropsWithChildren, useCallback, useEffect, useMemo } from 'react';
-import { deleteFile, deleteJob, deleteProject, fetchFiles, fetchJobsForProject, fetchProject, setProjectName } from '../../dbInterface/dbInterface';
+import { deleteFile, deleteJob, deleteProject, fetchFiles, fetchJob, fetchJobsForProject, fetchProject, setProjectName } from '../../dbInterface/dbInterface';
+import { applyUpdate, subscribeToProjectEvents } from '../../dbInterface/projectEvents';
 import { useGithubAuth } from '../../GithubAuth/useGithubAuth';
-import { onPubsubMessage } from '../../pubnub/pubnub';
 import { ProtocaasFile, ProtocaasJob, ProtocaasProject } from '../../types/protocaas-types';
 
 type Props = {
@@ -217,16 +217,48 @@ export const SetupProjectPage: FunctionComponent<PropsWithChildren<Props>> = ({c
         setPreviousJobs(jobs)
     }, [jobs, previousJobs, refreshFiles])
 
+    // apply the changes streamed by the server, rather than reloading all the jobs and files
     useEffect(() => {
-        const cancel = onPubsubMessage(message => {
-            if ((message.type === 'jobStatusChanged') || (message.type === 'newPendingJob')) {
-                if (message.projectId === projectId) {
+        if (!projectId) return
+        const cancel = subscribeToProjectEvents(projectId, event => {
+            switch (event.type) {
+                case 'hello':
+                case 'reset':
                     refreshJobs()
-                }
+                    refreshFiles()
+                    break
+                case 'jobCreated':
+                    fetchJob(event.jobId, auth).then(job => {
+                        if (!job) return
+                        setJobs(jobs => jobs && [...jobs.filter(j => j.jobId !== job.jobId), job])
+                    }).catch(err => {
+                        console.warn(err)
+                        refreshJobs()
+                    })
+                    break
+                case 'jobsCreated':
+                    refreshJobs()
+                    break
+                case 'jobUpdated':
+                    setJobs(jobs => jobs && jobs.map(j => (j.jobId === event.jobId ? applyUpdate(j, event.update) : j)))
+                    break
+                case 'jobDeleted':
+                    setJobs(jobs => jobs && jobs.filter(j => j.jobId !== event.jobId))
+                    break
+                case 'fileUpdated':
+                    if (event.file.content === undefined) {
+                        refreshFiles()
+                        break
+                    }
+                    setFiles(files => files && [...files.filter(f => f.fileName !== event.fileName), event.file as ProtocaasFile])
+                    break
+                case 'fileDeleted':
+                    setFiles(files => files && files.filter(f => f.fileName !== event.fileName))
+                    break
             }
         })
         return () => {cancel()}
-    }, [projectId, refreshJobs])
+    }, [projectId, auth, refreshJobs, refreshFiles])
 
     const deleteJobHandler = useCallback(async (jobId: string) => {
         await deleteJob(jobId, auth)
@@ -258,7 +290,7 @@ export const SetupProjectPage: FunctionComponent<PropsWithChildren<Props>> = ({c
         const fileNames = new Set(files.map(f => f.fileName))
         const pf: ProtocaasFile[] = []
         for (const job of jobs) {
-            if (['pending', 'starting', 'queued', 'running', 'failed'].includes(job.status)) {
+            if (['waiting', 'pending', 'starting', 'queued', 'running', 'failed'].includes(job.status)) {
                 for (const out of job.outputFiles) {
                     if (!fileNames.has(out.fileName)) {
                         pf.push({
@@ -1,7 +1,7 @@
 import { FunctionComponent, useCallback, useEffect, useMemo, useReducer, useState } from "react"
 import { useGithubAuth } from "../../../GithubAuth/useGithubAuth"
 import Hyperlink from "../../../components/Hyperlink"
-import { ProtocaasProcessingJobDefinition, createJob, defaultJobDefinition, fetchFile, protocaasJobDefinitionReducer } from "../../../dbInterface/dbInterface"
+import { ProtocaasProcessingJobDefinition, createJobsBatch, defaultJobDefinition, fetchFile, protocaasJobDefinitionReducer } from "../../../dbInterface/dbInterface"
 import { ComputeResourceSpecProcessor, ProtocaasFile } from "../../../types/protocaas-types"
 import { useWorkspace } from "../../WorkspacePage/WorkspacePageContext"
 import EditJobDefinitionWindow from "../EditJobDefinitionWindow/EditJobDefinitionWindow"
@@ -101,6 +101,7 @@ const RunBatchSpikeSortingWindow: FunctionComponent<Props> = ({ filePaths, onClo
         setOperating(true)
         setOperatingMessage('Preparing...')
         const batchId = createRandomId(8)
+        const jobs: {jobDefinition: ProtocaasProcessingJobDefinition}[] = []
         for (let i = 0; i < filePaths.length; i++) {
             const filePath = filePaths[i]
             const filePath2 = filePath.startsWith('imported/') ? filePath.slice('imported/'.length) : filePath
@@ -110,20 +111,21 @@ const RunBatchSpikeSortingWindow: FunctionComponent<Props> = ({ filePaths, onClo
             if (outputExists && !overwriteExistingOutputs) {
                 continue
             }
-            setOperatingMessage(`Submitting job ${filePath} (${i + 1} of ${filePaths.length})`)
             jobDefinition2.inputFiles[0].fileName = filePath
             jobDefinition2.outputFiles[0].fileName = outputFileName
-            const job = {
-                workspaceId,
-                projectId,
-                jobDefinition: jobDefinition2,
-                processorSpec: processor,
-                files,
-                batchId
-            }
-            console.log('CREATING JOB', job)
-            await createJob(job, auth)
+            jobs.push({jobDefinition: jobDefinition2})
+        }
+        setOperatingMessage(`Submitting ${jobs.length} jobs`)
+        const batch = {
+            workspaceId,
+            projectId,
+            jobs,
+            processorSpecs: [processor],
+            files,
+            batchId
         }
+        console.log('CREATING JOBS', batch)
+        await createJobsBatch(batch, auth)
         setOperatingMessage(undefined)
         setOperating(false)
         onClose()
@@ -62,9 +62,10 @@ export type ProtocaasJob = {
     userId: string
     processorName: string
     batchId?: string
+    priority?: number
     inputFiles: {
         name: string
-        fileId: string
+        fileId?: string // undefined while the file is an output of an upstream job that has not completed
         fileName: string
     }[]
     inputFileIds: string[]
@@ -80,7 +81,7 @@ export type ProtocaasJob = {
     }[]
     timestampCreated: number
     computeResourceId: string
-    status: 'pending' | 'queued' | 'starting' | 'running' | 'completed' | 'failed'
+    status: 'waiting' | 'pending' | 'queued' | 'starting' | 'running' | 'completed' | 'failed'
     error?: string
     processorVersion?: string
     computeResourceNodeId?: string
@@ -94,6 +95,10 @@ export type ProtocaasJob = {
     outputFileIds?: string[]
     processorSpec: ComputeResourceSpecProcessor
     dandiApiKey?: string // not included in rest api responses
+    leaseExpiration?: number
+    waitingForJobIds?: string[]
+    fingerprint?: string
+    reusedOutputsFromJobId?: string
 }
 
 export const isProtocaasJob = (x: any): x is ProtocaasJob => {
@@ -105,9 +110,10 @@ export const isProtocaasJob = (x: any): x is ProtocaasJob => {
         userId: isString,
         processorName: isString,
         batchId: optional(isString),
+        priority: optional(isNumber),
         inputFiles: isArrayOf(y => (validateObject(y, {
             name: isString,
-            fileId: isString,
+            fileId: optional(isString),
             fileName: isString
         }))),
         inputFileIds: isArrayOf(isString),
@@ -123,7 +129,7 @@ export const isProtocaasJob = (x: any): x is ProtocaasJob => {
         }))),
         timestampCreated: isNumber,
         computeResourceId: isString,
-        status: isOneOf([isEqualTo('pending'), isEqualTo('queued'), isEqualTo('starting'), isEqualTo('running'), isEqualTo('completed'), isEqualTo('failed')]),
+        status: isOneOf([isEqualTo('waiting'), isEqualTo('pending'), isEqualTo('queued'), isEqualTo('starting'), isEqualTo('running'), isEqualTo('completed'), isEqualTo('failed')]),
         error: optional(isString),
         processorVersion: optional(isString),
         computeResourceNodeId: optional(isString),
@@ -136,7 +142,11 @@ export const isProtocaasJob = (x: any): x is ProtocaasJob => {
         timestampFinished: optional(isNumber),
         outputFileIds: optional(isArrayOf(isString)),
         processorSpec: isComputeResourceSpecProcessor,
-        dandiApiKey: optional(isString)
+        dandiApiKey: optional(isString),
+        leaseExpiration: optional(isNumber),
+        waitingForJobIds: optional(isArrayOf(isString)),
+        fingerprint: optional(isString),
+        reusedOutputsFromJobId: optional(isString)
     })
 }
 
@@ -279,6 +289,31 @@ export type ComputeResourceSpecProcessor = {
     tags: {
         tag: string
     }[]
+    resources?: ComputeResourceSpecProcessorResources
+}
+
+export type ComputeResourceSpecProcessorResources = {
+    numCpus?: number
+    memoryGb?: number
+    diskGb?: number
+    timeMin?: number
+    parameterOverrides?: {
+        resource: 'numCpus' | 'memoryGb' | 'diskGb' | 'timeMin'
+        parameter: string
+    }[]
+}
+
+export const isComputeResourceSpecProcessorResources = (x: any): x is ComputeResourceSpecProcessorResources => {
+    return validateObject(x, {
+        numCpus: optional(isNumber),
+        memoryGb: optional(isNumber),
+        diskGb: optional(isNumber),
+        timeMin: optional(isNumber),
+        parameterOverrides: optional(isArrayOf(y => (validateObject(y, {
+            resource: isOneOf([isEqualTo('numCpus'), isEqualTo('memoryGb'), isEqualTo('diskGb'), isEqualTo('timeMin')]),
+            parameter: isString
+        }))))
+    })
 }
 
 export const isComputeResourceSpecProcessor = (x: any): x is ComputeResourceSpecProcessor => {
@@ -308,7 +343,8 @@ export const isComputeResourceSpecProcessor = (x: any): x is ComputeResourceSpec
         }))),
         tags: isArrayOf(y => (validateObject(y, {
             tag: isString
-        })))
+        }))),
+        resources: optional(isComputeResourceSpecProcessorResources)
     })
 }
 
@@ -316,6 +352,7 @@ export type ComputeResourceSpecApp = {
     name: string
     help: string
     processors: ComputeResourceSpecProcessor[]
+    warmWorker?: boolean
 }
 
 export type ComputeResourceSpec = {
@@ -327,7 +364,8 @@ export const isComputeResourceSpec = (x: any): x is ComputeResourceSpec => {
         apps: isArrayOf(y => (validateObject(y, {
             name: isString,
             help: isString,
-            processors: isArrayOf(isComputeResourceSpecProcessor)
+            processors: isArrayOf(isComputeResourceSpecProcessor),
+            warmWorker: optional(isBoolean)
         })))
     })
 }
\ No newline at end of file